@@ -0,0 +1,338 @@
+"""Asyncio-native versions of the functions that shell out to ffmpeg and ffprobe, for
+generating resource packs from within an event loop (_e.g._ as part of a service)
+without tying up a thread per build"""
+
+import asyncio
+import json
+import logging
+import os
+from collections.abc import Awaitable, Callable, Sequence
+from concurrent.futures import Future
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import Any, TypeVar
+
+import ffmpeg
+from PIL import Image
+
+from . import bin
+from .cache import ProbeCache
+from .media import MediaInfo, cache_probe_failure, cache_probe_result, probe_in_process
+from .pack_generator import (
+    License,
+    Track,
+    album_art_extractor,
+    archive_pack,
+    decode_embedded_album_art,
+    inlay_from_pixels,
+    keep_resolved,
+    ogg_converter,
+    prepare_pack,
+    write_track_assets,
+)
+
+LOGGER = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+async def probe_track(
+    track_path: os.PathLike | str, cache: ProbeCache | None = None
+) -> MediaInfo:
+    """Probe a media file without blocking the event loop. See `media.probe_track`.
+
+    Parameters
+    ----------
+    track_path : pathlike
+        The path to the file to probe
+    cache : ProbeCache, optional
+        A cache of earlier probe results to consult (and update). If None is
+        specified, the file will always be probed.
+
+    Returns
+    -------
+    MediaInfo
+        The results of the probe
+
+    Raises
+    ------
+    ffmpeg.Error
+        If ffprobe was unable to read the file
+    """
+    track_path = os.fspath(track_path)
+    identity, media_info = await asyncio.to_thread(probe_in_process, track_path, cache)
+    if media_info is not None:
+        return media_info
+
+    LOGGER.debug(f"Probing {track_path} using ffprobe")
+    try:
+        stdout, _ = await _run(
+            "ffprobe",
+            [bin.ffprobe, "-show_format", "-show_streams", "-of", "json", track_path],
+        )
+    except ffmpeg.Error as probe_fail:
+        cache_probe_failure(cache, identity, probe_fail)
+        raise
+    return cache_probe_result(
+        cache, identity, MediaInfo.from_ffprobe(track_path, json.loads(stdout))
+    )
+
+
+async def convert_music_to_ogg(
+    input_path: os.PathLike | str, output_path: os.PathLike | str
+) -> None:
+    """Convert a music track to Ogg Vorbis without blocking the event loop. See
+    `pack_generator.convert_music_to_ogg`.
+
+    Parameters
+    ----------
+    input_path : pathlike
+        The path of the track to convert
+    output_path : pathlike
+        The path to write the converted track to
+
+    Raises
+    ------
+    ffmpeg.Error
+        If the conversion fails
+    """
+    converter = ogg_converter(input_path, output_path)
+    LOGGER.debug(
+        f"Converting using the following command: {' '.join(converter.compile())}"
+    )
+    await _run("ffmpeg", converter.compile(cmd=bin.ffmpeg))
+
+
+async def extract_album_art(
+    track: os.PathLike | str | MediaInfo,
+) -> Image.Image | None:
+    """Extract the album art from an audio track without blocking the event loop.
+    See `pack_generator.extract_album_art`.
+
+    Parameters
+    ----------
+    track: pathlike or MediaInfo
+        path to the track, or the results of an earlier probe of the track
+
+    Returns
+    -------
+    Image or None
+        the album art embedded in the audio track, downscaled to 5x3, or None if the
+        track didn't have any album art embedded
+    """
+    if isinstance(track, MediaInfo):
+        media_info = track
+    else:
+        try:
+            media_info = await probe_track(track)
+        except ffmpeg.Error as could_not_probe:
+            LOGGER.warning(
+                f"Could not probe track {os.fspath(track)}:" f"\n\t{could_not_probe}"
+            )
+            return None
+    if not media_info.has_cover:
+        return None
+    track_path = media_info.path
+
+    album_art = await asyncio.to_thread(decode_embedded_album_art, track_path)
+    if album_art is not None:
+        return album_art
+
+    try:
+        pixels, _ = await _run(
+            "ffmpeg", album_art_extractor(track_path).compile(cmd=bin.ffmpeg)
+        )
+    except ffmpeg.Error as extraction_fail:
+        LOGGER.warning(
+            f"Could not extract album art from {track_path}:" f"\n\t{extraction_fail}"
+        )
+        return None
+    return inlay_from_pixels(track_path, pixels)
+
+
+async def generate_resource_pack(
+    output_path: os.PathLike | str,
+    *tracks: Track,
+    title: str = "Custom Fox Nap Records",
+    license_summary: License | str | None = None,
+    license_file: os.PathLike | str | None = None,
+    title_color: str = "gold",
+    license_color: str | None = None,
+    jobs: int | None = None,
+) -> dict[int, int]:
+    """Generate a FoxNap resource pack without blocking the event loop. See
+    `pack_generator.generate_resource_pack` for a full description of the
+    parameters.
+
+    Parameters
+    ----------
+    output_path : pathlike
+        The filename of the resource pack
+    *tracks : Tracks
+        The tracks to generate
+    title : str, optional
+        The title for the pack to be displayed on the resource pack loading screen.
+    license_summary : License or str, optional
+        The usage summary to display on the resource pack loading screen.
+    license_file : pathlike, optional
+        The path to a license or credits file to include with the resource pack
+    title_color : str, optional
+        The color code to use for the title text on the resource pack loading screen.
+    license_color : str, optional
+        The color code to use for the usage summary on the resource pack loading screen.
+    jobs : int, optional
+        The maximum number of ffmpeg processes this build may run at once. If None
+        is specified, this will be the number of CPUs on this machine.
+
+    Returns
+    -------
+    dict of int to int
+        The durations of each track, with the keys being the numbers of each track
+        (remembering that the first track is Track 1). As with the synchronous
+        version, any track whose duration could not be determined will be left
+        out of the pack (with a warning).
+
+    Raises
+    ------
+    RuntimeError
+        If the license is inappropriate for the provided tracks
+    ValueError
+        If the specified number of jobs is invalid
+    ffmpeg.Error
+        If any of the tracks could not be converted
+    """
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+    if jobs < 1 or int(jobs) != jobs:
+        raise ValueError("jobs must be an integer no less than 1")
+    slots = asyncio.Semaphore(jobs)
+
+    async def limited(function: Callable[..., Awaitable[T]], *args: Any) -> T:
+        async with slots:
+            return await function(*args)
+
+    # any durations still being determined need to be settled before anything
+    # gets built, so that the tracks for which that failed are left out up front
+    durations = keep_resolved(
+        tracks,
+        await asyncio.gather(
+            *(_resolve_duration(track) for track in tracks), return_exceptions=True
+        ),
+    )
+    tracks = tuple(track for track, _ in durations)
+
+    with TemporaryDirectory() as tmpdir:
+        root = Path(tmpdir)
+        foxnap_root = await asyncio.to_thread(
+            prepare_pack,
+            root,
+            tracks,
+            title=title,
+            license_summary=license_summary,
+            license_file=license_file,
+            title_color=title_color,
+            license_color=license_color,
+        )
+
+        LOGGER.info("Beginning music track conversion")
+        await _gather(
+            *(
+                limited(
+                    _convert_track,
+                    track,
+                    foxnap_root / "sounds" / f"track_{track.num}.ogg",
+                )
+                for track in tracks
+            )
+        )
+        LOGGER.info("Music track conversion complete")
+
+        album_art_tracks = [track for track in tracks if track.use_album_art]
+        inlays = dict(
+            zip(
+                map(id, album_art_tracks),
+                await _gather(
+                    *(limited(_extract_inlay, track) for track in album_art_tracks)
+                ),
+            )
+        )
+        await asyncio.to_thread(
+            write_track_assets,
+            foxnap_root,
+            tracks,
+            lambda track: inlays[id(track)],
+        )
+        await asyncio.to_thread(archive_pack, root, output_path)
+    return {track.num: duration for track, duration in durations}
+
+
+async def _resolve_duration(track: Track) -> int:
+    if isinstance(track.duration, Future):
+        return await asyncio.wrap_future(track.duration)
+    return track.duration
+
+
+async def _convert_track(track: Track, output_path: Path) -> None:
+    LOGGER.info(f"Converting {track}")
+    await convert_music_to_ogg(track.path, output_path)
+
+
+async def _extract_inlay(track: Track) -> Image.Image | None:
+    LOGGER.info(f"Attempting to extract inlay from album art for {track}")
+    inlay = await extract_album_art(track.media_info or track.path)
+    if inlay is None:
+        LOGGER.warning(f"Failed to extract album art for {track}")
+    return inlay
+
+
+async def _gather(*coroutines: Awaitable[Any]) -> list[Any]:
+    """Run a collection of coroutines concurrently, cancelling the rest as soon as
+    one of them fails"""
+    tasks = [asyncio.ensure_future(coroutine) for coroutine in coroutines]
+    try:
+        return await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def _run(program: str, args: Sequence[str]) -> tuple[bytes, bytes]:
+    """Run a command as an asyncio subprocess
+
+    Parameters
+    ----------
+    program : str
+        The name of the program being run (for error reporting)
+    args : list-like of str
+        The full command line, including the path to the executable
+
+    Returns
+    -------
+    bytes
+        The process's stdout
+    bytes
+        The process's stderr
+
+    Raises
+    ------
+    ffmpeg.Error
+        If the process exits with a non-zero status (mirroring the behavior of
+        the ffmpeg-python library)
+    """
+    process = await asyncio.create_subprocess_exec(
+        *args,
+        stdin=asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    try:
+        stdout, stderr = await process.communicate()
+    except asyncio.CancelledError:
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+        raise
+    if process.returncode != 0:
+        raise ffmpeg.Error(program, stdout, stderr)
+    return stdout, stderr
@@ -2,11 +2,18 @@
 
 import logging
 import os
+import threading
+from collections import Counter
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor
 from contextlib import AbstractContextManager
+from functools import partial
 from pathlib import Path
-from typing import Any, NamedTuple
+from typing import Any, Iterable, NamedTuple
+
+import ffmpeg
 
 from . import utils
+from .media import MediaInfo
 from .pack_generator import License, Track
 
 LOGGER = logging.getLogger(__name__)
@@ -17,11 +24,16 @@ class Spec(NamedTuple):
 
     Attributes
     ----------
-    path_spec : Path
-        The path of the input file this should match
+    path_spec : Path or str
+        The path of the input file this should match or, for multi-track specs, a
+        wildcard pattern (_e.g._ "Best Album Ever/*.mp3") or a regular expression
+        prefixed by "re:" (see `utils.PathPatternMatcher` for the full syntax).
+        Regular expressions should be given as strings, since converting them to
+        Paths can change them (_e.g._ on Windows, where "/" becomes "\\").
     distinct : bool, optional
-        Whether this spec is allowed to match more than one file. Right now only True
-        (default) is supported.
+        Whether this spec is only allowed to match a single file (default is True).
+        Specs with distinct=False will be applied to every file matching their
+        pattern.
     license_type : License, optional
         The permission level for use of the specified track. If None is specified,
         use the handler's default.
@@ -30,10 +42,15 @@ class Spec(NamedTuple):
         If None is specified, use the handler's default.
     description: str, optional
         The name to give the track. If None is specified, the name will be extracted
-        from the track metadata.
+        from the track metadata. For multi-track specs, this is a format string
+        that can reference "{stem}" (the file name without extension), "{name}"
+        (the file name), "{parent}" (the name of the folder the file is in), along
+        with any named groups captured by a regular expression path spec.
     num : int, optional
         The number to assign to the track. If None is specified, allow the handler
-        to automatically assign a track number
+        to automatically assign a track number. For multi-track specs, this is the
+        number at which to start numbering the matching tracks (each will get the
+        lowest available number no less than this).
     hue : bool or float, optional
         specification of the record texture template:
           - False: use the regular record template
@@ -47,17 +64,15 @@ class Spec(NamedTuple):
 
     Notes
     -----
-    - The plan is to extend this Spec to support matching multiple files
-      (distinct=False). This would involve
-        - file_spec supporting wild cards or regular expressions
-        - description allowing for a format-style specification
-        - num providing for more dynamic track number generation
+    - Files matching a distinct spec will always use that spec, even if they also
+      match a multi-track spec. Among multi-track specs, the first spec listed
+      that matches a file is the one that gets used.
     - The hue and use_album_art attributes are planned to be deprecated or replaced
       in favor of functionality that would allow a user to provide their own templates
       and complete item textures.
     """
 
-    path_spec: Path
+    path_spec: Path | str
     distinct: bool | None = True
     license_type: License | None = None
     required: bool | None = None
@@ -81,6 +96,19 @@ class TrackBuilder(AbstractContextManager):
         The minumum track number to auto-assign. Default is 1, which will overwrite the
         tracks included with the mod. Set higher if you want to keep some built-in
         tracks or to avoid conflicting with another FoxNap resource pack.
+    jobs : int, optional
+        The maximum number of track durations to extract in the background at once.
+        When this is greater than 1, the durations of tracks given by path will be
+        extracted by a pool of worker threads, with each generated Track's duration
+        being a Future (so that matching can continue on to the next file right
+        away). Default is 1, in which case durations are extracted as each track is
+        generated. Tracks given as MediaInfo (which already know their durations)
+        are never deferred. If a deferred extraction fails, the track is dropped
+        from the builder's tally, but (since later tracks will already have been
+        numbered) its number is not handed out again, which may leave a gap.
+        All deferred extractions are waited on when the context exits, so the
+        numbering (and any failures, which get reported in `failed`) is only
+        final once it does, and packs should be generated after that.
     **defaults
         Overrides of either the default track settings or the default handler settings
 
@@ -90,6 +118,10 @@ class TrackBuilder(AbstractContextManager):
         The maximum track number across all tracks generated by this builder (across
         all contexts). This will be the number of discs that should be set in the mod
         config file (foxnap.yaml) in order for all records to be registered.
+    failed : list of (Path, Exception) tuples
+        The tracks from the most recent context whose deferred durations could
+        not be extracted, along with the errors that were raised. This is only
+        complete once the context has exited.
 
     Examples
     --------
@@ -116,14 +148,21 @@ class TrackBuilder(AbstractContextManager):
         ("strict_file_checking", False),
     )
 
-    def __init__(self, *specs: Spec, start_at=1, **defaults):
+    def __init__(self, *specs: Spec, start_at=1, jobs=1, **defaults):
         self.defaults = dict(TrackBuilder._DEFAULTS)
         self.defaults.update(defaults)
-        self.validate_specs(*specs)
-        self._specs = list(specs)
+        self._lock = threading.RLock()
         if start_at < 1 or int(start_at) != start_at:
             raise TypeError("start_at must be an integer no less than 1")
         self.start_at = start_at
+        self.validate_specs(*specs)
+        self._specs = list(specs)
+        self._index_specs()
+        if jobs < 1 or int(jobs) != jobs:
+            raise ValueError("jobs must be an integer no less than 1")
+        self.jobs = jobs
+        self._executor: ThreadPoolExecutor | None = None
+        self.failed: list[tuple[Path, BaseException]] = []
 
     def validate_specs(self, *specs: Spec, check_contiguous=False) -> None:
         """Validate a set of specs
@@ -143,22 +182,38 @@ class TrackBuilder(AbstractContextManager):
             If any of the specs are invalid
         RuntimeError
             If any of the specs conflict with any other specs
-        NotImplementedError
-            If any of the specs specify a planned feature that is not yet implemented
         """
+        # multi-track specs don't reserve their numbers (they just say where
+        # numbering should start), and since they can match any number of files,
+        # they could fill every gap from there on up (whether they actually do
+        # gets checked once the tracks have been numbered)
+        utils.validate_track_numbers(
+            *(spec.num for spec in specs if spec.distinct),
+            check_contiguous=check_contiguous,
+            open_from=min(
+                (spec.num or self.start_at for spec in specs if not spec.distinct),
+                default=None,
+            ),
+        )
+        # (several multi-track specs can start at the same number, but it still
+        # needs to be a valid track number)
         utils.validate_track_numbers(
-            *(spec.num for spec in specs), check_contiguous=check_contiguous
+            *{spec.num for spec in specs if not spec.distinct and spec.num is not None}
         )
         utils.validate_track_file_specs(
-            *(spec.path_spec for spec in specs),
+            *(spec.path_spec for spec in specs if spec.distinct),
             strict=self.defaults["strict_file_checking"],
         )
-        if not all((spec.distinct for spec in specs)):
-            raise NotImplementedError("Multitrack specs are not currently supported")
+        utils.validate_track_file_patterns(
+            *(spec.path_spec for spec in specs if not spec.distinct)
+        )
 
     def add_spec(self, spec: Spec) -> None:
         """Add a Spec to the builder
 
+        Specs can also be added while the builder is in use, in which case the
+        new spec will apply to any tracks generated from then on.
+
         Parameters
         ----------
         spec : Spec
@@ -169,10 +224,64 @@ class TrackBuilder(AbstractContextManager):
         ValueError
             If the spec is invalid
         RuntimeError
-            If the spec conflicts with existing specs
+            If the spec conflicts with existing specs (or, if the builder is in
+            use, with a track number that's already been assigned)
         """
-        self.validate_specs(*self._specs, spec)
-        self._specs.append(spec)
+        with self._lock:
+            in_context = hasattr(self, "_unused")
+            if not spec.distinct:
+                utils.validate_track_numbers(spec.num)
+                utils.validate_track_file_patterns(spec.path_spec)
+                self._specs.append(spec)
+                self._patterns.add(spec.path_spec, len(self._specs) - 1)
+                if in_context:
+                    self._unused[len(self._specs) - 1] = spec
+                return
+
+            if in_context and spec.num in self._taken_track_numbers:
+                raise RuntimeError(
+                    f"Track number {spec.num} (requested by the spec"
+                    f" '{os.fspath(spec.path_spec)}') has already been assigned"
+                )
+
+            # the existing specs have already been validated, so the new spec only
+            # needs to be checked against the ones it could possibly conflict with
+            if spec.num is not None:
+                utils.validate_track_numbers(
+                    *(spec.num,) * (self._num_counts[spec.num] + 1)
+                )
+            strict = self.defaults["strict_file_checking"]
+            candidates = set(self._index.matches(spec.path_spec, any_extension=strict))
+            candidates.update(
+                self._index.matched_by(spec.path_spec, any_extension=strict)
+            )
+            utils.validate_track_file_specs(
+                spec.path_spec,
+                *(self._specs[i].path_spec for i in sorted(candidates)),
+                strict=strict,
+            )
+
+            self._specs.append(spec)
+            self._num_counts[spec.num] += 1
+            self._index.add(spec.path_spec, len(self._specs) - 1)
+            if in_context:
+                self._unused[len(self._specs) - 1] = spec
+                if spec.num is not None:
+                    self._taken_track_numbers.add(spec.num)
+
+    def _index_specs(self) -> None:
+        """(Re)build the indexes used to validate new specs and to look up the
+        specs matching each track"""
+        self._num_counts: Counter[int | None] = Counter(
+            spec.num for spec in self._specs if spec.distinct
+        )
+        self._index: utils.PathSpecIndex[int] = utils.PathSpecIndex()
+        self._patterns: utils.PathPatternMatcher[int] = utils.PathPatternMatcher()
+        for i, spec in enumerate(self._specs):
+            if spec.distinct:
+                self._index.add(spec.path_spec, i)
+            else:
+                self._patterns.add(spec.path_spec, i)
 
     @property
     def n_discs(self) -> int:
@@ -181,42 +290,56 @@ class TrackBuilder(AbstractContextManager):
         except AttributeError:
             raise ValueError("This builder yet to be used.")
 
-    def _generate_track_from_spec(
-        self,
-        track_file: os.PathLike | str,
-        spec: Spec,
-    ) -> Track:
-        duration = utils.extract_track_duration(track_file)
-        track_num = spec.num or self._next_track_num()
-        self._assigned_track_numbers.append(track_num)
-        self._n_discs = max(self._n_discs, track_num)  # type: ignore[has-type]
-
-        return Track(
-            track_num,
-            duration,
-            track_file,
-            hue=spec.hue if spec.hue is not None else self.defaults["hue"],
-            description=spec.description,
-            use_album_art=(
-                spec.use_album_art
-                if spec.use_album_art is not None
-                else self.defaults["use_album_art"]
-            ),
-            license=spec.license_type or self.defaults["license"],
-        )
-
     def __enter__(self):
         self.validate_specs(*self._specs, check_contiguous=True)
-        self._unused: list[Spec] = [spec for spec in self._specs]
+        self._index_specs()
+        # keyed by position in the spec list, so that lookups can go through the
+        # index and specs can be marked as used without rescanning the list
+        self._unused: dict[int, Spec] = dict(enumerate(self._specs))
         self._assigned_track_numbers: list[int] = []
+        # a number only gets freed up if a track fails to build, so outside of
+        # that, the lowest free number can only go up
+        self._taken_track_numbers: set[int] = {
+            spec.num for spec in self._specs if spec.distinct and spec.num is not None
+        }
+        # keyed by where the numbering starts (since multi-track specs can
+        # start their numbering higher)
+        self._lowest_free_track_nums: dict[int, int] = {}
+        self._reservations: dict[str, _Reservation] = {}
         self._n_discs = self.start_at - 1
+        self.failed = []
+        if self.jobs > 1:
+            self._executor = ThreadPoolExecutor(self.jobs)
         return self
 
     def __exit__(self, *exc):
         try:
+            if self._executor is not None:
+                # so that every Track's duration is settled (and any failures have
+                # been accounted for) before the numbering gets checked
+                self._executor.shutdown(wait=True)
+                self._executor = None
+            if self.failed:
+                LOGGER.warning(
+                    "The durations of the following tracks could not be extracted,"
+                    " so they have been left out:"
+                    + "".join(
+                        f"\n- {track_file}: {error}"
+                        for track_file, error in self.failed
+                    )
+                )
+            with self._lock:
+                for track_file, reservation in self._reservations.items():
+                    LOGGER.debug(
+                        f"Releasing track {reservation.num}, which was reserved"
+                        f" for {track_file} but never built"
+                    )
+                    self._release(reservation)
+                self._reservations.clear()
+
             unused_message = ""
             error = False
-            for spec in self._unused:
+            for spec in self._unused.values():
                 unused_message += (
                     f"\n- {os.fspath(spec.path_spec)}"
                     f" {'(required)' if spec.required else ''}"
@@ -264,18 +387,20 @@ class TrackBuilder(AbstractContextManager):
         finally:
             del self._unused
             del self._assigned_track_numbers
+            del self._taken_track_numbers
+            del self._lowest_free_track_nums
+            del self._reservations
         return False
 
-    def _next_track_num(self) -> int:
-        next_track_num = self.start_at
-        while (
-            next_track_num in (spec.num for spec in self._unused)
-            or next_track_num in self._assigned_track_numbers
-        ):
-            next_track_num += 1
-        return next_track_num
+    def _next_track_num(self, start_at: int | None = None) -> int:
+        start_at = start_at or self.start_at
+        lowest_free = self._lowest_free_track_nums.get(start_at, start_at)
+        while lowest_free in self._taken_track_numbers:
+            lowest_free += 1
+        self._lowest_free_track_nums[start_at] = lowest_free
+        return lowest_free
 
-    def __getitem__(self, track_file: os.PathLike | str) -> Track:
+    def _check_in_context(self) -> None:
         if not hasattr(self, "_unused"):
             raise ValueError(
                 "Improper use of a TrackBuilder: when building tracks, you must use"
@@ -284,43 +409,338 @@ class TrackBuilder(AbstractContextManager):
                 "\n...     track_one = track_builder[file_one]"
                 "\n...     track_two = track_builder[file_two]"
             )
-        for spec in self._unused:
-            if utils.spec_matches_path(spec.path_spec, track_file):
-                track = self._generate_track_from_spec(track_file, spec)
-                self._unused.remove(spec)
-                return track
-
-        # not found? search all specs
-        for spec in self._specs:
-            # if spec not in self._unused:  # then it would have been caught above
-            if utils.spec_matches_path(spec.path_spec, track_file):
-                if spec.distinct:
-                    raise RuntimeError(
-                        f"The spec: '{os.fspath(spec.path_spec)}'"
-                        f" matching the track '{os.fspath(track_file)}"
-                        " was already used."
-                    )
-                elif not spec.distinct:
-                    raise NotImplementedError(
-                        "Multitrack specs are not currently supported"
-                    )
+
+    def reserve(self, track: os.PathLike | str | MediaInfo) -> int:
+        """Match a track to its spec and assign it a track number, without yet
+        generating the Track itself
+
+        Track numbers are handed out in the order tracks are reserved, so when
+        tracks are being generated in parallel, reserving them up front (in order)
+        ensures that the numbering doesn't depend on which tracks happen to finish
+        first. Reserving a track that's already been reserved has no effect.
+
+        Parameters
+        ----------
+        track : pathlike or MediaInfo
+            The path to the track, or the results of a probe of the track
+
+        Returns
+        -------
+        int
+            The track number reserved for the track
+
+        Raises
+        ------
+        RuntimeError
+            If the spec matching the track has already been used
+        KeyError
+            If the track doesn't match any spec and the builder is set to error
+            on unspecified files
+        """
+        self._check_in_context()
+        track_file = os.fspath(track.path if isinstance(track, MediaInfo) else track)
+        with self._lock:
+            if (reservation := self._reservations.get(track_file)) is None:
+                reservation = self._reserve(track_file)
+                self._reservations[track_file] = reservation
+        return reservation.num
+
+    def _reserve(self, track_file: str) -> "_Reservation":
+        """Match the track to its spec and take its track number (the caller must
+        hold the lock)"""
+        matches = self._index.matches(track_file)
+        for i in matches:
+            if i in self._unused:
+                return self._take(track_file, i)
+
+        # not found? then it must have matched specs that were already used
+        if matches:
+            spec = self._specs[matches[0]]
+            raise RuntimeError(
+                f"The spec: '{os.fspath(spec.path_spec)}'"
+                f" matching the track '{track_file}"
+                " was already used."
+            )
+
+        # then check the multi-track specs
+        if (pattern_match := self._patterns.match(track_file)) is not None:
+            return self._take(track_file, *pattern_match)
 
         # still not found? then it's unSPECified
         if self.defaults["unspecified_file_handling"] == "use-defaults":
-            LOGGER.debug(f"Using default spec for '{os.fspath(track_file)}'")
-            return self._generate_track_from_spec(track_file, Spec(Path()))
+            LOGGER.debug(f"Using default spec for '{track_file}'")
+            return self._take(track_file, None)
         if self.defaults["unspecified_file_handling"] in ("warn", "warning"):
             LOGGER.warning(
-                f"Could not find matching spec for '{os.fspath(track_file)}'."
+                f"Could not find matching spec for '{track_file}'."
                 "Using default spec instead."
             )
-            return self._generate_track_from_spec(track_file, Spec(Path()))
+            return self._take(track_file, None)
         if self.defaults["unspecified_file_handling"] == "error":
-            raise KeyError(
-                f"Could not find matching spec for '{os.fspath(track_file)}'"
-            )
+            raise KeyError(f"Could not find matching spec for '{track_file}'")
         raise NotImplementedError(
             "Unspecified file handling method"
             f" '{self.defaults['unspecified_file_handling']}' is invalid"
             " or is not yet implemented."
         )
+
+    def _take(
+        self,
+        track_file: str,
+        spec_index: int | None,
+        captured: dict[str, str] | None = None,
+    ) -> "_Reservation":
+        """Assign a track number to a track, marking its spec as used"""
+        spec = Spec(Path()) if spec_index is None else self._specs[spec_index]
+        if spec.distinct:
+            auto_numbered = spec.num is None
+            track_num = spec.num or self._next_track_num()
+            description = spec.description
+        else:
+            auto_numbered = True
+            track_num = self._next_track_num(spec.num or self.start_at)
+            description = _fill_in_description(spec, track_file, captured or {})
+        self._assigned_track_numbers.append(track_num)
+        self._taken_track_numbers.add(track_num)
+        self._n_discs = max(self._n_discs, track_num)
+        if spec_index is not None:
+            self._unused.pop(spec_index, None)
+        return _Reservation(track_num, spec_index, spec, description, auto_numbered)
+
+    def _release(self, reservation: "_Reservation") -> None:
+        """Undo a reservation, freeing up its track number and (for distinct
+        specs) its spec (the caller must hold the lock)"""
+        self._assigned_track_numbers.remove(reservation.num)
+        self._n_discs = max(self._assigned_track_numbers, default=self.start_at - 1)
+        if reservation.spec_index is not None and reservation.spec.distinct:
+            self._unused[reservation.spec_index] = reservation.spec
+        if reservation.auto_numbered:
+            self._taken_track_numbers.discard(reservation.num)
+            for start_at, lowest_free in self._lowest_free_track_nums.items():
+                if start_at <= reservation.num < lowest_free:
+                    self._lowest_free_track_nums[start_at] = reservation.num
+
+    def _release_if_failed(
+        self, track_file: str, reservation: "_Reservation", duration: Future
+    ) -> None:
+        """Undo the reservation for a track whose (deferred) duration couldn't be
+        extracted, without freeing up its number (which may well be out of order
+        by now), and record the failure"""
+        if duration.cancelled():
+            error: BaseException | None = CancelledError()
+        else:
+            error = duration.exception()
+        if error is not None:
+            with self._lock:
+                self._release(reservation._replace(auto_numbered=False))
+                self.failed.append((Path(track_file), error))
+
+    def __getitem__(self, track: os.PathLike | str | MediaInfo) -> Track:
+        self._check_in_context()
+        key = os.fspath(track.path if isinstance(track, MediaInfo) else track)
+        with self._lock:
+            reservation = self._reservations.pop(key, None) or self._reserve(key)
+
+        if self._executor is not None and not isinstance(track, MediaInfo):
+            # errors will be raised when the duration is resolved
+            pending = self._executor.submit(utils.extract_track_duration, track)
+            pending.add_done_callback(
+                partial(self._release_if_failed, key, reservation)
+            )
+            return self._build_track(track, reservation, pending)
+
+        # extracting the duration may mean probing the file, so don't hold up the
+        # other threads while that happens
+        try:
+            duration = utils.extract_track_duration(track)
+        except BaseException:
+            with self._lock:
+                self._release(reservation)
+            raise
+
+        return self._build_track(track, reservation, duration)
+
+    def build_many(
+        self, tracks: Iterable[os.PathLike | str | MediaInfo], jobs: int | None = None
+    ) -> "BuildReport":
+        """Generate the Tracks for a whole batch of files at once
+
+        The durations of all the files are extracted first (in parallel), and then
+        the files that could be read are matched to their specs (and assigned track
+        numbers, in the order they're provided) in a single pass, so that a file
+        that can't be read doesn't leave a gap in the numbering.
+
+        Parameters
+        ----------
+        tracks : list-like of pathlikes or MediaInfos
+            The paths of the tracks, or the results of probes of the tracks
+        jobs : int, optional
+            The maximum number of track durations to extract at once. If None is
+            specified, the builder's own `jobs` setting will be used.
+
+        Returns
+        -------
+        BuildReport
+            The generated tracks, along with a record of which files didn't match
+            any specs (and whether they were built anyway), which specs are still
+            unused, and which tracks couldn't be built
+
+        Raises
+        ------
+        RuntimeError
+            If any track matches a spec that has already been used
+        """
+        self._check_in_context()
+        tracks = list(tracks)
+        durations = list(
+            utils.parallel_map(
+                _extract_duration, tracks, jobs=self.jobs if jobs is None else jobs
+            )
+        )
+
+        built: list[Track] = []
+        unmatched: list[Path] = []
+        defaulted: list[Path] = []
+        failed: list[tuple[Path, Exception]] = []
+        with self._lock:
+            taken: list[_Reservation] = []
+            try:
+                for track, duration in zip(tracks, durations):
+                    track_file = os.fspath(
+                        track.path if isinstance(track, MediaInfo) else track
+                    )
+                    reservation = self._reservations.pop(track_file, None)
+                    if isinstance(duration, Exception):
+                        if reservation is not None:
+                            self._release(reservation)
+                        failed.append((Path(track_file), duration))
+                        continue
+                    if reservation is None:
+                        try:
+                            reservation = self._reserve(track_file)
+                        except KeyError:
+                            unmatched.append(Path(track_file))
+                            continue
+                    taken.append(reservation)
+                    if reservation.spec_index is None:
+                        defaulted.append(Path(track_file))
+                    built.append(self._build_track(track, reservation, duration))
+            except BaseException:
+                for reservation in taken:
+                    self._release(reservation)
+                raise
+            unused = list(self._unused.values())
+        return BuildReport(built, unmatched, unused, failed, defaulted)
+
+    def _build_track(
+        self,
+        track: os.PathLike | str | MediaInfo,
+        reservation: "_Reservation",
+        duration: int | Future[int],
+    ) -> Track:
+        if isinstance(track, MediaInfo):
+            media_info: MediaInfo | None = track
+            track_file: os.PathLike | str = track.path
+        else:
+            media_info = None
+            track_file = track
+
+        spec = reservation.spec
+        return Track(
+            reservation.num,
+            duration,
+            track_file,
+            hue=spec.hue if spec.hue is not None else self.defaults["hue"],
+            description=reservation.description,
+            use_album_art=(
+                spec.use_album_art
+                if spec.use_album_art is not None
+                else self.defaults["use_album_art"]
+            ),
+            license=spec.license_type or self.defaults["license"],
+            media_info=media_info,
+        )
+
+
+class BuildReport(NamedTuple):
+    """The results of building a batch of tracks
+
+    Attributes
+    ----------
+    tracks : list of Tracks
+        The tracks that were generated, in the order the files were provided
+    unmatched : list of Paths
+        The files that didn't match any spec and so were skipped (which only happens
+        when the builder is set to error on unspecified files)
+    unused_specs : list of Specs
+        The specs that have yet to be matched to any files
+    failed : list of (Path, Exception)
+        The files that couldn't be built (because their durations couldn't be
+        extracted), along with the reasons why
+    defaulted : list of Paths
+        The files that didn't match any spec and so were built using the default
+        spec
+    """
+
+    tracks: list[Track]
+    unmatched: list[Path]
+    unused_specs: list[Spec]
+    failed: list[tuple[Path, Exception]]
+    defaulted: list[Path]
+
+
+def _extract_duration(track: os.PathLike | str | MediaInfo) -> int | Exception:
+    """Extract a track's duration, returning (rather than raising) any error, so
+    that one bad track doesn't sink the whole batch"""
+    try:
+        return utils.extract_track_duration(track)
+    except (ValueError, ffmpeg.Error) as extraction_fail:
+        return extraction_fail
+
+
+class _Reservation(NamedTuple):
+    """A track number (and spec) reserved for a track that has yet to be built"""
+
+    num: int
+    spec_index: int | None  # None if the track is using the default spec
+    spec: Spec
+    description: str | None
+    auto_numbered: bool  # whether the number came from the builder (vs. the spec)
+
+
+def _fill_in_description(
+    spec: Spec, track_file: os.PathLike | str, captured: dict[str, str]
+) -> str | None:
+    """Generate the description for a track matched by a multi-track spec
+
+    Parameters
+    ----------
+    spec : Spec
+        The multi-track spec, whose description is a format string
+    track_file : pathlike
+        The path of the track
+    captured : dict of str to str
+        Any named groups captured when matching the spec's path pattern
+
+    Returns
+    -------
+    str or None
+        The filled-in description, or None if the spec didn't provide one
+
+    Raises
+    ------
+    ValueError
+        If the description references a field that isn't available
+    """
+    if spec.description is None:
+        return None
+    path = Path(track_file)
+    fields = {"stem": path.stem, "name": path.name, "parent": path.parent.name}
+    fields.update(captured)
+    try:
+        return spec.description.format_map(fields)
+    except (KeyError, IndexError, ValueError) as format_fail:
+        raise ValueError(
+            f"Could not fill in the description '{spec.description}'"
+            f" for '{os.fspath(track_file)}':\n  {format_fail!r}"
+        ) from format_fail
@@ -0,0 +1,704 @@
+"""Persistent caches for speeding up repeat runs over the same music library"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+from contextlib import AbstractContextManager
+from functools import cache
+from pathlib import Path
+from typing import Any, Sequence
+
+from . import bin
+
+LOGGER = logging.getLogger(__name__)
+
+CACHE_DIR_ENV_VAR = "FOXNAP_CACHE_DIR"
+
+
+def user_cache_dir() -> Path:
+    """Determine the folder where FoxNapRPG should store its caches
+
+    Returns
+    -------
+    Path
+        The cache folder. This will be the value of the FOXNAP_CACHE_DIR environment
+        variable, if set, and otherwise the platform-appropriate user cache folder.
+        Note that this folder may not yet exist.
+    """
+    if override := os.environ.get(CACHE_DIR_ENV_VAR):
+        return Path(override)
+    if sys.platform == "win32":
+        root = Path(os.environ.get("LOCALAPPDATA") or Path.home() / "AppData" / "Local")
+    elif sys.platform == "darwin":
+        root = Path.home() / "Library" / "Caches"
+    else:
+        root = Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache")
+    return root / "foxnap_rpg"
+
+
+@cache
+def ffprobe_version() -> str:
+    """Get the version string of the ffprobe binary in use
+
+    Returns
+    -------
+    str
+        The first line of the output of `ffprobe -version`, or an empty string
+        if ffprobe could not be run
+    """
+    return _version_of(bin.ffprobe)
+
+
+@cache
+def ffmpeg_version() -> str:
+    """Get the version string of the ffmpeg binary in use
+
+    Returns
+    -------
+    str
+        The first line of the output of `ffmpeg -version`, or an empty string
+        if ffmpeg could not be run
+    """
+    return _version_of(bin.ffmpeg)
+
+
+def _version_of(executable: str) -> str:
+    """Get the first line of the output of `<executable> -version`"""
+    try:
+        result = subprocess.run(
+            [executable, "-version"], capture_output=True, encoding="utf-8"
+        )
+    except OSError as could_not_run:
+        LOGGER.debug(
+            f"Could not determine {os.path.basename(executable)} version:"
+            f"\n  {could_not_run}"
+        )
+        return ""
+    return result.stdout.partition("\n")[0].strip()
+
+
+def file_identity(file_path: os.PathLike | str) -> tuple[str, int, int, int]:
+    """Get the values used to tell whether a file has changed since it was last seen
+
+    Parameters
+    ----------
+    file_path : pathlike
+        The path to the file
+
+    Returns
+    -------
+    str
+        The absolute path to the file
+    int
+        The size of the file, in bytes
+    int
+        The modification time of the file, in nanoseconds
+    int
+        The file's inode number (or platform equivalent)
+
+    Raises
+    ------
+    OSError
+        If the file cannot be stat-ed
+    """
+    file_path = os.path.abspath(file_path)
+    stat = os.stat(file_path)
+    return file_path, stat.st_size, stat.st_mtime_ns, stat.st_ino
+
+
+class _SQLiteCache(AbstractContextManager):
+    """Base class for the on-disk caches, which are stored as SQLite databases.
+
+    Every cache carries a set of metadata (_e.g._ the version of the cache format),
+    and its contents are cleared whenever the metadata changes.
+    Caches are safe to share between threads.
+
+    Parameters
+    ----------
+    cache_path : Path
+        The location of the cache database
+    tables : dict of str to str
+        The tables to store the cache's contents in, with the values being the
+        column definitions
+    metadata : dict of str to str
+        The metadata the cache should be valid for
+    """
+
+    def __init__(self, cache_path: Path, tables: dict[str, str], metadata: dict):
+        self.path = cache_path
+        self._tables = tuple(tables)
+        self._lock = threading.Lock()
+        self._pending_writes = 0
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)"
+            )
+            for table, columns in tables.items():
+                self._connection.execute(
+                    f"CREATE TABLE IF NOT EXISTS {table} ({columns})"
+                )
+            stored_metadata = dict(
+                self._connection.execute("SELECT key, value FROM meta").fetchall()
+            )
+            if stored_metadata != metadata:
+                LOGGER.debug(f"{self.path.name} is out of date. Clearing.")
+                for table in self._tables:
+                    self._connection.execute(f"DELETE FROM {table}")
+                self._connection.execute("DELETE FROM meta")
+                self._connection.executemany(
+                    "INSERT INTO meta VALUES (?, ?)", metadata.items()
+                )
+
+    def _write(self, *statements: tuple[str, Sequence[Any]]) -> None:
+        """Execute one or more modifying SQL statements (without necessarily
+        committing them right away)"""
+        with self._lock:
+            for statement, parameters in statements:
+                self._connection.execute(statement, parameters)
+            self._pending_writes += 1
+            if self._pending_writes >= 100:
+                self._connection.commit()
+                self._pending_writes = 0
+
+    def _read(self, statement: str, parameters: Sequence[Any]) -> Any:
+        """Execute an SQL query, returning the first row of the result (or None
+        if the query returned no results)"""
+        with self._lock:
+            return self._connection.execute(statement, parameters).fetchone()
+
+    def clear(self) -> None:
+        """Remove all entries from the cache"""
+        with self._lock, self._connection:
+            for table in self._tables:
+                self._connection.execute(f"DELETE FROM {table}")
+            self._pending_writes = 0
+
+    def close(self) -> None:
+        """Write any pending entries to disk and close the cache"""
+        with self._lock:
+            self._connection.commit()
+            self._connection.close()
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+class ProbeCache(_SQLiteCache):
+    """An on-disk record of the results of probing media files, so that files that
+    haven't changed since the last run don't need to be re-probed.
+
+    Entries are keyed on the file's path, size, modification time and inode, and
+    the entire cache is invalidated whenever the version of ffprobe changes (or
+    whenever the schema version is bumped, _e.g._ because of a change to how files
+    are read).
+    The cache is safe to share between threads.
+
+    Parameters
+    ----------
+    cache_path : pathlike, optional
+        The location of the cache database. If None is specified, the cache will
+        be stored in the user cache folder.
+    version : str, optional
+        The version string that the cache should be valid for. If None is specified,
+        the version of the bundled ffprobe will be used.
+
+    Examples
+    --------
+    >>> with ProbeCache() as probe_cache:
+    ...     media_info = probe_track("hello.mp3", cache=probe_cache)
+    """
+
+    _SCHEMA_VERSION = "2"
+
+    def __init__(
+        self,
+        cache_path: os.PathLike | str | None = None,
+        version: str | None = None,
+    ):
+        self.version = ffprobe_version() if version is None else version
+        super().__init__(
+            Path(cache_path or user_cache_dir() / "probe_cache.sqlite3"),
+            {
+                "probes": "path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER,"
+                " inode INTEGER, result TEXT"
+            },
+            {"schema": self._SCHEMA_VERSION, "ffprobe": self.version},
+        )
+
+    def get(self, identity: tuple[str, int, int, int]) -> Any | None:
+        """Look up the cached probe result for a file
+
+        Parameters
+        ----------
+        identity : (str, int, int, int) tuple
+            The identity of the file to look up, as returned by `file_identity`
+
+        Returns
+        -------
+        JSON-serializable object or None
+            The cached result, or None if the file is not in the cache or has
+            changed since it was cached
+        """
+        path, *stat = identity
+        row = self._read(
+            "SELECT size, mtime_ns, inode, result FROM probes WHERE path = ?", (path,)
+        )
+        if row is None or list(row[:3]) != stat:
+            return None
+        return json.loads(row[3])
+
+    def put(self, identity: tuple[str, int, int, int], result: Any) -> None:
+        """Store the probe result for a file
+
+        Parameters
+        ----------
+        identity : (str, int, int, int) tuple
+            The identity of the file that was probed, as returned by `file_identity`
+            *before* the file was probed (so that any changes made to the file
+            mid-probe will invalidate the entry)
+        result : JSON-serializable object
+            The result to store
+        """
+        self._write(
+            (
+                "INSERT OR REPLACE INTO probes VALUES (?, ?, ?, ?, ?)",
+                (*identity, json.dumps(result)),
+            )
+        )
+
+
+class LibrarySnapshot(_SQLiteCache):
+    """An on-disk record of the contents of each folder in the user's music library,
+    so that folders that haven't changed since the last run don't need to be
+    re-read.
+
+    Entries are keyed on the folder's path, size, modification time and inode. Since
+    adding, removing or renaming anything within a folder updates the folder's
+    modification time, an unchanged identity means an unchanged listing.
+    The snapshot is safe to share between threads.
+
+    Parameters
+    ----------
+    cache_path : pathlike, optional
+        The location of the snapshot database. If None is specified, the snapshot
+        will be stored in the user cache folder.
+
+    Notes
+    -----
+    Folders modified within the last couple of seconds are never recorded, as
+    further changes made within the same tick of the filesystem's clock would go
+    unnoticed.
+    """
+
+    _SCHEMA_VERSION = "1"
+    _SETTLING_TIME_NS = 2_000_000_000
+
+    def __init__(self, cache_path: os.PathLike | str | None = None):
+        super().__init__(
+            Path(cache_path or user_cache_dir() / "library_snapshot.sqlite3"),
+            {
+                "folders": "path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER,"
+                " inode INTEGER, listing TEXT"
+            },
+            {"schema": self._SCHEMA_VERSION},
+        )
+
+    def get(
+        self, identity: tuple[str, int, int, int]
+    ) -> list[tuple[str, bool, bool]] | None:
+        """Look up the recorded contents of a folder
+
+        Parameters
+        ----------
+        identity : (str, int, int, int) tuple
+            The identity of the folder to look up, as returned by `file_identity`
+
+        Returns
+        -------
+        list of (str, bool, bool) tuples, or None
+            The recorded listing of the folder (see `put`), or None if the folder
+            is not in the snapshot or has changed since it was recorded
+        """
+        path, *stat = identity
+        row = self._read(
+            "SELECT size, mtime_ns, inode, listing FROM folders WHERE path = ?",
+            (path,),
+        )
+        if row is None or list(row[:3]) != stat:
+            return None
+        return [tuple(entry) for entry in json.loads(row[3])]
+
+    def put(
+        self,
+        identity: tuple[str, int, int, int],
+        listing: Sequence[tuple[str, bool, bool]],
+    ) -> None:
+        """Record the contents of a folder. Any previously recorded subfolders that
+        are no longer present (along with everything beneath them) will be removed
+        from the snapshot.
+
+        Parameters
+        ----------
+        identity : (str, int, int, int) tuple
+            The identity of the folder, as returned by `file_identity` *before* the
+            folder was read
+        listing : list of (str, bool, bool) tuples
+            The contents of the folder, with each entry giving the name of the
+            item, whether it's a file and whether it's a subfolder
+        """
+        path = identity[0]
+        current_subfolders = {name for name, _, is_subdir in listing if is_subdir}
+        stale_subfolders = {
+            name for name, _, is_subdir in self.get_recorded(path) if is_subdir
+        } - current_subfolders
+
+        statements: list[tuple[str, Sequence[Any]]] = []
+        for name in stale_subfolders:
+            subfolder = os.path.join(path, name)
+            statements.append(
+                (
+                    "DELETE FROM folders WHERE path = ? OR substr(path, 1, ?) = ?",
+                    (subfolder, len(subfolder) + 1, subfolder + os.sep),
+                )
+            )
+        if time.time_ns() - identity[2] > self._SETTLING_TIME_NS:
+            statements.append(
+                (
+                    "INSERT OR REPLACE INTO folders VALUES (?, ?, ?, ?, ?)",
+                    (*identity, json.dumps(listing)),
+                )
+            )
+        else:
+            statements.append(("DELETE FROM folders WHERE path = ?", (path,)))
+        self._write(*statements)
+
+    def get_recorded(self, path: str) -> list[tuple[str, bool, bool]]:
+        """Get the last-recorded contents of a folder, regardless of whether the
+        folder has since changed
+
+        Parameters
+        ----------
+        path : str
+            The absolute path of the folder
+
+        Returns
+        -------
+        list of (str, bool, bool) tuples
+            The recorded listing of the folder (see `put`), which will be empty if
+            the folder has never been recorded
+        """
+        row = self._read("SELECT listing FROM folders WHERE path = ?", (path,))
+        if row is None:
+            return []
+        return [tuple(entry) for entry in json.loads(row[0])]
+
+
+class SpecCache(_SQLiteCache):
+    """An on-disk record of the specs parsed out of each config file, so that
+    config files that haven't changed since the last run don't need to be re-parsed.
+
+    Entries are keyed on the config file's path and are only valid for as long as
+    the SHA-256 digest of the file's contents stays the same. The entire cache is
+    invalidated whenever the version of FoxNapRPG changes (since the spec format or
+    the rules for reading config files may have changed along with it).
+    The cache is safe to share between threads.
+
+    Specs are stored as JSON (rather than pickled), so reading a tampered-with
+    cache can't run arbitrary code.
+
+    Parameters
+    ----------
+    cache_path : pathlike, optional
+        The location of the cache database. If None is specified, the cache will
+        be stored in the user cache folder.
+    version : str, optional
+        The version string that the cache should be valid for. If None is specified,
+        the version of FoxNapRPG will be used.
+    """
+
+    _SCHEMA_VERSION = "2"
+
+    def __init__(
+        self,
+        cache_path: os.PathLike | str | None = None,
+        version: str | None = None,
+    ):
+        if version is None:
+            # (can't be imported at the top of the module without a circular import)
+            from . import __version__ as version
+        self.version = version
+        super().__init__(
+            Path(cache_path or user_cache_dir() / "spec_cache.sqlite3"),
+            {"specs": "path TEXT PRIMARY KEY, digest TEXT, specs TEXT"},
+            {"schema": self._SCHEMA_VERSION, "foxnap_rpg": self.version},
+        )
+
+    def get(self, path: str, digest: str) -> list[Any] | None:
+        """Look up the cached specs for a config file
+
+        Parameters
+        ----------
+        path : str
+            The absolute path of the config file
+        digest : str
+            The hex digest of the config file's current contents
+
+        Returns
+        -------
+        list of JSON-serializable objects or None
+            The cached specs, or None if the file is not in the cache, has
+            changed since it was cached or if its entry can't be read
+        """
+        row = self._read("SELECT digest, specs FROM specs WHERE path = ?", (path,))
+        if row is None or row[0] != digest:
+            return None
+        try:
+            return json.loads(row[1])
+        except ValueError as decode_fail:
+            LOGGER.debug(f"Could not load cached specs for {path}:\n  {decode_fail}")
+            return None
+
+    def put(self, path: str, digest: str, specs: Sequence[Any]) -> None:
+        """Store the specs parsed from a config file
+
+        Parameters
+        ----------
+        path : str
+            The absolute path of the config file
+        digest : str
+            The hex digest of the config file's contents, as read *before* the
+            file was parsed
+        specs : list of JSON-serializable objects
+            The (serialized) specs to store
+        """
+        self._write(
+            (
+                "INSERT OR REPLACE INTO specs VALUES (?, ?, ?)",
+                (path, digest, json.dumps(list(specs))),
+            )
+        )
+
+
+class ConversionCache(_SQLiteCache):
+    """A content-addressed store of converted music files, so that tracks don't
+    need to be re-encoded when neither they nor the conversion settings have
+    changed.
+
+    Converted files are stored under a key derived from the contents of the source
+    file, the arguments passed to ffmpeg and the version of ffmpeg, so the same
+    track will be found again even if it's been moved, renamed or copied. Since
+    hashing a large music file takes a while, the digests of source files are
+    remembered (keyed on the file's path, size, modification time and inode).
+    The cache is safe to share between threads.
+
+    So that the store doesn't grow without bound, whenever the cache is opened,
+    converted files that haven't been stored or retrieved within `max_age_days`
+    are removed, as are the remembered digests of files that no longer exist.
+
+    Parameters
+    ----------
+    cache_path : pathlike, optional
+        The location of the cache database. The converted files will be kept in a
+        folder alongside it (named the same, minus the extension). If None is
+        specified, the cache will be stored in the user cache folder.
+    version : str, optional
+        The version string that converted files should be valid for. If None is
+        specified, the version of the bundled ffmpeg will be used.
+    max_age_days : float, optional
+        How long converted files are kept in the store after they were last used.
+        Default is 30 days. If None is specified, files will be kept until the
+        cache is cleared.
+
+    Notes
+    -----
+    Converted files are hard-linked (where possible) rather than copied out of
+    the store, so files retrieved from the store should be replaced rather than
+    modified in place.
+    """
+
+    _SCHEMA_VERSION = "1"
+
+    def __init__(
+        self,
+        cache_path: os.PathLike | str | None = None,
+        version: str | None = None,
+        max_age_days: float | None = 30,
+    ):
+        self.version = ffmpeg_version() if version is None else version
+        super().__init__(
+            Path(cache_path or user_cache_dir() / "conversions.sqlite3"),
+            {
+                "digests": "path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER,"
+                " inode INTEGER, digest TEXT",
+                "stored": "key TEXT PRIMARY KEY, last_used_ns INTEGER",
+            },
+            {"schema": self._SCHEMA_VERSION},
+        )
+        self.store = self.path.with_suffix("")
+        self.store.mkdir(exist_ok=True)
+        if max_age_days is not None:
+            self._prune(time.time_ns() - int(max_age_days * 86400 * 1e9))
+
+    def _prune(self, cutoff_ns: int) -> None:
+        """Remove the converted files that haven't been used since the cutoff, along
+        with the digests of any source files that are no longer there"""
+        with self._lock, self._connection:
+            last_used = dict(
+                self._connection.execute(
+                    "SELECT key, last_used_ns FROM stored"
+                ).fetchall()
+            )
+            expired: list[str] = []
+            for stored in self.store.iterdir():
+                try:
+                    # files stored by an older version of the cache (or left over
+                    # from an interrupted write) won't have a record of their use
+                    used = max(last_used.get(stored.name, 0), stored.stat().st_mtime_ns)
+                    if used < cutoff_ns:
+                        stored.unlink()
+                        expired.append(stored.name)
+                except FileNotFoundError:  # removed by someone else
+                    expired.append(stored.name)
+                except OSError as prune_fail:
+                    LOGGER.debug(f"Could not remove {stored}:\n  {prune_fail}")
+            expired.extend(key for key in last_used if not (self.store / key).exists())
+            self._connection.executemany(
+                "DELETE FROM stored WHERE key = ?", ((key,) for key in expired)
+            )
+            if expired:
+                LOGGER.debug(f"Removed {len(expired)} unused files from {self.store}")
+
+            gone = [
+                (path,)
+                for (path,) in self._connection.execute("SELECT path FROM digests")
+                if not os.path.exists(path)
+            ]
+            self._connection.executemany("DELETE FROM digests WHERE path = ?", gone)
+
+    def key(self, input_path: os.PathLike | str, arguments: Sequence[str]) -> str:
+        """Work out the key a conversion's output is stored under
+
+        Parameters
+        ----------
+        input_path : pathlike
+            The file being converted
+        arguments : list of str
+            The arguments being passed to ffmpeg (with the input and output paths
+            replaced by placeholders)
+
+        Returns
+        -------
+        str
+            The key for the converted file
+
+        Raises
+        ------
+        OSError
+            If the input file cannot be read
+        """
+        key = hashlib.sha256()
+        for component in (self._digest(input_path), *arguments, self.version):
+            key.update(component.encode("utf-8"))
+            key.update(b"\0")
+        return key.hexdigest()
+
+    def _digest(self, file_path: os.PathLike | str) -> str:
+        """Get the SHA-256 digest of a file's contents, hashing the file only if it's
+        changed since it was last hashed"""
+        identity = file_identity(file_path)
+        path, *stat = identity
+        row = self._read(
+            "SELECT size, mtime_ns, inode, digest FROM digests WHERE path = ?",
+            (path,),
+        )
+        if row is not None and list(row[:3]) == stat:
+            return row[3]
+        digest = hashlib.sha256()
+        with open(path, "rb") as file:
+            while chunk := file.read(1024 * 1024):
+                digest.update(chunk)
+        self._write(
+            (
+                "INSERT OR REPLACE INTO digests VALUES (?, ?, ?, ?, ?)",
+                (*identity, digest.hexdigest()),
+            )
+        )
+        return digest.hexdigest()
+
+    def get(self, key: str, output_path: os.PathLike | str) -> bool:
+        """Retrieve a converted file from the store
+
+        Parameters
+        ----------
+        key : str
+            The key the file was stored under (see `key`)
+        output_path : pathlike
+            Where to put the converted file. Anything already at that path will be
+            replaced.
+
+        Returns
+        -------
+        bool
+            True if the file was found in the store (and placed at the output
+            path), False otherwise
+        """
+        stored = self.store / key
+        try:
+            _place(stored, Path(output_path))
+        except FileNotFoundError:
+            return False
+        self._mark_used(key)
+        return True
+
+    def put(self, key: str, converted_path: os.PathLike | str) -> None:
+        """Add a converted file to the store
+
+        Parameters
+        ----------
+        key : str
+            The key to store the file under (see `key`)
+        converted_path : pathlike
+            The converted file
+        """
+        _place(Path(converted_path), self.store / key)
+        self._mark_used(key)
+
+    def _mark_used(self, key: str) -> None:
+        """Record that a stored file has just been used, so that it won't be pruned
+        any time soon"""
+        self._write(
+            ("INSERT OR REPLACE INTO stored VALUES (?, ?)", (key, time.time_ns()))
+        )
+
+    def clear(self) -> None:
+        """Remove all entries (and converted files) from the cache"""
+        super().clear()
+        for stored in self.store.iterdir():
+            stored.unlink(missing_ok=True)
+
+
+def _place(source: Path, destination: Path) -> None:
+    """Atomically put a file at the destination path, hard-linking it if possible
+    and copying it if not"""
+    staging = destination.with_name(
+        f".{destination.name}.{os.getpid()}-{threading.get_ident()}"
+    )
+    staging.unlink(missing_ok=True)
+    try:
+        os.link(source, staging)
+    except FileNotFoundError:
+        raise
+    except OSError:
+        shutil.copyfile(source, staging)
+    os.replace(staging, destination)
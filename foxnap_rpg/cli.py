@@ -2,22 +2,35 @@
 
 import argparse
 import logging
+import os
+import sqlite3
 import sys
-from collections.abc import Generator, Iterable, Sequence
+from collections.abc import Callable, Generator, Iterable, Sequence
+from functools import partial
 from pathlib import Path
-from typing import Any
+from tempfile import TemporaryDirectory
+from typing import Any, TypeVar
+
+import ffmpeg
 
 from . import __version__
 from .builder import Spec, TrackBuilder
-from .config import read_specs_from_config_file
+from .cache import ConversionCache, LibrarySnapshot, ProbeCache, SpecCache
+from .config import read_folder_specs, read_specs_from_config_file
 from .data_generator import LOGGER as DATAGEN_LOGGER
 from .data_generator import generate_datapack
+from .headers import might_be_audio
+from .library import iter_files
+from .media import MediaInfo, probe_track
 from .pack_generator import LOGGER as PACKGEN_LOGGER
 from .pack_generator import Track, generate_resource_pack
-from .utils import BUILT_IN_DISC_COUNT, is_valid_music_track
+from .utils import BUILT_IN_DISC_COUNT, is_valid_music_track, parallel_map
+from .watch import watch_for_changes
 
 LOGGER = logging.getLogger(__name__)
 
+C = TypeVar("C", ProbeCache, LibrarySnapshot, SpecCache, ConversionCache)
+
 
 def _get_cwd() -> Path:
     """Get the folder that should be considered the current working directory,
@@ -30,6 +43,35 @@ def _get_cwd() -> Path:
     return Path(".")
 
 
+def _positive_int(value: str) -> int:
+    """Parse a command-line value that must be a positive integer
+
+    Parameters
+    ----------
+    value : str
+        The value passed into the command line
+
+    Returns
+    -------
+    int
+        The parsed value
+
+    Raises
+    ------
+    argparse.ArgumentTypeError
+        If the value is not an integer no less than 1
+    """
+    try:
+        parsed = int(value)
+    except ValueError:
+        parsed = 0
+    if parsed < 1:
+        raise argparse.ArgumentTypeError(
+            f"must be an integer no less than 1 (got {value!r})"
+        )
+    return parsed
+
+
 def parse_args(
     argv: Sequence[str],
 ) -> tuple[Path, Path, Path, list[Path], Path | None, dict[str, Any]]:
@@ -174,6 +216,53 @@ def parse_args(
         "of an existing resource pack.",
     )
 
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        action="store",
+        default=os.cpu_count() or 1,
+        type=_positive_int,
+        help=(
+            "the maximum number of music files to process at once."
+            "\nDefault is the number of CPUs on this machine."
+        ),
+    )
+
+    parser.add_argument(
+        "--no-cache",
+        dest="use_cache",
+        action="store_false",
+        help="do not read from or write to the caches."
+        "\nBy default, the results of probing each music file, the contents of each"
+        "\ninput folder, the specs read from config files and the converted tracks"
+        "\nare all cached so that anything unchanged doesn't need to be re-probed,"
+        "\nre-read or re-encoded on subsequent runs.",
+    )
+
+    parser.add_argument(
+        "--clear-cache",
+        action="store_true",
+        help="clear the caches before running",
+    )
+
+    parser.add_argument(
+        "--probe-all",
+        action="store_true",
+        help="probe every input file with ffprobe, even ones that are obviously not"
+        "\nmusic files (such as images, cue sheets and logs). By default, such files"
+        "\nare skipped based on their file extensions and contents.",
+    )
+
+    parser.add_argument(
+        "-w",
+        "--watch",
+        action="store_true",
+        help="after generating the packs, keep watching the input files and folders"
+        "\n(and the specs file) for changes, regenerating the packs whenever"
+        "\nsomething changes. Only tracks that were added or changed will be"
+        "\nre-encoded.",
+    )
+
     parser.add_argument(
         "--silent",
         dest="verbosity",
@@ -194,6 +283,11 @@ def parse_args(
     builder_kwargs = {
         "start_at": args.start_at,
         "verbosity": args.verbosity or 20,
+        "jobs": args.jobs,
+        "use_cache": args.use_cache,
+        "clear_cache": args.clear_cache,
+        "probe_all": args.probe_all,
+        "watch": args.watch,
         "required": args.default_required,
         "unspecified_file_handling": args.unspecified_file_handling,
         "enforce_contiguous_track_numbers": (
@@ -218,6 +312,12 @@ def parse_args(
 def resolve_tracks(
     builder: TrackBuilder,
     *inputs: Path,
+    probe_cache: ProbeCache | None = None,
+    jobs: int = 1,
+    probe_all: bool = False,
+    snapshot: LibrarySnapshot | None = None,
+    folder_specs: bool = True,
+    spec_cache: SpecCache | None = None,
 ) -> Generator[Track, None, None]:
     """Given a list of input paths (and, optionally, a configuration file), generate
     the track specifications
@@ -229,6 +329,30 @@ def resolve_tracks(
     *inputs : Path
         The paths to grab inputs from. If no paths are provided, any files in the
         current working directory will be scanned
+    probe_cache : ProbeCache, optional
+        A cache of the results of probing music files on previous runs. If None
+        is provided, every file will be probed.
+    jobs : int, optional
+        The maximum number of files to probe (and folders to read) at once.
+        Regardless of the order in which the probes complete, tracks will always be
+        generated in sorted order. Default is 1.
+    probe_all : bool, optional
+        By default, files that are obviously not music files (based on their
+        extensions or their first few bytes) are skipped without being probed.
+        Set this to True to probe every file regardless.
+    snapshot : LibrarySnapshot, optional
+        A record of the contents of the input folders from previous runs, so that
+        unchanged folders don't need to be re-read. If None is provided, every
+        folder will be read.
+    folder_specs : bool, optional
+        By default, any spec files (named "foxnap_specs", with any supported
+        config extension) found inside of the input folders (or their subfolders)
+        will be read in and added to the builder right before the first track
+        in that folder is generated, with the path specs in each file being
+        relative to its folder. Set this to False to ignore such files.
+    spec_cache : SpecCache, optional
+        A cache of the specs read from config files on previous runs. If None is
+        provided, every folder spec file will be parsed.
 
     Returns
     -------
@@ -236,28 +360,139 @@ def resolve_tracks(
         A generator that will loop through all the input paths and yield Track
         specifications
     """
+    probes = parallel_map(
+        partial(_probe_music_file, probe_cache=probe_cache, probe_all=probe_all),
+        _find_input_files(*inputs, jobs=jobs, snapshot=snapshot),
+        jobs=jobs,
+    )
+    input_folders = {input_path for input_path in inputs if input_path.is_dir()}
+    checked_folders: set[Path] = set()
+    for input_file, media_info in probes:
+        if media_info is None:
+            continue
+        LOGGER.debug(f"Found music file {input_file}")
+        if folder_specs:
+            _load_folder_specs(
+                builder, input_file, input_folders, checked_folders, spec_cache
+            )
+        try:
+            yield builder[media_info]
+        except ValueError as oh_no:
+            LOGGER.warning(
+                f"Could not parse {input_file}:" f"\n  {oh_no}" "\n\nSkipping."
+            )
+
+
+def _load_folder_specs(
+    builder: TrackBuilder,
+    input_file: Path,
+    input_folders: set[Path],
+    checked_folders: set[Path],
+    spec_cache: SpecCache | None = None,
+) -> None:
+    """Add the specs from the spec files of any folders containing the given file
+    (up to the input folder it was found in) that haven't already been checked,
+    outermost folder first"""
+    unchecked: list[Path] = []
+    for folder in input_file.parents:
+        if folder in checked_folders:
+            break
+        unchecked.append(folder)
+        if folder in input_folders:
+            break
+    else:
+        # then the file was specified directly, rather than found in a folder
+        return
+    checked_folders.update(unchecked)
+
+    for folder in reversed(unchecked):
+        try:
+            specs = read_folder_specs(folder, cache=spec_cache)
+        except ValueError as parse_fail:
+            LOGGER.warning(
+                f"Could not read the spec file in {folder}:"
+                f"\n  {parse_fail}"
+                "\n\nSkipping."
+            )
+            continue
+        for spec in specs:
+            try:
+                builder.add_spec(spec)
+            except (ValueError, RuntimeError) as add_fail:
+                LOGGER.warning(
+                    f"Could not add the spec '{os.fspath(spec.path_spec)}':"
+                    f"\n  {add_fail}"
+                    "\n\nSkipping."
+                )
+
+
+def _find_input_files(
+    *inputs: Path, jobs: int = 1, snapshot: LibrarySnapshot | None = None
+) -> Generator[Path, None, None]:
+    """Generate the paths of all files within the specified inputs, in sorted
+    order"""
     for input_path in sorted(inputs):
         LOGGER.debug(f"Searching {input_path}")
         if input_path.is_file():
-            input_files: Iterable[Path] = (input_path,)
+            yield input_path
         elif input_path.is_dir():
-            input_files = sorted(input_path.rglob("*"))
+            yield from iter_files(input_path, jobs=jobs, snapshot=snapshot)
         else:
             LOGGER.warning(f"{input_path} is not a valid path")
-            continue
-        for input_file in input_files:
-            if input_file.is_dir():
-                continue
-            if is_valid_music_track(input_file):
-                LOGGER.debug(f"Found music file {input_file}")
-                try:
-                    yield builder[input_file]
-                except ValueError as oh_no:
-                    LOGGER.warning(
-                        f"Could not parse {input_file}:" f"\n  {oh_no}" "\n\nSkipping."
-                    )
-            else:
-                continue
+
+
+def _probe_music_file(
+    file_path: Path, probe_cache: ProbeCache | None, probe_all: bool = False
+) -> tuple[Path, MediaInfo | None]:
+    """Probe a file, returning the results only if it's a music track that can be
+    converted using ffmpeg"""
+    if not (probe_all or might_be_audio(file_path)):
+        LOGGER.debug(f"Skipping {file_path}, which is not a music file")
+        return file_path, None
+    try:
+        media_info = probe_track(file_path, cache=probe_cache)
+    except ffmpeg.Error:
+        return file_path, None
+    return file_path, (media_info if is_valid_music_track(media_info) else None)
+
+
+def _open_cache(
+    cache_class: type[C], description: str, use_cache: bool, clear_cache: bool
+) -> C | None:
+    """Open (and, if requested, clear) one of the on-disk caches
+
+    Parameters
+    ----------
+    cache_class : type
+        The type of cache to open
+    description : str
+        What to call the cache in log messages
+    use_cache : bool
+        Whether the cache should be used for this run
+    clear_cache : bool
+        Whether the cache should be cleared before running
+
+    Returns
+    -------
+    cache or None
+        The opened cache, or None if the cache is not to be used (or could not be
+        opened)
+    """
+    if not (use_cache or clear_cache):
+        return None
+    try:
+        cache = cache_class()
+    except (OSError, sqlite3.Error) as cache_fail:
+        LOGGER.warning(f"Could not open the {description}:\n  {cache_fail}")
+        return None
+    if clear_cache:
+        LOGGER.info(f"Clearing {description} {cache.path}")
+        cache.clear()
+    if not use_cache:
+        cache.close()
+        return None
+    LOGGER.debug(f"Using {description} {cache.path}")
+    return cache
 
 
 def main() -> None:
@@ -279,13 +514,139 @@ def main() -> None:
     PACKGEN_LOGGER.setLevel(log_level)
     DATAGEN_LOGGER.setLevel(log_level)
 
+    jobs = builder_kwargs.pop("jobs")
+    probe_all = builder_kwargs.pop("probe_all")
+    use_cache = builder_kwargs.pop("use_cache")
+    clear_cache = builder_kwargs.pop("clear_cache")
+    probe_cache = _open_cache(ProbeCache, "metadata cache", use_cache, clear_cache)
+    snapshot = _open_cache(LibrarySnapshot, "library snapshot", use_cache, clear_cache)
+    spec_cache = _open_cache(SpecCache, "spec cache", use_cache, clear_cache)
+    conversion_cache = _open_cache(
+        ConversionCache, "conversion cache", use_cache, clear_cache
+    )
+
+    watch = builder_kwargs.pop("watch")
+
+    build = partial(
+        _build,
+        output_path,
+        datapack_path,
+        config_path,
+        inputs,
+        config,
+        builder_kwargs,
+        probe_cache=probe_cache,
+        snapshot=snapshot,
+        spec_cache=spec_cache,
+        conversion_cache=conversion_cache,
+        jobs=jobs,
+        probe_all=probe_all,
+    )
+    try:
+        if not watch:
+            build()
+            return
+        with TemporaryDirectory() as working_dir:
+            build(working_dir=Path(working_dir))
+            _watch_and_rebuild(
+                partial(build, working_dir=Path(working_dir)),
+                [*inputs, *([config] if config else [])],
+                ignore=(output_path, datapack_path, config_path),
+            )
+    finally:
+        for cache in (probe_cache, snapshot, spec_cache, conversion_cache):
+            if cache is not None:
+                cache.close()
+
+
+def _watch_and_rebuild(
+    build: Callable[[], None], watched: Sequence[Path], ignore: Sequence[Path]
+) -> None:
+    """Rebuild every time any of the watched paths change, until interrupted"""
+    LOGGER.info("Watching for changes. Press Ctrl+C to stop.")
+    try:
+        for changes in watch_for_changes(watched, ignore=ignore):
+            LOGGER.info(f"Detected changes to {len(changes)} path(s). Rebuilding.")
+            for changed_path in sorted(changes):
+                LOGGER.debug(f"  {changed_path}")
+            try:
+                build()
+            except Exception as build_fail:
+                # (whatever went wrong, it may well be fixed by the next change)
+                LOGGER.error(f"Rebuild failed:\n  {build_fail!r}")
+    except KeyboardInterrupt:
+        LOGGER.info("No longer watching for changes")
+
+
+def _build(
+    output_path: Path,
+    datapack_path: Path,
+    config_path: Path,
+    inputs: Sequence[Path],
+    config: Path | None,
+    builder_kwargs: dict[str, Any],
+    probe_cache: ProbeCache | None = None,
+    snapshot: LibrarySnapshot | None = None,
+    spec_cache: SpecCache | None = None,
+    conversion_cache: ConversionCache | None = None,
+    jobs: int = 1,
+    probe_all: bool = False,
+    working_dir: Path | None = None,
+) -> None:
+    """Generate the resource pack, datapack and mod config file
+
+    Parameters
+    ----------
+    output_path : Path
+        The output path for the resource pack zip
+    datapack_path : Path
+        The output path for the datapack zip
+    config_path : Path
+        The output path for the mod config file
+    inputs : list of Paths
+        The paths of music files or folders to include
+    config : Path or None
+        The path of a configuration file to load (or None if one is not specified)
+    builder_kwargs : dict
+        Settings for the TrackBuilder
+    probe_cache : ProbeCache, optional
+        A cache of the results of probing music files on previous runs
+    snapshot : LibrarySnapshot, optional
+        A record of the contents of the input folders from previous runs
+    spec_cache : SpecCache, optional
+        A cache of the specs read from config files on previous runs
+    conversion_cache : ConversionCache, optional
+        A store of the tracks converted on previous runs
+    jobs : int, optional
+        The maximum number of files to probe (and folders to read, and tracks to
+        convert) at once
+    probe_all : bool, optional
+        Whether to probe every input file, even ones that obviously aren't music
+    working_dir : Path, optional
+        A folder in which to keep the unpacked contents of the resource pack, so
+        that subsequent builds only need to regenerate tracks that have changed
+    """
     if config:
-        specs: Iterable[Spec] = read_specs_from_config_file(config)
+        specs: Iterable[Spec] = read_specs_from_config_file(config, cache=spec_cache)
     else:
         specs = ()
     with TrackBuilder(*specs, **builder_kwargs) as builder:
-        tracks = resolve_tracks(builder, *inputs)
-        track_durations = generate_resource_pack(output_path, *tracks)
+        tracks = resolve_tracks(
+            builder,
+            *inputs,
+            probe_cache=probe_cache,
+            jobs=jobs,
+            probe_all=probe_all,
+            snapshot=snapshot,
+            spec_cache=spec_cache,
+        )
+        track_durations = generate_resource_pack(
+            output_path,
+            *tracks,
+            working_dir=working_dir,
+            jobs=jobs,
+            conversion_cache=conversion_cache,
+        )
     jukebox_spec = (
         (f"track_{num}", duration, (num - 1) % 15 + 1)
         for num, duration in track_durations.items()
@@ -1,23 +1,40 @@
 """Logic for parsing config files into spec lists"""
 
 import csv
+import glob
+import hashlib
 import json
+import logging
 import os
+import re
 from configparser import ConfigParser
+from functools import lru_cache
+from itertools import count
 from pathlib import Path
-from typing import Any
+from typing import Any, Callable, Iterator, TextIO
 
 from .builder import Spec
+from .cache import SpecCache
 from .pack_generator import License
+from .utils import REGEX_SPEC_PREFIX, scope_inline_flags
 
+LOGGER = logging.getLogger(__name__)
 
-def read_specs_from_config_file(config_path: str | os.PathLike) -> list[Spec]:
+
+def read_specs_from_config_file(
+    config_path: str | os.PathLike, cache: SpecCache | None = None
+) -> list[Spec]:
     """Read in a list of track specs from a config file
 
     Parameters
     ----------
     config_path : pathlike
         The path to the config file.
+    cache : SpecCache, optional
+        A cache of the specs read from config files on previous runs. If one is
+        provided, a config file whose contents haven't changed since it was
+        cached won't need to be re-parsed. If None is specified, the file will
+        always be parsed.
 
     Returns
     -------
@@ -32,91 +49,414 @@ def read_specs_from_config_file(config_path: str | os.PathLike) -> list[Spec]:
       - CSV (.csv, .tsv)
     - This method will attempt to read files ending in no extension or .txt as INI.
     """
+    if cache is None:
+        return list(iter_specs_from_config_file(config_path))
+
+    path = os.path.abspath(config_path)
+    try:
+        digest = _hash_file(path)
+    except OSError as base_exception:
+        raise ValueError(
+            f"Could not parse '{os.fspath(config_path)}'"
+        ) from base_exception
+    if (cached := cache.get(path, digest)) is not None:
+        try:
+            specs = [_decode_spec(encoded) for encoded in cached]
+        except (KeyError, TypeError, ValueError) as decode_fail:
+            LOGGER.debug(f"Could not load cached specs for {path}:\n  {decode_fail}")
+        else:
+            LOGGER.debug(f"Loaded {len(specs)} specs for {path} from the cache")
+            return specs
+    specs = list(iter_specs_from_config_file(config_path))
+    cache.put(path, digest, [_encode_spec(spec) for spec in specs])
+    return specs
+
+
+def _encode_spec(spec: Spec) -> dict[str, Any]:
+    """Convert a Spec into a form that can be serialized to JSON"""
+    return {
+        **spec._asdict(),
+        "path_spec": os.fspath(spec.path_spec),
+        "license_type": None if spec.license_type is None else spec.license_type.name,
+    }
+
+
+def _decode_spec(encoded: dict[str, Any]) -> Spec:
+    """Reconstitute a Spec from its serialized form"""
+    license_type = encoded["license_type"]
+    return Spec(
+        **{
+            **encoded,
+            "path_spec": _to_path_spec(encoded["path_spec"], encoded["distinct"]),
+            "license_type": None if license_type is None else License[license_type],
+        }
+    )
+
+
+def _hash_file(file_path: str) -> str:
+    """Compute the SHA-256 digest of a file's contents (without reading the whole
+    file into memory at once)"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        while chunk := file.read(1024 * 1024):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# name (minus extension) of the spec files that can be placed inside music
+# folders to describe just the tracks within
+FOLDER_SPEC_FILE_STEM = "foxnap_specs"
+
+_FOLDER_SPEC_FILE_SUFFIXES = (
+    ".ini",
+    ".cfg",
+    ".config",
+    ".conf",
+    ".txt",
+    ".json",
+    ".csv",
+    ".tsv",
+)
+
+
+def find_folder_spec_file(folder: str | os.PathLike) -> Path | None:
+    """Look for a spec file inside of a music folder
+
+    Parameters
+    ----------
+    folder : pathlike
+        The folder to look in
+
+    Returns
+    -------
+    Path or None
+        The path of the folder's spec file (a file named "foxnap_specs" with
+        any of the supported config extensions), or None if the folder doesn't
+        have one. If there's more than one, INI files are preferred over JSON,
+        and JSON over CSV.
+    """
+    for suffix in _FOLDER_SPEC_FILE_SUFFIXES:
+        candidate = Path(folder) / (FOLDER_SPEC_FILE_STEM + suffix)
+        if candidate.is_file():
+            return candidate
+    return None
+
+
+def read_folder_specs(
+    folder: str | os.PathLike, cache: SpecCache | None = None
+) -> list[Spec]:
+    """Read in the specs from a music folder's spec file (if it has one)
+
+    The path specs within a folder's spec file are relative to that folder, so
+    they'll only match files within it (or within its subfolders).
+
+    Parameters
+    ----------
+    folder : pathlike
+        The folder to read the specs of
+    cache : SpecCache, optional
+        A cache of the specs read from config files on previous runs
+
+    Returns
+    -------
+    list of Specs
+        The folder's specs, with their path specs anchored to the folder. This
+        will be empty if the folder doesn't have a spec file.
+
+    Raises
+    ------
+    ValueError
+        If the folder's spec file could not be parsed
+    """
+    if (spec_file := find_folder_spec_file(folder)) is None:
+        return []
+    LOGGER.debug(f"Reading specs from {spec_file}")
+    return [
+        _scope_to_folder(spec, folder)
+        for spec in read_specs_from_config_file(spec_file, cache=cache)
+    ]
+
+
+def _scope_to_folder(spec: Spec, folder: str | os.PathLike) -> Spec:
+    """Prefix a spec's path spec with the (full) path of a folder, so that it only
+    matches files within that folder"""
+    # path specs match the *ends* of paths, so the anchor isn't needed (and would
+    # just trip up the wildcard matching)
+    folder_parts = Path(os.path.abspath(folder)).parts[1:]
+    path_spec = os.fspath(spec.path_spec)
+    if spec.distinct:
+        return spec._replace(path_spec=Path(*folder_parts, path_spec))
+    if path_spec.startswith(REGEX_SPEC_PREFIX):
+        prefix = re.escape("/".join(folder_parts) + "/")
+        # (any flags at the start of the expression would no longer be at the
+        # start once the folder's been prepended)
+        regex = scope_inline_flags(path_spec[len(REGEX_SPEC_PREFIX) :])
+        return spec._replace(path_spec=f"{REGEX_SPEC_PREFIX}{prefix}(?:{regex})")
+    return spec._replace(
+        path_spec=Path(*(glob.escape(part) for part in folder_parts), path_spec)
+    )
+
+
+def iter_specs_from_config_file(config_path: str | os.PathLike) -> Iterator[Spec]:
+    """Read track specs from a config file one at a time, without loading the
+    whole file into memory (except for INI files, which can't be read piecemeal)
+
+    Parameters
+    ----------
+    config_path : pathlike
+        The path to the config file. See `read_specs_from_config_file` for the
+        supported formats.
+
+    Returns
+    -------
+    iterator of Specs
+        The Specs parsed from the config file, in the order they appear
+
+    Raises
+    ------
+    ValueError
+        If the config file (or any entry within it) could not be parsed. Note
+        that, since the file is read as it's iterated through, this may only
+        be raised after earlier specs have already been yielded.
+    """
     config_path = Path(config_path)
+    parser: Callable[[Path], Iterator[dict[str, Any]]]
     if config_path.suffix.lower() in (".ini", ".cfg", ".config", ".conf", ".txt", ""):
         parser = _parse_ini
     elif config_path.suffix.lower() in (".json",):
         parser = _parse_json
     elif config_path.suffix.lower() in (".csv", ".tsv"):
         parser = _parse_csv
-
-    try:
-        spec_dicts = parser(config_path)
-    except Exception as base_exception:
+    else:
         raise ValueError(
-            f"Could not parse '{os.fspath(config_path)}'"
-        ) from base_exception
+            f"Could not parse '{os.fspath(config_path)}':"
+            f" unsupported file type '{config_path.suffix}'"
+        )
 
-    spec_list: list[Spec] = []
-    for i, spec_dict in enumerate(spec_dicts):
+    spec_dicts = parser(config_path)
+    for i in count():
+        try:
+            spec_dict = next(spec_dicts)
+        except StopIteration:
+            return
+        except Exception as base_exception:
+            raise ValueError(
+                f"Could not parse '{os.fspath(config_path)}'"
+            ) from base_exception
         try:
-            spec_list.append(_convert_dict_to_spec(spec_dict))
+            yield _convert_dict_to_spec(
+                spec_dict, columns=_map_columns(tuple(spec_dict))
+            )
         except Exception as base_exception:
             raise ValueError(
                 f"Could not parse entry {i + 1} from '{os.fspath(config_path)}'"
             ) from base_exception
-    return spec_list
 
 
-def _parse_ini(config_path: Path) -> list[dict[str, Any]]:
+def _parse_ini(config_path: Path) -> Iterator[dict[str, Any]]:
     parser = ConfigParser()
     parser.read(config_path)
-    return [dict(**parser[section], header=section) for section in parser.sections()]
+    for section in parser.sections():
+        yield dict(**parser[section], header=section)
 
 
-def _parse_json(config_path: Path) -> list[dict[str, Any]]:
+def _parse_json(config_path: Path) -> Iterator[dict[str, Any]]:
     with config_path.open() as json_file:
-        raw_config = json.load(json_file)
-    if isinstance(raw_config, list):
-        return raw_config
-    if isinstance(raw_config, dict):
-        return [dict(**entry, header=key) for key, entry in raw_config.items()]
-    raise ValueError(f"Could not parse '{os.fspath(config_path)}'")
-
+        reader = _JSONStreamReader(json_file)
+        opening = reader.next_char()
+        if opening == "[":
+            while (entry := reader.next_item("]")) is not None:
+                yield entry
+        elif opening == "{":
+            while (key := reader.next_item("}")) is not None:
+                if not isinstance(key, str) or reader.next_char() != ":":
+                    raise ValueError(f"Could not parse '{os.fspath(config_path)}'")
+                yield dict(**reader.next_value(), header=key)
+        else:
+            raise ValueError(f"Could not parse '{os.fspath(config_path)}'")
+
+
+class _JSONStreamReader:
+    """A reader for pulling the items out of a top-level JSON array or object one
+    at a time, holding only a chunk of the file in memory"""
+
+    _CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, json_file: TextIO):
+        self._file = json_file
+        self._buffer = ""
+        self._position = 0
+        self._exhausted = False
+        self._first = True
+
+    def _read_more(self) -> bool:
+        if self._exhausted:
+            return False
+        chunk = self._file.read(self._CHUNK_SIZE)
+        if not chunk:
+            self._exhausted = True
+            return False
+        self._buffer = self._buffer[self._position :] + chunk
+        self._position = 0
+        return True
 
-def _parse_csv(config_path: Path) -> list[dict[str, Any]]:
-    with config_path.open() as csv_file:
-        dialect = csv.Sniffer().sniff(csv_file.read())
-        csv_file.seek(0)
-        reader = csv.DictReader(csv_file, dialect=dialect)
-        return [row for row in reader]
+    def _skip_whitespace(self) -> None:
+        while True:
+            while (
+                self._position < len(self._buffer)
+                and self._buffer[self._position] in " \t\n\r"
+            ):
+                self._position += 1
+            if self._position < len(self._buffer) or not self._read_more():
+                return
+
+    def next_char(self) -> str:
+        """Consume the next non-whitespace character (returning "" at the end of
+        the file)"""
+        self._skip_whitespace()
+        if self._position >= len(self._buffer):
+            return ""
+        char = self._buffer[self._position]
+        self._position += 1
+        return char
+
+    def next_value(self) -> Any:
+        """Decode the next complete JSON value"""
+        decoder = json.JSONDecoder()
+        self._skip_whitespace()
+        while True:
+            try:
+                value, end = decoder.raw_decode(self._buffer, self._position)
+            except json.JSONDecodeError:
+                if not self._read_more():
+                    raise
+                continue
+            # make sure the value didn't just get cut off at the end of the chunk
+            # (e.g. a number)
+            if end >= len(self._buffer) and self._read_more():
+                continue
+            self._position = end
+            return value
+
+    def next_item(self, closing: str) -> Any | None:
+        """Decode the next item in the array or object (returning None once the
+        closing bracket is reached)"""
+        self._skip_whitespace()
+        if self._buffer[self._position : self._position + 1] == closing:
+            self._position += 1
+            return None
+        if not self._first and self.next_char() != ",":
+            raise ValueError("expected a comma between items")
+        self._first = False
+        return self.next_value()
 
 
-def _convert_dict_to_spec(as_dict: dict[str, Any]) -> Spec:
-    spec_fields = {field_name: None for field_name in Spec._fields}
+# how much of a delimited file to look at when working out its format
+_SNIFF_SAMPLE_SIZE = 64 * 1024
 
-    # TODO: error if k.lower() results in duplicate keys
-    as_dict = {k.lower(): v for k, v in as_dict.items() if _check_none(v) is not None}
 
-    def normalize(spec_field: str, *possible_key_names: str):
-        for key_name in (spec_field, *possible_key_names):
-            for key in {
+def _parse_csv(config_path: Path) -> Iterator[dict[str, Any]]:
+    with config_path.open(newline="") as csv_file:
+        sample = csv_file.read(_SNIFF_SAMPLE_SIZE)
+        if len(sample) == _SNIFF_SAMPLE_SIZE:
+            # don't make the sniffer deal with a partial line
+            sample = sample[: sample.rfind("\n") + 1] or sample
+        dialect = csv.Sniffer().sniff(sample)
+        csv_file.seek(0)
+        yield from csv.DictReader(csv_file, dialect=dialect)
+
+
+# the names each spec field can be given under in a config file, in order of
+# precedence
+_FIELD_ALIASES: dict[str, tuple[str, ...]] = {
+    "path_spec": ("file_spec", "filename", "header"),
+    "distinct": ("unique", "is_distinct", "is_unique"),
+    "license_type": ("license", "permission", "usage", "usage_rights"),
+    "required": ("is_required",),
+    "description": ("title", "desc"),
+    "num": ("number", "track_number", "track", "track_no"),
+    "hue": ("hue_shift", "use_colored_vinyl"),
+    "use_album_art": ("extract_album_art",),
+}
+
+# ...and with all the accepted variations on spelling
+_FIELD_KEYS: dict[str, tuple[str, ...]] = {
+    spec_field: tuple(
+        dict.fromkeys(
+            variant
+            for key_name in (spec_field, *possible_key_names)
+            for variant in (
                 key_name,
                 key_name.replace("_", "-"),
                 key_name.replace("_", " "),
                 key_name.replace("_", ""),
-            }:
-                if key in as_dict:
-                    spec_fields[spec_field] = as_dict[key]
-                    break
-            else:
-                continue
-            break
+            )
+        )
+    )
+    for spec_field, possible_key_names in _FIELD_ALIASES.items()
+}
+
+
+@lru_cache(maxsize=64)
+def _map_columns(keys: tuple[str, ...]) -> dict[str, tuple[str, ...]]:
+    """Work out which of an entry's keys (_e.g._ the columns of a CSV header)
+    can provide each spec field
+
+    Parameters
+    ----------
+    keys : tuple of str
+        The keys of the entry (or of every entry sharing the same header)
+
+    Returns
+    -------
+    dict of str to tuple of str
+        The keys that can provide each spec field, in order of precedence (the
+        first one with a value in a given entry is the one that gets used)
+    """
+    # TODO: error if k.lower() results in duplicate keys
+    by_lowercase: dict[str, list[str]] = {}
+    for key in keys:
+        by_lowercase.setdefault(key.lower(), []).append(key)
+    return {
+        spec_field: tuple(
+            key
+            for variant in variants
+            # (of keys differing only in case, the last one takes precedence)
+            for key in reversed(by_lowercase.get(variant, ()))
+        )
+        for spec_field, variants in _FIELD_KEYS.items()
+    }
+
 
-    normalize("path_spec", "file_spec", "filename", "header")
+def _convert_dict_to_spec(
+    as_dict: dict[str, Any], columns: dict[str, tuple[str, ...]] | None = None
+) -> Spec:
+    if columns is None:
+        columns = _map_columns(tuple(as_dict))
+    spec_fields: dict[str, Any] = {field_name: None for field_name in Spec._fields}
+
+    def normalize(spec_field: str):
+        for key in columns[spec_field]:
+            if (value := _check_none(as_dict[key])) is not None:
+                spec_fields[spec_field] = value
+                return
+
+    normalize("path_spec")
     if spec_fields["path_spec"] is None:
         raise ValueError("entry does not specify a path spec")
-    spec_fields["path_spec"] = Path(spec_fields["path_spec"])
 
-    normalize("distinct", "unique", "is_distinct", "is_unique")
+    normalize("distinct")
     try:
         spec_fields["distinct"] = _normalize_boolean(spec_fields["distinct"])
     except ValueError:
         raise ValueError(
             f"entry has invalid value for distinct: '{spec_fields['distinct']}'"
         )
+    spec_fields["path_spec"] = _to_path_spec(
+        spec_fields["path_spec"], spec_fields["distinct"]
+    )
 
-    normalize("license_type", "license", "permission", "usage", "usage_rights")
+    normalize("license_type")
     if spec_fields["license_type"] is not None:
         try:
             spec_fields["license_type"] = License[spec_fields["license_type"].upper()]
@@ -126,7 +466,7 @@ def _convert_dict_to_spec(as_dict: dict[str, Any]) -> Spec:
                 " '{spec_fields['license_type']}'"
             )
 
-    normalize("required", "is_required")
+    normalize("required")
     try:
         spec_fields["required"] = _normalize_boolean(spec_fields["required"])
     except ValueError:
@@ -134,16 +474,16 @@ def _convert_dict_to_spec(as_dict: dict[str, Any]) -> Spec:
             f"entry has invalid value for required: '{spec_fields['required']}'"
         )
 
-    normalize("description", "title", "desc")
+    normalize("description")
 
-    normalize("num", "number", "track_number", "track", "track_no")
+    normalize("num")
     if spec_fields["num"] is not None:
         try:
             spec_fields["num"] = int(spec_fields["num"])
         except (TypeError, ValueError):
             raise ValueError(f"entry has invalid value for num: '{spec_fields['num']}'")
 
-    normalize("hue", "hue_shift", "use_colored_vinyl")
+    normalize("hue")
     if isinstance(spec_fields["hue"], str):
         try:
             spec_fields["hue"] = _normalize_boolean(spec_fields["hue"])
@@ -161,7 +501,7 @@ def _convert_dict_to_spec(as_dict: dict[str, Any]) -> Spec:
         except (TypeError, ValueError):
             raise ValueError(f"entry has invalid value for hue: '{spec_fields['hue']}'")
 
-    normalize("use_album_art", "extract_album_art")
+    normalize("use_album_art")
     try:
         spec_fields["use_album_art"] = _normalize_boolean(spec_fields["use_album_art"])
     except ValueError:
@@ -175,6 +515,16 @@ def _convert_dict_to_spec(as_dict: dict[str, Any]) -> Spec:
     )
 
 
+def _to_path_spec(path_spec: str, distinct: bool | None) -> Path | str:
+    """Convert a path spec into the form it's stored in on a Spec: a Path, unless
+    it's a regular expression, which is kept as a string (since going through
+    Path would change it, _e.g._ by collapsing "//" or, on Windows, by turning
+    "/" into "\\")"""
+    if distinct is False and path_spec.startswith(REGEX_SPEC_PREFIX):
+        return path_spec
+    return Path(path_spec)
+
+
 def _check_none(value: Any) -> Any | None:
     try:
         if value == -1 or value.upper() in ("NULL", "", "NAN", "NONE"):
@@ -0,0 +1,911 @@
+"""Lightweight, in-process readers for the headers of common audio formats, so that
+well-formed MP3, FLAC, Ogg and M4A files don't need to be handed off to ffprobe"""
+
+import base64
+import io
+import os
+import struct
+from typing import BinaryIO, Callable, Iterator, NamedTuple
+
+MAX_HEADER_SIZE = 64 * 1024 * 1024  # refuse to slurp anything bigger than this
+_SYNC_SEARCH_WINDOW = 64 * 1024
+_OGG_TAIL_WINDOW = 64 * 1024
+
+
+class HeaderInfo(NamedTuple):
+    """The metadata read from an audio file's headers
+
+    Attributes
+    ----------
+    format_name : str
+        The container format (using ffprobe's naming)
+    codec_name : str
+        The audio codec (using ffprobe's naming)
+    duration : float
+        The duration of the track in seconds
+    tags : dict of str to str
+        The track's metadata tags, with tag names lower-cased and normalized to
+        match what ffprobe would report
+    has_cover : bool
+        Whether the file has album art embedded
+    cover_codec : str or None
+        The image format of the embedded album art (using ffprobe's naming), if
+        known
+    """
+
+    format_name: str
+    codec_name: str
+    duration: float
+    tags: dict[str, str]
+    has_cover: bool = False
+    cover_codec: str | None = None
+
+
+class _Picture(NamedTuple):
+    mime_type: str
+    data: bytes
+
+
+class _DamagedFileError(ValueError):
+    """Raised when a file looks like a supported format but can't be parsed"""
+
+
+class _MissingBoxError(_DamagedFileError):
+    """Raised when an MP4 file is missing an expected box"""
+
+
+def read_header_info(file_path: os.PathLike | str) -> HeaderInfo | None:
+    """Read the metadata of an audio file directly from its headers
+
+    Parameters
+    ----------
+    file_path : pathlike
+        The path to the audio file
+
+    Returns
+    -------
+    HeaderInfo or None
+        The metadata read from the file, or None if the file is not in one of
+        the supported formats or could not be parsed (in which case the file
+        should be probed using ffprobe instead)
+    """
+    try:
+        return _read(file_path, want_cover=False)[0]
+    except (OSError, struct.error, IndexError, ValueError):
+        return None
+
+
+def read_cover_art(file_path: os.PathLike | str) -> bytes | None:
+    """Extract the (first) album art image embedded in an audio file
+
+    Parameters
+    ----------
+    file_path : pathlike
+        The path to the audio file
+
+    Returns
+    -------
+    bytes or None
+        The encoded image data (typically JPEG or PNG), or None if the file does not
+        have any embedded album art, is not in one of the supported formats, or
+        could not be parsed
+    """
+    try:
+        _, picture = _read(file_path, want_cover=True)
+    except (OSError, struct.error, IndexError, ValueError):
+        return None
+    return picture.data if picture is not None else None
+
+
+# file extensions that will always be probed
+AUDIO_EXTENSIONS = frozenset(
+    (
+        ".aac .ac3 .aif .aifc .aiff .alac .amr .ape .au .caf .dsf .flac .m4a "
+        ".m4b .mka .mp2 .mp3 .mp4 .mpc .oga .ogg .opus .ra .spx .tta .wav .weba "
+        ".webm .wma .wv"
+    ).split()
+)
+
+# file extensions that will never be probed
+NON_AUDIO_EXTENSIONS = frozenset(
+    (
+        ".7z .accurip .bmp .csv .cue .db .dll .doc .docx .exe .ffp .gif .gz "
+        ".heic .htm .html .ico .ini .jpeg .jpg .json .log .m3u .m3u8 .md .md5 "
+        ".nfo .pdf .pls .png .rar .rtf .sfv .sha1 .sha256 .tar .tif .tiff .toml "
+        ".txt .url .webp .xml .xspf .yaml .yml .zip"
+    ).split()
+)
+
+_NON_AUDIO_SIGNATURES = (
+    b"\xff\xd8\xff",  # JPEG
+    b"\x89PNG\r\n\x1a\n",
+    b"GIF87a",
+    b"GIF89a",
+    b"%PDF",
+    b"PK\x03\x04",  # zip (and zip-based documents)
+    b"Rar!\x1a\x07",
+    b"7z\xbc\xaf\x27\x1c",
+    b"\x1f\x8b",  # gzip
+    b"MZ",  # Windows executables
+    b"\x7fELF",
+    b"SQLite format 3\x00",
+    b"II*\x00",  # TIFF
+    b"MM\x00*",
+)
+_SNIFF_SIZE = 512
+
+
+def might_be_audio(file_path: os.PathLike | str) -> bool:
+    """Cheaply check whether a file could plausibly be an audio file, so that obvious
+    non-audio files (cover images, cue sheets, rip logs...) can be skipped without
+    spawning ffprobe
+
+    Parameters
+    ----------
+    file_path : pathlike
+        The path to the file
+
+    Returns
+    -------
+    bool
+        False if the file is definitely not an audio file, based on its extension
+        or, for unfamiliar extensions, on its first few bytes. True if the file
+        should be probed to find out.
+
+    Notes
+    -----
+    This check errs on the side of caution: anything that can't be ruled out
+    (including files that can't be read) is considered a potential audio file.
+    That includes video files, since any container with an audio stream can be
+    converted.
+    """
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension in AUDIO_EXTENSIONS:
+        return True
+    if extension in NON_AUDIO_EXTENSIONS:
+        return False
+    try:
+        with open(file_path, "rb") as f:
+            sample = f.read(_SNIFF_SIZE)
+    except OSError:
+        return True
+    if not sample or sample.startswith(_NON_AUDIO_SIGNATURES):
+        return False
+    if sample.startswith(b"RIFF") and sample[8:12] == b"WEBP":
+        return False
+    return not _is_text(sample)
+
+
+def _is_text(sample: bytes) -> bool:
+    if sample.startswith((b"\xef\xbb\xbf", b"\xff\xfe", b"\xfe\xff")):
+        return True  # byte-order mark
+    if b"\x00" in sample:
+        return False
+    try:
+        # a multibyte character may have been cut off at the end of the sample
+        sample.decode("utf-8")
+    except UnicodeDecodeError as decode_fail:
+        if decode_fail.start < len(sample) - 3:
+            return False
+    return True
+
+
+_Reader = Callable[[BinaryIO, int, int, bool], tuple[HeaderInfo, _Picture | None]]
+
+
+def _read(
+    file_path: os.PathLike | str, want_cover: bool
+) -> tuple[HeaderInfo | None, _Picture | None]:
+    with open(file_path, "rb") as f:
+        file_size = os.fstat(f.fileno()).st_size
+        magic = f.read(12)
+        offset = 0
+        reader: _Reader | None = None
+        if magic.startswith(b"ID3"):
+            offset = _id3v2_size(magic)
+            f.seek(offset)
+            reader = _read_flac if f.read(4) == b"fLaC" else _read_mp3
+        elif magic.startswith(b"fLaC"):
+            reader = _read_flac
+        elif magic.startswith(b"OggS"):
+            reader = _read_ogg
+        elif magic[4:8] == b"ftyp":
+            reader = _read_mp4
+        elif _parse_mpeg_frame_header(magic[:4]) is not None:
+            reader = _read_mp3
+        if reader is None:
+            return None, None
+        f.seek(0)
+        return reader(f, file_size, offset, want_cover)
+
+
+def _cover_codec(mime_type: str) -> str | None:
+    return {
+        "image/jpeg": "mjpeg",
+        "image/jpg": "mjpeg",
+        "image/png": "png",
+        "image/bmp": "bmp",
+        "image/gif": "gif",
+    }.get(mime_type.lower())
+
+
+def _read_exactly(f: BinaryIO, size: int) -> bytes:
+    if size > MAX_HEADER_SIZE:
+        raise _DamagedFileError(f"Refusing to read a {size}-byte header")
+    data = f.read(size)
+    if len(data) < size:
+        raise _DamagedFileError("Unexpected end of file")
+    return data
+
+
+# MP3 #
+
+
+_ID3V2_FRAMES: dict[str, str] = {
+    # ID3v2.3 / 2.4
+    "TALB": "album",
+    "TCOM": "composer",
+    "TCON": "genre",
+    "TCOP": "copyright",
+    "TDRC": "date",
+    "TENC": "encoded_by",
+    "TIT2": "title",
+    "TLAN": "language",
+    "TPE1": "artist",
+    "TPE2": "album_artist",
+    "TPE3": "performer",
+    "TPOS": "disc",
+    "TPUB": "publisher",
+    "TRCK": "track",
+    "TSSE": "encoder",
+    "TYER": "date",
+    # ID3v2.2
+    "TAL": "album",
+    "TCM": "composer",
+    "TCO": "genre",
+    "TEN": "encoded_by",
+    "TP1": "artist",
+    "TP2": "album_artist",
+    "TP3": "performer",
+    "TPA": "disc",
+    "TRK": "track",
+    "TT2": "title",
+    "TYE": "date",
+}
+
+_ID3_ENCODINGS = {0: "latin-1", 1: "utf-16", 2: "utf-16-be", 3: "utf-8"}
+
+_MPEG_BITRATES = {
+    "MPEG-1": (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    "MPEG-2": (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+
+_MPEG_SAMPLE_RATES = {
+    3: (44100, 48000, 32000),  # MPEG-1
+    2: (22050, 24000, 16000),  # MPEG-2
+    0: (11025, 12000, 8000),  # MPEG-2.5
+}
+
+
+class _MPEGFrameHeader(NamedTuple):
+    frame_length: int
+    sample_rate: int
+    samples_per_frame: int
+    bitrate: int
+    side_info_length: int
+
+
+def _syncsafe(data: bytes) -> int:
+    value = 0
+    for byte in data:
+        value = (value << 7) | (byte & 0x7F)
+    return value
+
+
+def _id3v2_size(header: bytes) -> int:
+    """The total size of an ID3v2 tag (including its header and footer)"""
+    footer = 10 if header[5] & 0x10 else 0
+    return 10 + _syncsafe(header[6:10]) + footer
+
+
+def _parse_mpeg_frame_header(header: bytes) -> _MPEGFrameHeader | None:
+    """Parse the header of an MPEG audio (Layer III) frame, returning None if the
+    provided bytes are not a valid frame header"""
+    if len(header) < 4:
+        return None
+    value = int.from_bytes(header[:4], "big")
+    if value >> 21 != 0x7FF:
+        return None
+    version = (value >> 19) & 0b11
+    layer = (value >> 17) & 0b11
+    bitrate_index = (value >> 12) & 0b1111
+    sample_rate_index = (value >> 10) & 0b11
+    padding = (value >> 9) & 0b1
+    mono = (value >> 6) & 0b11 == 0b11
+    if version == 1 or layer != 1:  # reserved version, or not Layer III
+        return None
+    if bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None  # free-format, or invalid
+
+    mpeg1 = version == 3
+    bitrate = _MPEG_BITRATES["MPEG-1" if mpeg1 else "MPEG-2"][bitrate_index] * 1000
+    sample_rate = _MPEG_SAMPLE_RATES[version][sample_rate_index]
+    samples_per_frame = 1152 if mpeg1 else 576
+    if mpeg1:
+        side_info_length = 17 if mono else 32
+    else:
+        side_info_length = 9 if mono else 17
+    return _MPEGFrameHeader(
+        samples_per_frame // 8 * bitrate // sample_rate + padding,
+        sample_rate,
+        samples_per_frame,
+        bitrate,
+        side_info_length,
+    )
+
+
+def _read_id3v2(f: BinaryIO) -> tuple[dict[str, str], list[_Picture]]:
+    header = f.read(10)
+    if len(header) < 10 or not header.startswith(b"ID3"):
+        return {}, []
+    major, flags = header[3], header[5]
+    if major not in (2, 3, 4):
+        return {}, []
+    data = _read_exactly(f, _syncsafe(header[6:10]))
+    if flags & 0x80 and major < 4:  # tag-wide unsynchronisation
+        data = data.replace(b"\xff\x00", b"\xff")
+
+    position = 0
+    if flags & 0x40 and major > 2:  # extended header
+        if major == 3:
+            position = 4 + int.from_bytes(data[:4], "big")
+        else:
+            position = _syncsafe(data[:4])
+
+    frame_header_length = 6 if major == 2 else 10
+    tags: dict[str, str] = {}
+    pictures: list[_Picture] = []
+    while position + frame_header_length <= len(data):
+        if data[position] == 0:  # we've hit the padding
+            break
+        if major == 2:
+            frame_id = data[position : position + 3].decode("latin-1")
+            frame_size = int.from_bytes(data[position + 3 : position + 6], "big")
+            frame_flags = 0
+        else:
+            frame_id = data[position : position + 4].decode("latin-1")
+            size_bytes = data[position + 4 : position + 8]
+            frame_size = (
+                _syncsafe(size_bytes)
+                if major == 4
+                else int.from_bytes(size_bytes, "big")
+            )
+            frame_flags = int.from_bytes(data[position + 8 : position + 10], "big")
+        position += frame_header_length
+        body = data[position : position + frame_size]
+        if len(body) < frame_size:
+            raise _DamagedFileError(f"ID3 frame {frame_id} is truncated")
+        position += frame_size
+
+        if major == 3:
+            if frame_flags & 0x00C0:  # compressed or encrypted
+                continue
+            if frame_flags & 0x0020:  # grouping identity
+                body = body[1:]
+        elif major == 4:
+            if frame_flags & 0x000C:  # compressed or encrypted
+                continue
+            if frame_flags & 0x0040:  # grouping identity
+                body = body[1:]
+            if frame_flags & 0x0001:  # data length indicator
+                body = body[4:]
+            if frame_flags & 0x0002:  # unsynchronisation
+                body = body.replace(b"\xff\x00", b"\xff")
+
+        if not body:
+            continue
+        if frame_id in _ID3V2_FRAMES:
+            tags.setdefault(_ID3V2_FRAMES[frame_id], _decode_id3_text(body))
+        elif frame_id in ("APIC", "PIC"):
+            pictures.append(_parse_id3_picture(body, major))
+    return tags, pictures
+
+
+def _id3_encoding(encoding: int) -> str:
+    try:
+        return _ID3_ENCODINGS[encoding]
+    except KeyError:
+        raise _DamagedFileError(f"Invalid ID3 text encoding: {encoding}")
+
+
+def _decode_id3_text(body: bytes) -> str:
+    text = body[1:].decode(_id3_encoding(body[0]))
+    # like ffmpeg, only take the first value of a multi-valued frame
+    return text.split("\x00")[0].lstrip("\ufeff")
+
+
+def _parse_id3_picture(body: bytes, major: int) -> _Picture:
+    encoding = body[0]
+    if major == 2:
+        image_format = body[1:4].decode("latin-1").lower()
+        mime_type = {"jpg": "image/jpeg", "png": "image/png"}.get(image_format, "")
+        position = 4
+    else:
+        mime_end = body.index(b"\x00", 1)
+        mime_type = body[1:mime_end].decode("latin-1")
+        position = mime_end + 1
+    position += 1  # picture type
+
+    if _id3_encoding(encoding).startswith("utf-16"):
+        while body[position : position + 2] != b"\x00\x00":
+            if position >= len(body):
+                raise _DamagedFileError("Picture description is unterminated")
+            position += 2
+        position += 2
+    else:
+        position = body.index(b"\x00", position) + 1
+    return _Picture(mime_type, body[position:])
+
+
+def _read_id3v1(f: BinaryIO, file_size: int) -> dict[str, str] | None:
+    """Read an ID3v1 tag, returning None if the file doesn't have one"""
+    if file_size < 128:
+        return None
+    f.seek(file_size - 128)
+    tag = f.read(128)
+    if not tag.startswith(b"TAG"):
+        return None
+    tags: dict[str, str] = {}
+    for key, start, end in (
+        ("title", 3, 33),
+        ("artist", 33, 63),
+        ("album", 63, 93),
+        ("date", 93, 97),
+    ):
+        if value := tag[start:end].split(b"\x00")[0].decode("latin-1").strip():
+            tags[key] = value
+    return tags
+
+
+def _find_first_mpeg_frame(
+    window: bytes, audio_length: int
+) -> tuple[int, _MPEGFrameHeader]:
+    """Find the first MPEG frame in a chunk of audio data, returning its position
+    and header. To avoid false syncs, a frame is only accepted if it's immediately
+    followed by another valid frame (or by the end of the audio data)."""
+    position = 0
+    while (position := window.find(b"\xff", position)) != -1:
+        frame = _parse_mpeg_frame_header(window[position : position + 4])
+        if frame is not None:
+            next_frame_start = position + frame.frame_length
+            if next_frame_start >= audio_length or next_frame_start + 4 > len(window):
+                return position, frame
+            if _parse_mpeg_frame_header(
+                window[next_frame_start : next_frame_start + 4]
+            ):
+                return position, frame
+        position += 1
+    raise _DamagedFileError("Could not find an MPEG frame")
+
+
+def _read_mp3(
+    f: BinaryIO, file_size: int, offset: int, want_cover: bool
+) -> tuple[HeaderInfo, _Picture | None]:
+    tags, pictures = _read_id3v2(f)
+    id3v1_tags = _read_id3v1(f, file_size)
+    for key, value in (id3v1_tags or {}).items():
+        tags.setdefault(key, value)
+    audio_end = file_size - (128 if id3v1_tags is not None else 0)
+
+    f.seek(offset)
+    window = f.read(_SYNC_SEARCH_WINDOW)
+    position, frame = _find_first_mpeg_frame(window, audio_end - offset)
+
+    xing_start = position + 4 + frame.side_info_length
+    vbri_start = position + 36
+    n_frames: int | None = None
+    if window[xing_start : xing_start + 4] in (b"Xing", b"Info"):
+        xing_flags = int.from_bytes(window[xing_start + 4 : xing_start + 8], "big")
+        if xing_flags & 0x1:
+            n_frames = int.from_bytes(window[xing_start + 8 : xing_start + 12], "big")
+    elif window[vbri_start : vbri_start + 4] == b"VBRI":
+        n_frames = int.from_bytes(window[vbri_start + 14 : vbri_start + 18], "big")
+
+    if n_frames:
+        duration = n_frames * frame.samples_per_frame / frame.sample_rate
+    else:  # assume constant bitrate
+        duration = (audio_end - offset - position) * 8 / frame.bitrate
+
+    picture = pictures[0] if pictures else None
+    return (
+        HeaderInfo(
+            "mp3",
+            "mp3",
+            duration,
+            tags,
+            picture is not None,
+            _cover_codec(picture.mime_type) if picture else None,
+        ),
+        picture if want_cover else None,
+    )
+
+
+# FLAC & Vorbis comments #
+
+
+_VORBIS_COMMENT_KEYS = {
+    "albumartist": "album_artist",
+    "tracknumber": "track",
+    "discnumber": "disc",
+    "description": "comment",
+}
+
+
+def _parse_streaminfo(block: bytes) -> tuple[int, float]:
+    """Parse a FLAC STREAMINFO block, returning the sample rate and duration"""
+    if len(block) < 18:
+        raise _DamagedFileError("STREAMINFO block is truncated")
+    packed = int.from_bytes(block[10:18], "big")
+    sample_rate = packed >> 44
+    total_samples = packed & 0xFFFFFFFFF
+    if sample_rate == 0 or total_samples == 0:
+        raise _DamagedFileError("FLAC stream does not declare its length")
+    return sample_rate, total_samples / sample_rate
+
+
+def _parse_flac_picture(block: bytes) -> _Picture:
+    position = 4  # picture type
+    (mime_length,) = struct.unpack_from(">I", block, position)
+    mime_type = block[position + 4 : position + 4 + mime_length].decode("ascii")
+    position += 4 + mime_length
+    (description_length,) = struct.unpack_from(">I", block, position)
+    position += 4 + description_length + 16  # skip dimensions and color info
+    (data_length,) = struct.unpack_from(">I", block, position)
+    return _Picture(mime_type, block[position + 4 : position + 4 + data_length])
+
+
+def _parse_vorbis_comment(data: bytes) -> tuple[dict[str, str], list[bytes]]:
+    """Parse a Vorbis comment block, returning the tags and any (encoded) pictures"""
+    (vendor_length,) = struct.unpack_from("<I", data, 0)
+    position = 4 + vendor_length
+    (n_comments,) = struct.unpack_from("<I", data, position)
+    position += 4
+    tags: dict[str, str] = {}
+    pictures: list[bytes] = []
+    for _ in range(n_comments):
+        (length,) = struct.unpack_from("<I", data, position)
+        position += 4
+        comment = data[position : position + length]
+        if len(comment) < length:
+            raise _DamagedFileError("Vorbis comment is truncated")
+        position += length
+
+        raw_key, separator, raw_value = comment.partition(b"=")
+        if not separator:
+            continue
+        key = raw_key.decode("ascii").lower()
+        if key == "metadata_block_picture":
+            pictures.append(base64.b64decode(raw_value))
+            continue
+        key = _VORBIS_COMMENT_KEYS.get(key, key)
+        value = raw_value.decode("utf-8")
+        tags[key] = f"{tags[key]};{value}" if key in tags else value
+    return tags, pictures
+
+
+def _read_flac(
+    f: BinaryIO, file_size: int, offset: int, want_cover: bool
+) -> tuple[HeaderInfo, _Picture | None]:
+    f.seek(offset)
+    if f.read(4) != b"fLaC":
+        raise _DamagedFileError("Missing FLAC stream marker")
+
+    duration: float | None = None
+    tags: dict[str, str] = {}
+    picture: _Picture | None = None
+    is_last = False
+    while not is_last:
+        block_header = _read_exactly(f, 4)
+        is_last = bool(block_header[0] & 0x80)
+        block_type = block_header[0] & 0x7F
+        block_length = int.from_bytes(block_header[1:], "big")
+        block_end = f.tell() + block_length
+        if block_type == 0:
+            _, duration = _parse_streaminfo(_read_exactly(f, block_length))
+        elif block_type == 4:
+            tags, comment_pictures = _parse_vorbis_comment(
+                _read_exactly(f, block_length)
+            )
+            if picture is None and comment_pictures:
+                picture = _parse_flac_picture(comment_pictures[0])
+        elif block_type == 6 and picture is None:
+            if want_cover:
+                picture = _parse_flac_picture(_read_exactly(f, block_length))
+            else:
+                # only need enough to tell what kind of image it is
+                head = f.read(min(block_length, 4096))
+                (mime_length,) = struct.unpack_from(">I", head, 4)
+                picture = _Picture(head[8 : 8 + mime_length].decode("ascii"), b"")
+        elif block_type == 127:
+            raise _DamagedFileError("Invalid FLAC metadata block")
+        f.seek(block_end)
+
+    if duration is None:
+        raise _DamagedFileError("FLAC file is missing its STREAMINFO")
+    return (
+        HeaderInfo(
+            "flac",
+            "flac",
+            duration,
+            tags,
+            picture is not None,
+            _cover_codec(picture.mime_type) if picture else None,
+        ),
+        picture if want_cover else None,
+    )
+
+
+# Ogg #
+
+
+class _OggPage(NamedTuple):
+    header_type: int
+    granule_position: int
+    serial: int
+    segment_lengths: bytes
+    body: bytes
+
+
+def _read_ogg_page(f: BinaryIO) -> _OggPage | None:
+    header = f.read(27)
+    if not header:
+        return None
+    if len(header) < 27 or not header.startswith(b"OggS") or header[4] != 0:
+        raise _DamagedFileError("Invalid Ogg page")
+    granule_position, serial = struct.unpack_from("<qI", header, 6)
+    segment_lengths = _read_exactly(f, header[26])
+    body = _read_exactly(f, sum(segment_lengths))
+    return _OggPage(header[5], granule_position, serial, segment_lengths, body)
+
+
+def _iter_ogg_packets(f: BinaryIO) -> Iterator[bytes]:
+    """Iterate over the packets of the first logical stream in an Ogg file"""
+    serial: int | None = None
+    packet = io.BytesIO()
+    while (page := _read_ogg_page(f)) is not None:
+        if serial is None:
+            serial = page.serial
+        elif page.serial != serial:
+            if page.header_type & 0x02:  # another stream is starting
+                raise _DamagedFileError("Multiplexed Ogg files are not supported")
+            continue
+        position = 0
+        for segment_length in page.segment_lengths:
+            packet.write(page.body[position : position + segment_length])
+            position += segment_length
+            if packet.tell() > MAX_HEADER_SIZE:
+                raise _DamagedFileError("Ogg header packet is too large")
+            if segment_length < 255:
+                yield packet.getvalue()
+                packet = io.BytesIO()
+
+
+def _last_ogg_granule(f: BinaryIO, file_size: int, serial: int) -> int:
+    f.seek(max(0, file_size - _OGG_TAIL_WINDOW))
+    tail = f.read()
+    position = len(tail)
+    while (position := tail.rfind(b"OggS", 0, position)) != -1:
+        if position + 27 <= len(tail) and tail[position + 4] == 0:
+            granule_position, page_serial = struct.unpack_from(
+                "<qI", tail, position + 6
+            )
+            if page_serial == serial and granule_position >= 0:
+                return granule_position
+    raise _DamagedFileError("Could not find the end of the Ogg stream")
+
+
+def _read_ogg(
+    f: BinaryIO, file_size: int, offset: int, want_cover: bool
+) -> tuple[HeaderInfo, _Picture | None]:
+    f.seek(0)
+    first_page = _read_ogg_page(f)
+    if first_page is None or not first_page.header_type & 0x02:
+        raise _DamagedFileError("Ogg file does not begin with a stream")
+    f.seek(0)
+    packets = _iter_ogg_packets(f)
+    identification = next(packets)
+
+    pre_skip = 0
+    if identification.startswith(b"\x01vorbis"):
+        codec_name = "vorbis"
+        (sample_rate,) = struct.unpack_from("<I", identification, 12)
+        comment_packet = next(packets)
+        if not comment_packet.startswith(b"\x03vorbis"):
+            raise _DamagedFileError("Missing Vorbis comment header")
+        comment = comment_packet[7:]
+    elif identification.startswith(b"OpusHead"):
+        codec_name = "opus"
+        (pre_skip,) = struct.unpack_from("<H", identification, 10)
+        sample_rate = 48000  # Opus granule positions are always at 48 kHz
+        comment_packet = next(packets)
+        if not comment_packet.startswith(b"OpusTags"):
+            raise _DamagedFileError("Missing Opus comment header")
+        comment = comment_packet[8:]
+    elif identification.startswith(b"\x7fFLAC"):
+        codec_name = "flac"
+        sample_rate, _ = _parse_streaminfo(identification[17:])
+        for comment_packet in packets:
+            if comment_packet[0] & 0x7F == 4:
+                comment = comment_packet[4:]
+                break
+            if comment_packet[0] & 0x80:  # last metadata block
+                comment = b""
+                break
+        else:
+            raise _DamagedFileError("Ogg FLAC stream ended unexpectedly")
+    else:
+        raise _DamagedFileError("Unsupported Ogg codec")
+
+    tags, pictures = _parse_vorbis_comment(comment) if comment else ({}, [])
+    picture = _parse_flac_picture(pictures[0]) if pictures else None
+
+    granule_position = _last_ogg_granule(f, file_size, first_page.serial)
+    duration = max(granule_position - pre_skip, 0) / sample_rate
+    return (
+        HeaderInfo(
+            "ogg",
+            codec_name,
+            duration,
+            tags,
+            picture is not None,
+            _cover_codec(picture.mime_type) if picture else None,
+        ),
+        picture if want_cover else None,
+    )
+
+
+# MP4 / M4A #
+
+
+_MP4_TAGS = {
+    b"\xa9nam": "title",
+    b"\xa9ART": "artist",
+    b"\xa9wrt": "composer",
+    b"\xa9alb": "album",
+    b"aART": "album_artist",
+    b"\xa9day": "date",
+    b"\xa9gen": "genre",
+    b"\xa9cmt": "comment",
+    b"\xa9too": "encoder",
+    b"cprt": "copyright",
+}
+
+_MP4_CODECS = {
+    b"mp4a": "aac",
+    b"alac": "alac",
+    b"fLaC": "flac",
+    b"Opus": "opus",
+    b"ac-3": "ac3",
+    b".mp3": "mp3",
+}
+
+_MP4_IMAGE_TYPES = {13: "image/jpeg", 14: "image/png", 27: "image/bmp"}
+
+
+def _iter_boxes(data: bytes, start: int, end: int) -> Iterator[tuple[bytes, int, int]]:
+    """Iterate over the boxes (atoms) within a region of an MP4 file, yielding the
+    box type and the start and end positions of its contents"""
+    position = start
+    while position + 8 <= end:
+        size, box_type = struct.unpack_from(">I4s", data, position)
+        header_length = 8
+        if size == 1:
+            (size,) = struct.unpack_from(">Q", data, position + 8)
+            header_length = 16
+        elif size == 0:
+            size = end - position
+        if size < header_length or position + size > end:
+            raise _DamagedFileError(f"Invalid {box_type!r} box")
+        yield box_type, position + header_length, position + size
+        position += size
+
+
+def _find_box(data: bytes, start: int, end: int, *path: bytes) -> tuple[int, int]:
+    for box_type in path:
+        for child_type, child_start, child_end in _iter_boxes(data, start, end):
+            if child_type == box_type:
+                start, end = child_start, child_end
+                break
+        else:
+            raise _MissingBoxError(f"Missing {box_type!r} box")
+    return start, end
+
+
+def _read_moov(f: BinaryIO, file_size: int) -> bytes:
+    position = 0
+    while position + 8 <= file_size:
+        f.seek(position)
+        size, box_type = struct.unpack(">I4s", _read_exactly(f, 8))
+        header_length = 8
+        if size == 1:
+            (size,) = struct.unpack(">Q", _read_exactly(f, 8))
+            header_length = 16
+        elif size == 0:
+            size = file_size - position
+        if size < header_length:
+            raise _DamagedFileError(f"Invalid {box_type!r} box")
+        if box_type == b"moov":
+            return _read_exactly(f, size - header_length)
+        position += size
+    raise _DamagedFileError("Could not find the moov box")
+
+
+def _read_mp4(
+    f: BinaryIO, file_size: int, offset: int, want_cover: bool
+) -> tuple[HeaderInfo, _Picture | None]:
+    moov = _read_moov(f, file_size)
+
+    mvhd_start, _ = _find_box(moov, 0, len(moov), b"mvhd")
+    if moov[mvhd_start] == 1:
+        timescale, length = struct.unpack_from(">IQ", moov, mvhd_start + 20)
+    else:
+        timescale, length = struct.unpack_from(">II", moov, mvhd_start + 12)
+    if timescale == 0 or length in (0, 0xFFFFFFFF, 0xFFFFFFFFFFFFFFFF):
+        raise _DamagedFileError("MP4 file does not declare its length")
+
+    codec_name: str | None = None
+    for box_type, trak_start, trak_end in _iter_boxes(moov, 0, len(moov)):
+        if box_type != b"trak":
+            continue
+        mdia_start, mdia_end = _find_box(moov, trak_start, trak_end, b"mdia")
+        hdlr_start, _ = _find_box(moov, mdia_start, mdia_end, b"hdlr")
+        handler = moov[hdlr_start + 8 : hdlr_start + 12]
+        if handler == b"vide":
+            raise _DamagedFileError("MP4 files with video tracks are not supported")
+        if handler != b"soun" or codec_name is not None:
+            continue
+        stsd_start, _ = _find_box(moov, mdia_start, mdia_end, b"minf", b"stbl", b"stsd")
+        codec_name = _MP4_CODECS.get(moov[stsd_start + 12 : stsd_start + 16])
+        if codec_name is None:
+            raise _DamagedFileError("Unrecognized MP4 audio codec")
+    if codec_name is None:
+        raise _DamagedFileError("MP4 file has no audio tracks")
+
+    tags: dict[str, str] = {}
+    picture: _Picture | None = None
+    try:
+        meta_start, meta_end = _find_box(moov, 0, len(moov), b"udta", b"meta")
+    except _MissingBoxError:
+        pass
+    else:
+        if moov[meta_start + 4 : meta_start + 8] != b"hdlr":
+            meta_start += 4  # ISO-style meta is a "full box"
+        try:
+            ilst_start, ilst_end = _find_box(moov, meta_start, meta_end, b"ilst")
+        except _MissingBoxError:
+            ilst_start, ilst_end = 0, 0
+        for item_type, item_start, item_end in _iter_boxes(moov, ilst_start, ilst_end):
+            for box_type, data_start, data_end in _iter_boxes(
+                moov, item_start, item_end
+            ):
+                if box_type != b"data":
+                    continue
+                (data_type,) = struct.unpack_from(">I", moov, data_start)
+                value = moov[data_start + 8 : data_end]
+                if item_type in _MP4_TAGS and data_type == 1:
+                    tags.setdefault(_MP4_TAGS[item_type], value.decode("utf-8"))
+                elif item_type == b"covr" and picture is None:
+                    picture = _Picture(_MP4_IMAGE_TYPES.get(data_type, ""), value)
+                break
+
+    return (
+        HeaderInfo(
+            "mov,mp4,m4a,3gp,3g2,mj2",
+            codec_name,
+            length / timescale,
+            tags,
+            picture is not None,
+            _cover_codec(picture.mime_type) if picture else None,
+        ),
+        picture if want_cover else None,
+    )
@@ -0,0 +1,155 @@
+"""Functionality for finding the files within a user's music library"""
+
+import logging
+import os
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+from itertools import islice
+from pathlib import Path
+from typing import Callable, Iterator, NamedTuple
+
+from .cache import LibrarySnapshot, file_identity
+
+LOGGER = logging.getLogger(__name__)
+
+
+class _Entry(NamedTuple):
+    """A single entry in a directory listing"""
+
+    path: str
+    is_file: bool  # False for anything that should not be yielded
+    is_subdir: bool  # True for directories that should be descended into
+
+
+def iter_files(
+    root: os.PathLike | str, jobs: int = 1, snapshot: LibrarySnapshot | None = None
+) -> Iterator[Path]:
+    """Walk a folder, yielding the paths of all the files within it (including
+    within subfolders)
+
+    Files are yielded as soon as they're found, in the same order as
+    `sorted(Path(root).rglob("*"))`. Like `rglob`, this will not descend into
+    symlinked folders.
+
+    Parameters
+    ----------
+    root : pathlike
+        The folder to walk
+    jobs : int, optional
+        The maximum number of folders to read at once. When this is greater than 1,
+        the listings of upcoming subfolders will be fetched in the background while
+        earlier files are being processed. Default is 1.
+    snapshot : LibrarySnapshot, optional
+        A record of the folder contents seen on previous runs. Folders that
+        haven't changed since they were recorded will not be re-read (only
+        stat-ed), and the snapshot will be updated with any folders that have.
+        If None is specified, every folder will be read.
+
+    Returns
+    -------
+    iterator of Paths
+        The paths of all files within the folder
+
+    Raises
+    ------
+    ValueError
+        If the specified number of jobs is invalid
+    """
+    if jobs < 1 or int(jobs) != jobs:
+        raise ValueError("jobs must be an integer no less than 1")
+    list_directory = partial(_list_directory, snapshot=snapshot)
+    if jobs == 1:
+        yield from _walk(os.fspath(root), list_directory, None, 1)
+        return
+    with ThreadPoolExecutor(jobs) as executor:
+        try:
+            yield from _walk(os.fspath(root), list_directory, executor, jobs)
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+def _walk(
+    root: str,
+    list_directory: Callable[[str], list[_Entry]],
+    executor: ThreadPoolExecutor | None,
+    lookahead: int,
+) -> Iterator[Path]:
+    """Depth-first traversal of a folder, yielding files in sorted order. Sorting
+    each listing and visiting subfolders as they come up gives the same order as
+    sorting the paths of the entire tree (since paths are compared part-by-part).
+
+    When an executor is provided, the listings of each folder's next `lookahead`
+    subfolders are fetched in the background."""
+
+    # each frame is: the entries of a folder that are left to visit, the
+    # subfolders whose listings haven't been requested yet, and the (in-flight)
+    # listings of the subfolders that have been
+    stack: list[tuple[Iterator[_Entry], Iterator[str], deque[Future]]] = []
+
+    def push(listing: list[_Entry]) -> None:
+        subdirs = (entry.path for entry in listing if entry.is_subdir)
+        prefetched: deque[Future] = deque()
+        if executor is not None:
+            for subdir in islice(subdirs, lookahead):
+                prefetched.append(executor.submit(list_directory, subdir))
+        stack.append((iter(listing), subdirs, prefetched))
+
+    push(list_directory(root))
+    while stack:
+        entries, subdirs, prefetched = stack[-1]
+        for entry in entries:
+            if entry.is_file:
+                yield Path(entry.path)
+            elif entry.is_subdir:
+                if executor is not None and prefetched:
+                    listing = prefetched.popleft().result()
+                    if (upcoming := next(subdirs, None)) is not None:
+                        prefetched.append(executor.submit(list_directory, upcoming))
+                else:
+                    listing = list_directory(entry.path)
+                push(listing)
+                break
+        else:
+            stack.pop()
+
+
+def _list_directory(path: str, snapshot: LibrarySnapshot | None = None) -> list[_Entry]:
+    """List the contents of a folder, sorted by name, reusing the file type
+    information that comes back with the listing (so that, on most platforms,
+    nothing needs to be stat-ed) or, if the folder hasn't changed since it was
+    last recorded, taking the listing from the snapshot"""
+    identity: tuple[str, int, int, int] | None = None
+    if snapshot is not None:
+        try:
+            identity = file_identity(path)
+        except OSError as stat_fail:
+            LOGGER.warning(f"Could not read {path}:\n  {stat_fail}")
+            return []
+        if (recorded := snapshot.get(identity)) is not None:
+            return [
+                _Entry(os.path.join(path, name), is_file, is_subdir)
+                for name, is_file, is_subdir in recorded
+            ]
+
+    listing: list[tuple[str, str, bool, bool]] = []
+    try:
+        with os.scandir(path) as scanner:
+            for entry in scanner:
+                is_subdir = entry.is_dir(follow_symlinks=False)
+                # symlinks to folders are neither descended into nor yielded
+                is_file = not is_subdir and not entry.is_dir()
+                listing.append(
+                    (os.path.normcase(entry.name), entry.name, is_file, is_subdir)
+                )
+    except OSError as read_fail:
+        LOGGER.warning(f"Could not read {path}:\n  {read_fail}")
+        return []
+    listing.sort(key=lambda keyed_entry: keyed_entry[0])
+
+    if snapshot is not None and identity is not None:
+        snapshot.put(identity, [entry[1:] for entry in listing])
+    return [
+        _Entry(os.path.join(path, name), is_file, is_subdir)
+        for _, name, is_file, is_subdir in listing
+    ]
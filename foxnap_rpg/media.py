@@ -0,0 +1,332 @@
+"""Functionality for probing audio files and recording what was found
+
+The steps that make up `probe_track` (probing without ffprobe and recording the
+results in the cache) are exposed separately so that `foxnap_rpg.aio` can run
+ffprobe itself without duplicating them. They're internal to this package, so
+they're not re-exported from the top level.
+"""
+
+import logging
+import math
+import os
+from typing import Any, NamedTuple
+
+import ffmpeg
+
+from . import bin
+from .cache import ProbeCache, file_identity
+from .headers import HeaderInfo, read_header_info
+
+LOGGER = logging.getLogger(__name__)
+
+
+class Stream(NamedTuple):
+    """A single stream within a media file
+
+    Attributes
+    ----------
+    stream_index : int
+        The index of the stream within its container
+    codec_type : str
+        The type of stream, _e.g._ "audio" or "video"
+    codec_name : str, optional
+        The codec used to encode the stream, if known
+    attached_pic : bool, optional
+        Whether this stream is a still image (_e.g._ album art) attached to the file.
+        Default is False.
+    """
+
+    stream_index: int
+    codec_type: str
+    codec_name: str | None = None
+    attached_pic: bool = False
+
+
+class MediaInfo(NamedTuple):
+    """The results of probing a media file. Probing a file (spawning an ffprobe
+    process) is comparatively expensive, so the idea is to do it once per file
+    and then pass this record along to anything needing to know about the file.
+
+    Attributes
+    ----------
+    path : str
+        The path of the media file
+    format_name : str or None
+        The name(s) of the container format, as reported by the prober
+    streams : tuple of Streams
+        The streams within the media file
+    duration : float or None
+        The duration of the media file in seconds, or None if it couldn't be
+        determined
+    tags : dict of str to str
+        The container-level metadata tags (title, artist, etc.), with the tag names
+        lower-cased
+    """
+
+    path: str
+    format_name: str | None
+    streams: tuple[Stream, ...]
+    duration: float | None
+    tags: dict[str, str]
+
+    @property
+    def has_audio(self) -> bool:
+        """Whether the file contains any audio streams"""
+        return any(stream.codec_type == "audio" for stream in self.streams)
+
+    @property
+    def has_cover(self) -> bool:
+        """Whether the file contains an image stream that could be used as album
+        art"""
+        return any(stream.codec_type == "video" for stream in self.streams)
+
+    @classmethod
+    def from_ffprobe(
+        cls, path: os.PathLike | str, metadata: dict[str, Any]
+    ) -> "MediaInfo":
+        """Create a MediaInfo record from the output of ffprobe
+
+        Parameters
+        ----------
+        path : pathlike
+            The path of the file that was probed
+        metadata : dict
+            The parsed JSON output of ffprobe (run with -show_format and
+            -show_streams)
+
+        Returns
+        -------
+        MediaInfo
+            The parsed metadata
+        """
+        format_info: dict[str, Any] = metadata.get("format") or {}
+        duration: float | None = None
+        try:
+            if math.isfinite(parsed_duration := float(format_info["duration"])):
+                duration = parsed_duration
+        except (KeyError, TypeError, ValueError):
+            pass
+
+        tags: dict[str, str] = {}
+        for key, value in (format_info.get("tags") or {}).items():
+            tags.setdefault(key.lower(), value)
+        # some containers (e.g. Ogg) store their tags on the audio stream
+        for stream in metadata.get("streams") or ():
+            if stream.get("codec_type") == "audio":
+                for key, value in (stream.get("tags") or {}).items():
+                    tags.setdefault(key.lower(), value)
+                break
+
+        streams: list[Stream] = []
+        for i, stream in enumerate(metadata.get("streams") or ()):
+            streams.append(
+                Stream(
+                    stream.get("index", i),
+                    stream.get("codec_type", "unknown"),
+                    stream.get("codec_name"),
+                    bool((stream.get("disposition") or {}).get("attached_pic")),
+                )
+            )
+
+        return cls(
+            os.fspath(path),
+            format_info.get("format_name"),
+            tuple(streams),
+            duration,
+            tags,
+        )
+
+    @classmethod
+    def from_header_info(
+        cls, path: os.PathLike | str, header_info: HeaderInfo
+    ) -> "MediaInfo":
+        """Create a MediaInfo record from metadata read directly from a file's
+        headers
+
+        Parameters
+        ----------
+        path : pathlike
+            The path of the file that was read
+        header_info : HeaderInfo
+            The metadata read from the file
+
+        Returns
+        -------
+        MediaInfo
+            The metadata, in the same form as if the file had been probed using
+            ffprobe
+        """
+        streams = [Stream(0, "audio", header_info.codec_name)]
+        if header_info.has_cover:
+            streams.append(Stream(1, "video", header_info.cover_codec, True))
+        return cls(
+            os.fspath(path),
+            header_info.format_name,
+            tuple(streams),
+            header_info.duration,
+            dict(header_info.tags),
+        )
+
+
+def probe_track(
+    track_path: os.PathLike | str, cache: ProbeCache | None = None
+) -> MediaInfo:
+    """Probe a media file. Common audio formats (MP3, FLAC, Ogg and M4A) are read
+    directly from their headers, with ffprobe used for everything else (and for any
+    files whose headers can't be parsed).
+
+    Parameters
+    ----------
+    track_path : pathlike
+        The path to the file to probe
+    cache : ProbeCache, optional
+        A cache of earlier probe results to consult (and update). If None is
+        specified, the file will always be probed.
+
+    Returns
+    -------
+    MediaInfo
+        The results of the probe
+
+    Raises
+    ------
+    ffmpeg.Error
+        If ffprobe was unable to read the file
+    """
+    track_path = os.fspath(track_path)
+    identity, media_info = probe_in_process(track_path, cache)
+    if media_info is not None:
+        return media_info
+
+    LOGGER.debug(f"Probing {track_path} using ffprobe")
+    try:
+        metadata = ffmpeg.probe(track_path, cmd=bin.ffprobe)
+    except ffmpeg.Error as probe_fail:
+        cache_probe_failure(cache, identity, probe_fail)
+        raise
+    return cache_probe_result(
+        cache, identity, MediaInfo.from_ffprobe(track_path, metadata)
+    )
+
+
+def probe_in_process(
+    track_path: str, cache: ProbeCache | None
+) -> tuple[tuple[str, int, int, int] | None, MediaInfo | None]:
+    """Try to get a file's metadata without spawning ffprobe, first by looking it
+    up in the cache and then by reading the file's headers
+
+    Parameters
+    ----------
+    track_path : str
+        The path to the file to probe
+    cache : ProbeCache or None
+        A cache of earlier probe results to consult (and update)
+
+    Returns
+    -------
+    (str, int, int, int) tuple or None
+        The identity of the file (for updating the cache), or None if there's no
+        cache to update
+    MediaInfo or None
+        The results of the probe, or None if the file needs to be probed using
+        ffprobe
+
+    Raises
+    ------
+    ffmpeg.Error
+        If the cache records that ffprobe was unable to read the file
+    """
+    identity: tuple[str, int, int, int] | None = None
+    if cache is not None:
+        try:
+            identity = file_identity(track_path)
+        except OSError:
+            pass
+        else:
+            if (cached := cache.get(identity)) is not None:
+                return identity, _decode(track_path, cached)
+
+    if (header_info := read_header_info(track_path)) is not None:
+        media_info = MediaInfo.from_header_info(track_path, header_info)
+        return identity, cache_probe_result(cache, identity, media_info)
+    return identity, None
+
+
+def cache_probe_result(
+    cache: ProbeCache | None,
+    identity: tuple[str, int, int, int] | None,
+    media_info: MediaInfo,
+) -> MediaInfo:
+    """Store the results of a probe in the cache (if there is one), passing the
+    results through
+
+    Parameters
+    ----------
+    cache : ProbeCache or None
+        The cache to update
+    identity : (str, int, int, int) tuple or None
+        The identity of the probed file (see `cache.file_identity`), or None if
+        it couldn't be determined (in which case nothing is cached)
+    media_info : MediaInfo
+        The results of the probe
+
+    Returns
+    -------
+    MediaInfo
+        The results of the probe, unchanged
+    """
+    if cache is not None and identity is not None:
+        cache.put(identity, _encode(media_info))
+    return media_info
+
+
+def cache_probe_failure(
+    cache: ProbeCache | None,
+    identity: tuple[str, int, int, int] | None,
+    probe_fail: ffmpeg.Error,
+) -> None:
+    """Record in the cache (if there is one) that a file could not be probed
+
+    Parameters
+    ----------
+    cache : ProbeCache or None
+        The cache to update
+    identity : (str, int, int, int) tuple or None
+        The identity of the file (see `cache.file_identity`), or None if it
+        couldn't be determined (in which case nothing is cached)
+    probe_fail : ffmpeg.Error
+        The error ffprobe raised
+    """
+    if cache is not None and identity is not None:
+        cache.put(
+            identity, {"error": (probe_fail.stderr or b"").decode(errors="replace")}
+        )
+
+
+def _encode(media_info: MediaInfo) -> dict[str, Any]:
+    """Convert a MediaInfo record into a form that can be serialized to JSON"""
+    return {
+        "format_name": media_info.format_name,
+        "streams": [list(stream) for stream in media_info.streams],
+        "duration": media_info.duration,
+        "tags": media_info.tags,
+    }
+
+
+def _decode(track_path: str, encoded: dict[str, Any]) -> MediaInfo:
+    """Reconstitute a MediaInfo record from its serialized form
+
+    Raises
+    ------
+    ffmpeg.Error
+        If the record is of a failed probe
+    """
+    if "error" in encoded:
+        raise ffmpeg.Error("ffprobe", b"", encoded["error"].encode())
+    return MediaInfo(
+        track_path,
+        encoded["format_name"],
+        tuple(Stream(*stream) for stream in encoded["streams"]),
+        encoded["duration"],
+        encoded["tags"],
+    )
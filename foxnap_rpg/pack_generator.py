@@ -1,23 +1,44 @@
-"""Functionality for converting a selection of audio tracks into a resource pack"""
+"""Functionality for converting a selection of audio tracks into a resource pack
+
+The stages of `generate_resource_pack` that don't involve running ffmpeg (preparing
+the pack, writing out the track assets and archiving the result), along with the
+builders of the ffmpeg commands it runs, are exposed separately so that
+`foxnap_rpg.aio` can assemble the same pack while running ffmpeg itself. They're
+internal to this package, so they're not re-exported from the top level.
+"""
 
 import io
 import json
 import logging
 import os
 import random
+import re
 import shutil
+from concurrent.futures import Future
+from contextlib import ExitStack
 from enum import IntEnum, auto
 from pathlib import Path
-from tempfile import NamedTemporaryFile, TemporaryDirectory
-from typing import Any, NamedTuple
+from tempfile import TemporaryDirectory
+from typing import Any, Callable, Collection, Iterator, NamedTuple, Sequence
 
 import ffmpeg
 from PIL import Image
 
 from . import assets, bin
+from .cache import ConversionCache
+from .headers import read_cover_art
+from .media import MediaInfo, probe_track
+from .utils import parallel_map
 
 LOGGER = logging.getLogger(__name__)
 
+_JSON_OPTS: dict[str, Any] = {"indent": 2, "sort_keys": True}
+_MANIFEST_FILE = "manifest.json"
+_MANIFEST_VERSION = 2
+
+# the name of a generated track file, capturing the track number
+_TRACK_FILE = re.compile(r"track_([0-9]+)[.](?:ogg|json|png)")
+
 
 class License(IntEnum):
     """More properly, "permissions" for usage of the music track and, by extension
@@ -47,8 +68,10 @@ class Track(NamedTuple):
     num : int
         the number of the track (need not be sequential, can overwrite  one of the
         default tracks)
-    duration : int
-        The duration of the track in seconds (rounded up)
+    duration : int or Future of int
+        The duration of the track in seconds (rounded up). This can also be a Future
+        (_e.g._ for a probe that's still running in the background), in which case
+        it won't be waited on until the duration is actually needed.
     path : pathlike
         the path to the music track
     hue : bool or float, optional
@@ -66,19 +89,40 @@ class Track(NamedTuple):
     license : License, optional
         The permission level for use of the specified track. If None is specified,
         it will be assumed that the track is for PERSONAL use only.
+    media_info : MediaInfo, optional
+        The results of probing the music track. If None is specified, the track
+        will be probed as needed.
     """
 
     num: int
-    duration: int
+    duration: int | Future[int]
     path: os.PathLike | str
     hue: bool | float = True
     description: str | None = None
     use_album_art: bool = True
     license: License = License.PERSONAL
+    media_info: MediaInfo | None = None
 
     def __str__(self):
         return repr(self.description or os.fspath(self.path))
 
+    def resolve_duration(self) -> int:
+        """Get the duration of the track, waiting for it to be determined if need be
+
+        Returns
+        -------
+        int
+            The duration of the track in seconds (rounded up)
+
+        Raises
+        ------
+        Exception
+            Whatever error was raised in the course of determining the duration
+        """
+        if isinstance(self.duration, Future):
+            return self.duration.result()
+        return self.duration
+
 
 def generate_resource_pack(
     output_path: os.PathLike | str,
@@ -88,6 +132,9 @@ def generate_resource_pack(
     license_file: os.PathLike | str | None = None,
     title_color: str = "gold",
     license_color: str | None = None,
+    working_dir: os.PathLike | str | None = None,
+    jobs: int = 1,
+    conversion_cache: ConversionCache | None = None,
 ) -> dict[int, int]:
     """Generate a FoxNap resource pack!
 
@@ -115,12 +162,32 @@ def generate_resource_pack(
     license_color : str, optional
         The color code to use for the usage summary on the resource pack loading screen.
         If None is provided, one will be selected automatically.
+    working_dir : pathlike, optional
+        A folder in which to keep the unpacked contents of the resource pack between
+        builds. When regenerating a pack using the same working folder, only tracks
+        that were added or changed since the last build (_i.e._ whose music file or
+        texture settings are different) will be re-encoded and re-textured
+        (tracks that have merely been renumbered will have their files moved). If
+        None is specified, the pack will be built from scratch in a temporary
+        folder.
+    jobs : int, optional
+        The maximum number of tracks to convert at once. Each conversion is
+        limited to a single thread, so this should be at most the number of
+        CPUs available. Default is 1.
+    conversion_cache : ConversionCache, optional
+        A store of tracks converted on previous builds (in any working folder, or
+        none). Tracks found in the store won't need to be re-encoded, and newly
+        converted tracks will be added to it. If None is specified, every track
+        that needs converting will be encoded.
 
     Returns
     -------
     dict of int to int
         The durations of each track, with the keys being the numbers of each track
-        (remembering that the first track is Track 1)
+        (remembering that the first track is Track 1). Any track whose duration
+        was still being determined when the pack was generated and for which that
+        failed will be left out of the pack (with a warning), and so won't appear
+        here.
 
     Raises
     ------
@@ -130,6 +197,8 @@ def generate_resource_pack(
       - If the license level specified is less restrictive than the license level
         for any of the provided tracks (this is not checked when license_summary
         is provided via a custom string)
+    ValueError
+        If the specified number of jobs is invalid
 
     Notes
     -----
@@ -141,140 +210,461 @@ def generate_resource_pack(
       License.RESTRICTED, the license summary will *still* be set to LICENSE.PERSONAL
       if no license file is provided.
     """
-    colored_vinyl_template = Image.open(assets.COLORED_VINYL_TEMPLATE)
-    record_template = Image.open(assets.RECORD_TEMPLATE)
-    json_opts: dict[str, Any] = {"indent": 2, "sort_keys": True}
+    if jobs < 1 or int(jobs) != jobs:
+        raise ValueError("jobs must be an integer no less than 1")
+    # any durations still being determined need to be settled before anything
+    # gets built, so that the tracks for which that failed are left out up front
+    durations = keep_resolved(tracks, [_try_resolve(track) for track in tracks])
+    tracks = tuple(track for track, _ in durations)
+    with ExitStack() as stack:
+        if working_dir is None:
+            root = Path(stack.enter_context(TemporaryDirectory()))
+            manifest: dict[str, Any] = {}
+            up_to_date: set[int] = set()
+        else:
+            root = Path(working_dir) / "pack"
+            manifest = _load_manifest(Path(working_dir))
+            up_to_date = _reuse_working_files(Path(working_dir), root, manifest, tracks)
+            root.mkdir(parents=True, exist_ok=True)
+        foxnap_root = prepare_pack(
+            root,
+            tracks,
+            title=title,
+            license_summary=license_summary,
+            license_file=license_file,
+            title_color=title_color,
+            license_color=license_color,
+        )
 
-    with TemporaryDirectory() as tmpdir:
-        root = Path(tmpdir)
+        LOGGER.info("Beginning music track conversion")
+        to_convert: list[tuple[Track, list]] = []
+        for track in tracks:
+            if track.num in up_to_date:
+                LOGGER.debug(f"{track} is unchanged since the last build")
+                continue
+            to_convert.append((track, _fingerprint(track)))
+
+        def queue_conversions() -> Iterator[Track]:
+            # (the queue is read on this thread, so these get logged in order)
+            for track, _ in to_convert:
+                LOGGER.info(f"Converting {track}")
+                yield track
+
+        conversions = parallel_map(
+            lambda track: _convert_track(
+                track,
+                foxnap_root / "sounds" / f"track_{track.num}.ogg",
+                conversion_cache,
+            ),
+            queue_conversions(),
+            jobs=jobs,
+        )
+        for (track, _), reused in zip(to_convert, conversions):
+            if reused:
+                LOGGER.debug(f"Reused the stored conversion of {track}")
+        LOGGER.info("Music track conversion complete")
 
-        if license_file:
-            LOGGER.info(f"Copying in license file {repr(os.fspath(license_file))}")
-            shutil.copy(license_file, root / Path(license_file).name)
-        else:
-            LOGGER.info("Skipping license file--none specified.")
-
-        if isinstance(license_summary, License) or license_summary is None:
-            license_level = license_summary or License.UNRESTRICTED
-            non_compliance_report = ""
-            for track in tracks:
-                if track.license > license_level:
-                    if license_summary is None:
-                        license_level = track.license
-                    else:
-                        if track.license == License.ATTRIBUTION:
-                            compliance_str = "requires an attribution license"
-                        elif track.license == License.RESTRICTED:
-                            compliance_str = "requires a restricted license"
-                        elif track.license == License.PERSONAL:
-                            compliance_str = "is for personal use only"
-                        else:
-                            raise NotImplementedError(
-                                f"Unrecognized license type {track.license}"
-                            )
-                        non_compliance_report += f"\n - {track} {compliance_str}"
-
-            if non_compliance_report:
-                raise RuntimeError(
-                    f"The selected license level ({license_summary})"
-                    " is too permissive for the following tracks:"
-                    f"{non_compliance_report}"
-                )
-
-            if license_file is None and license_level in (
-                License.ATTRIBUTION,
-                License.RESTRICTED,
-            ):
-                message = (
-                    f"Cannot use {license_level} due to lack of a license file."
-                    "\nEither provide a license file or select a different license."
-                )
-                if license_summary is None:
-                    LOGGER.warning(message, RuntimeWarning)
-                else:
-                    raise RuntimeError(message)
-                license_level = License.PERSONAL
+        write_track_assets(foxnap_root, tracks, _extract_inlay, skip=up_to_date)
+        if working_dir is not None:
+            # only now that all of their files have been written
+            for track, fingerprint in to_convert:
+                manifest[_source_key(track)] = {
+                    "num": track.num,
+                    "fingerprint": fingerprint,
+                }
+            _save_manifest(Path(working_dir), manifest)
+        archive_pack(root, output_path)
+    return {track.num: duration for track, duration in durations}
+
+
+def _try_resolve(track: Track) -> int | Exception:
+    """Resolve a track's duration, returning (rather than raising) any error"""
+    try:
+        return track.resolve_duration()
+    except Exception as resolve_fail:
+        return resolve_fail
+
+
+def keep_resolved(
+    tracks: Sequence[Track], durations: Sequence[int | BaseException]
+) -> list[tuple[Track, int]]:
+    """Pair up the tracks with their resolved durations, warning about (and leaving
+    out) any tracks whose durations couldn't be determined
 
-            # this should do nothing if license_summary is not None
-            LOGGER.info(f"Setting license level to {license_level}")
-            license_summary = license_level
+    Parameters
+    ----------
+    tracks : list-like of Tracks
+        The tracks in the pack
+    durations : list-like of ints and exceptions
+        The result of resolving each track's duration, or the error raised when
+        trying to
 
-        LOGGER.info("Writing pack.mcmeta")
-        with (root / "pack.mcmeta").open("w") as f:
-            f.write(generate_mcmeta(title, license_summary, title_color, license_color))
-        LOGGER.info("Copying pack icon")
-        shutil.copy(assets.PACK_ICON, root / "pack.png")  # type: ignore[call-overload]
+    Returns
+    -------
+    list of (Track, int) tuples
+        The tracks whose durations could be determined, paired with those durations
+    """
+    resolved: list[tuple[Track, int]] = []
+    for track, duration in zip(tracks, durations):
+        if isinstance(duration, BaseException):
+            LOGGER.warning(
+                f"Could not determine the duration of {track}:"
+                f"\n  {duration}"
+                "\n\nLeaving it out of the pack."
+            )
+            continue
+        resolved.append((track, duration))
+    return resolved
+
+
+def _convert_track(
+    track: Track, output_path: Path, conversion_cache: ConversionCache | None
+) -> bool:
+    """Convert a track to Ogg Vorbis, going through the conversion cache (if one is
+    provided) and returning whether the stored conversion could be used"""
+    # the file currently there may be linked into the store, so it mustn't be
+    # overwritten in place
+    output_path.unlink(missing_ok=True)
+    if conversion_cache is None:
+        convert_music_to_ogg(track.path, output_path)
+        return False
+    try:
+        key = conversion_cache.key(
+            track.path, ogg_converter("<input>", "<output>").compile()
+        )
+    except OSError as hash_fail:
+        LOGGER.debug(
+            f"Could not look up {track} in the conversion cache:\n  {hash_fail}"
+        )
+        convert_music_to_ogg(track.path, output_path)
+        return False
+    if conversion_cache.get(key, output_path):
+        return True
+    convert_music_to_ogg(track.path, output_path)
+    conversion_cache.put(key, output_path)
+    return False
 
-        foxnap_root = root / "assets" / "foxnap"
-        foxnap_root.mkdir(parents=True, exist_ok=True)
 
-        sounds = foxnap_root / "sounds"
-        sounds.mkdir(exist_ok=True)
-        LOGGER.info("Beginning music track conversion")
-        duration_map: dict[int, int] = {}
-        for track in tracks:
-            LOGGER.info(f"Converting {track}")
-            convert_music_to_ogg(track.path, sounds / f"track_{track.num}.ogg")
-            duration_map[track.num] = track.duration
-        LOGGER.info("Music track conversion complete")
+def _source_key(track: Track) -> str:
+    """The key under which a track's generated files are recorded in a working
+    folder's manifest (so that they can be found again even if the track gets
+    renumbered)"""
+    return os.path.abspath(track.path)
+
+
+def _fingerprint(track: Track) -> list:
+    """Summarize everything else about a track that goes into its converted audio
+    and record texture, for determining whether these need to be regenerated"""
+    try:
+        stat = os.stat(track.path)
+    except OSError:
+        return [None, None, track.hue, track.use_album_art]
+    return [stat.st_size, stat.st_mtime_ns, track.hue, track.use_album_art]
+
+
+def _load_manifest(working_dir: Path) -> dict[str, Any]:
+    """Load the record of what was built into a working folder (if anything),
+    keyed by source file"""
+    try:
+        manifest = json.loads((working_dir / _MANIFEST_FILE).read_text())
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(manifest, dict) or manifest.get("version") != _MANIFEST_VERSION:
+        return {}
+    return manifest["tracks"]
+
+
+def _save_manifest(working_dir: Path, manifest: dict[str, Any]) -> None:
+    """Save the record of what was built into a working folder"""
+    (working_dir / _MANIFEST_FILE).write_text(
+        json.dumps({"version": _MANIFEST_VERSION, "tracks": manifest}, **_JSON_OPTS)
+    )
+
 
-        LOGGER.info("Writing sound registry")
-        with (foxnap_root / "sounds.json").open("w") as f:
-            json.dump(
-                generate_sound_registry(*(track.num for track in tracks)),
-                f,
-                **json_opts,
+def _track_files(foxnap_root: Path, num: int | str) -> tuple[Path, ...]:
+    """The files generated for a single track"""
+    return (
+        foxnap_root / "sounds" / f"track_{num}.ogg",
+        foxnap_root / "models" / "item" / f"track_{num}.json",
+        foxnap_root / "textures" / "item" / f"track_{num}.png",
+    )
+
+
+def _reuse_working_files(
+    working_dir: Path, root: Path, manifest: dict[str, Any], tracks: Sequence[Track]
+) -> set[int]:
+    """Work out which tracks' files in a working folder are still up-to-date, moving
+    the files of any tracks that have merely been renumbered, and remove everything
+    else: the files of tracks that are no longer part of the pack (or that are
+    going to be regenerated) and the pack-level files (which are cheap to
+    regenerate, and which may include an outdated license file).
+
+    The pruned manifest is saved *before* anything is moved or removed, so that if
+    the build is interrupted, the manifest never lists files that no longer exist.
+
+    Returns
+    -------
+    set of int
+        The numbers of the tracks whose files are up-to-date
+    """
+    foxnap_root = root / "assets" / "foxnap"
+    # as (source, manifest entry, new number)
+    reused: list[tuple[str, dict[str, Any], int]] = []
+    claimed: set[int] = set()
+    for track in tracks:
+        source = _source_key(track)
+        entry = manifest.get(source)
+        if (
+            entry is None
+            or entry["fingerprint"] != _fingerprint(track)
+            or entry["num"] in claimed  # (by another track from the same file)
+            or not all(
+                track_file.exists()
+                for track_file in _track_files(foxnap_root, entry["num"])
             )
+        ):
+            continue
+        claimed.add(entry["num"])
+        reused.append((source, entry, track.num))
+
+    unmoved = {source: entry for source, entry, num in reused if entry["num"] == num}
+    if unmoved.keys() != manifest.keys():
+        manifest.clear()
+        manifest.update(unmoved)
+        _save_manifest(working_dir, manifest)
+
+    if not root.exists():
+        return set()
+    if not reused:
+        # nothing worth keeping, so start fresh
+        shutil.rmtree(root)
+        return set()
+    for entry in root.iterdir():
+        if entry.name != "assets" and not entry.is_dir():
+            entry.unlink()
+
+    # the numbers being moved to may well still be taken by files that are about
+    # to be moved themselves, so everything gets moved out of the way first
+    moves = [(entry["num"], num) for _, entry, num in reused if entry["num"] != num]
+    for previous, _ in moves:
+        for track_file in _track_files(foxnap_root, previous):
+            track_file.rename(track_file.with_name(f"moving_{track_file.name}"))
+    for previous, num in moves:
+        for track_file, destination in zip(
+            _track_files(foxnap_root, previous), _track_files(foxnap_root, num)
+        ):
+            track_file.with_name(f"moving_{track_file.name}").replace(destination)
+
+    # which leaves the files of every other number up for removal (including any
+    # left behind by an interrupted build)
+    nums = {str(track.num) for track in tracks}
+    for track_file in _track_files(foxnap_root, 0):  # (just for the folders)
+        if not track_file.parent.is_dir():
+            continue
+        for existing in track_file.parent.iterdir():
+            match = _TRACK_FILE.fullmatch(existing.name)
+            if match is None or match[1] not in nums:
+                existing.unlink()
+
+    if moves:
+        for source, entry, num in reused:
+            manifest[source] = {**entry, "num": num}
+        _save_manifest(working_dir, manifest)
+    return {num for _, _, num in reused}
+
+
+def prepare_pack(
+    root: Path,
+    tracks: Sequence[Track],
+    title: str,
+    license_summary: License | str | None,
+    license_file: os.PathLike | str | None,
+    title_color: str,
+    license_color: str | None,
+) -> Path:
+    """Validate the pack's license and write out everything in the pack that doesn't
+    depend on the individual tracks
 
-        models = foxnap_root / "models" / "item"
-        models.mkdir(parents=True, exist_ok=True)
-        LOGGER.info("Writing record item model jsons")
-        for track in tracks:
-            with (models / f"track_{track.num}.json").open("w") as f:
-                json.dump(generate_model(track.num), f, **json_opts)
+    Parameters
+    ----------
+    root : Path
+        The folder the pack is being assembled in
+    tracks : list-like of Tracks
+        The tracks in the pack
+    title, license_summary, license_file, title_color, license_color
+        See `generate_resource_pack`
+
+    Returns
+    -------
+    Path
+        The folder into which the FoxNap assets should be written
+
+    Raises
+    ------
+    RuntimeError
+        If the license is inappropriate for the provided tracks (see
+        `generate_resource_pack`)
+    """
+    if license_file:
+        LOGGER.info(f"Copying in license file {repr(os.fspath(license_file))}")
+        shutil.copy(license_file, root / Path(license_file).name)
+    else:
+        LOGGER.info("Skipping license file--none specified.")
 
-        item_textures = foxnap_root / "textures" / "item"
-        item_textures.mkdir(exist_ok=True, parents=True)
-        LOGGER.info("Beginning record item texture generation")
+    if isinstance(license_summary, License) or license_summary is None:
+        license_level = license_summary or License.UNRESTRICTED
+        non_compliance_report = ""
         for track in tracks:
-            LOGGER.info(f"Creating texture for {track}")
-            inlay: Image.Image | None = None
-            if track.use_album_art:
-                LOGGER.info(f"Attempting to extract inlay from album art for {track}")
-                inlay = extract_album_art(track.path)
-                if inlay is None:
-                    LOGGER.warning(f"Failed to extract album art for {track}")
-            if inlay is None:
-                LOGGER.info("Generating random inlay")
-                inlay = generate_random_inlay()
-
-            if track.hue is False:
-                template = record_template
+            if track.license > license_level:
+                if license_summary is None:
+                    license_level = track.license
+                else:
+                    if track.license == License.ATTRIBUTION:
+                        compliance_str = "requires an attribution license"
+                    elif track.license == License.RESTRICTED:
+                        compliance_str = "requires a restricted license"
+                    elif track.license == License.PERSONAL:
+                        compliance_str = "is for personal use only"
+                    else:
+                        raise NotImplementedError(
+                            f"Unrecognized license type {track.license}"
+                        )
+                    non_compliance_report += f"\n - {track} {compliance_str}"
+
+        if non_compliance_report:
+            raise RuntimeError(
+                f"The selected license level ({license_summary})"
+                " is too permissive for the following tracks:"
+                f"{non_compliance_report}"
+            )
+
+        if license_file is None and license_level in (
+            License.ATTRIBUTION,
+            License.RESTRICTED,
+        ):
+            message = (
+                f"Cannot use {license_level} due to lack of a license file."
+                "\nEither provide a license file or select a different license."
+            )
+            if license_summary is None:
+                LOGGER.warning(message, RuntimeWarning)
             else:
-                hue_shift = None if track.hue is True else track.hue
-                template = create_colored_vinyl(
-                    colored_vinyl_template, hue_shift=hue_shift
-                )
-
-            record_texture = composite_record_texture(template, inlay)
-            with (item_textures / f"track_{track.num}.png").open("wb") as f:
-                record_texture.save(f, format="png")
-
-        lang = foxnap_root / "lang"
-        lang.mkdir(exist_ok=True)
-        LOGGER.info("Writing language file")
-        with (lang / "en_us.json").open("w") as f:
-            json.dump(generate_lang_file(*tracks), f, **json_opts)
-
-        output_path_as_str = str(output_path)
-        if output_path_as_str.endswith(".zip"):
-            output_path_as_str = output_path_as_str[:-4]
-        LOGGER.info(
-            "Compressing archive and saving as"
-            f" {Path(output_path_as_str).with_suffix('.zip').absolute()}"
+                raise RuntimeError(message)
+            license_level = License.PERSONAL
+
+        # this should do nothing if license_summary is not None
+        LOGGER.info(f"Setting license level to {license_level}")
+        license_summary = license_level
+
+    LOGGER.info("Writing pack.mcmeta")
+    with (root / "pack.mcmeta").open("w") as f:
+        f.write(generate_mcmeta(title, license_summary, title_color, license_color))
+    LOGGER.info("Copying pack icon")
+    shutil.copy(assets.PACK_ICON, root / "pack.png")  # type: ignore[call-overload]
+
+    foxnap_root = root / "assets" / "foxnap"
+    (foxnap_root / "sounds").mkdir(parents=True, exist_ok=True)
+    return foxnap_root
+
+
+def write_track_assets(
+    foxnap_root: Path,
+    tracks: Sequence[Track],
+    extract_inlay: Callable[[Track], Image.Image | None],
+    skip: Collection[int] = (),
+) -> None:
+    """Write out the sound registry, item models, textures and language file for
+    the provided tracks
+
+    Parameters
+    ----------
+    foxnap_root : Path
+        The folder into which the FoxNap assets should be written
+    tracks : list-like of Tracks
+        The tracks in the pack
+    extract_inlay : function
+        The function to use to get the inlay of a track's record texture from its
+        album art (for tracks with `use_album_art` set). This function should return
+        None if no inlay could be extracted.
+    skip : collection of ints, optional
+        The numbers of any tracks whose textures are already up-to-date
+    """
+    colored_vinyl_template = Image.open(assets.COLORED_VINYL_TEMPLATE)
+    record_template = Image.open(assets.RECORD_TEMPLATE)
+
+    LOGGER.info("Writing sound registry")
+    with (foxnap_root / "sounds.json").open("w") as f:
+        json.dump(
+            generate_sound_registry(*(track.num for track in tracks)),
+            f,
+            **_JSON_OPTS,
         )
-        shutil.make_archive(output_path_as_str, "zip", root)
-    return duration_map
+
+    models = foxnap_root / "models" / "item"
+    models.mkdir(parents=True, exist_ok=True)
+    LOGGER.info("Writing record item model jsons")
+    for track in tracks:
+        with (models / f"track_{track.num}.json").open("w") as f:
+            json.dump(generate_model(track.num), f, **_JSON_OPTS)
+
+    item_textures = foxnap_root / "textures" / "item"
+    item_textures.mkdir(exist_ok=True, parents=True)
+    LOGGER.info("Beginning record item texture generation")
+    for track in tracks:
+        if track.num in skip:
+            continue
+        LOGGER.info(f"Creating texture for {track}")
+        inlay: Image.Image | None = None
+        if track.use_album_art:
+            inlay = extract_inlay(track)
+        if inlay is None:
+            LOGGER.info("Generating random inlay")
+            inlay = generate_random_inlay()
+
+        if track.hue is False:
+            template = record_template
+        else:
+            hue_shift = None if track.hue is True else track.hue
+            template = create_colored_vinyl(colored_vinyl_template, hue_shift=hue_shift)
+
+        record_texture = composite_record_texture(template, inlay)
+        with (item_textures / f"track_{track.num}.png").open("wb") as f:
+            record_texture.save(f, format="png")
+
+    lang = foxnap_root / "lang"
+    lang.mkdir(exist_ok=True)
+    LOGGER.info("Writing language file")
+    with (lang / "en_us.json").open("w") as f:
+        json.dump(generate_lang_file(*tracks), f, **_JSON_OPTS)
+
+
+def _extract_inlay(track: Track) -> Image.Image | None:
+    """Extract the inlay for a track's record texture from its album art"""
+    LOGGER.info(f"Attempting to extract inlay from album art for {track}")
+    inlay = extract_album_art(track.media_info or track.path)
+    if inlay is None:
+        LOGGER.warning(f"Failed to extract album art for {track}")
+    return inlay
+
+
+def archive_pack(root: Path, output_path: os.PathLike | str) -> None:
+    """Zip up the pack
+
+    Parameters
+    ----------
+    root : Path
+        The folder the pack was assembled in
+    output_path : pathlike
+        The path to save the archive to (the ".zip" extension is optional)
+    """
+    output_path_as_str = str(output_path)
+    if output_path_as_str.endswith(".zip"):
+        output_path_as_str = output_path_as_str[:-4]
+    LOGGER.info(
+        "Compressing archive and saving as"
+        f" {Path(output_path_as_str).with_suffix('.zip').absolute()}"
+    )
+    shutil.make_archive(output_path_as_str, "zip", root)
 
 
 def generate_mcmeta(
@@ -330,17 +720,37 @@ def generate_mcmeta(
 def convert_music_to_ogg(
     input_path: os.PathLike | str, output_path: os.PathLike | str
 ) -> None:
-    converter = (
-        ffmpeg.input(os.fspath(input_path))
-        .audio.output(os.fspath(os.fspath(output_path)), acodec="libvorbis", ac=1)
-        .overwrite_output()
-    )
+    converter = ogg_converter(input_path, output_path)
     LOGGER.debug(
         f"Converting using the following command: {' '.join(converter.compile())}"
     )
     converter.run(cmd=bin.ffmpeg, capture_stdout=True)
 
 
+def ogg_converter(input_path: os.PathLike | str, output_path: os.PathLike | str) -> Any:
+    """Build the ffmpeg command for converting a music track to Ogg Vorbis
+
+    Parameters
+    ----------
+    input_path : pathlike
+        The track to convert
+    output_path : pathlike
+        Where to save the converted file
+
+    Returns
+    -------
+    ffmpeg.nodes.OutputStream
+        The (not yet run) ffmpeg command
+    """
+    # each conversion is kept to a single thread, so that concurrent conversions
+    # don't fight over the CPUs
+    return (
+        ffmpeg.input(os.fspath(input_path), threads=1)
+        .audio.output(os.fspath(output_path), acodec="libvorbis", ac=1, threads=1)
+        .overwrite_output()
+    )
+
+
 def generate_sound_registry(*track_numbers: int) -> dict:
     """Generate the sound registry for all new tracks
 
@@ -426,13 +836,16 @@ def create_colored_vinyl(
     return new_template
 
 
-def extract_album_art(track: os.PathLike | str) -> Image.Image | None:
+_INLAY_SIZE = (5, 3)
+
+
+def extract_album_art(track: os.PathLike | str | MediaInfo) -> Image.Image | None:
     """Extract the album art from an audio track, if the track has album art encoded.
 
     Parameters
     ----------
-    track: pathlike
-        path to the track
+    track: pathlike or MediaInfo
+        path to the track, or the results of an earlier probe of the track
 
     Returns
     -------
@@ -440,32 +853,111 @@ def extract_album_art(track: os.PathLike | str) -> Image.Image | None:
         the album art embedded in the audio track, downscaled to 5x3, or None if the
         track didn't have any album art embedded
     """
-    track_path = os.fspath(track)
-    try:
-        metadata = ffmpeg.probe(track_path, cmd=bin.ffprobe)
-    except ffmpeg.Error as could_not_probe:
-        LOGGER.warning(f"Could not probe track {track_path}:" f"\n\t{could_not_probe}")
-        return None
-    if "video" not in (stream["codec_type"] for stream in metadata["streams"]):
-        return None
-    with NamedTemporaryFile(mode="w+b", suffix=".png") as cover:
+    if isinstance(track, MediaInfo):
+        media_info = track
+    else:
         try:
-            ffmpeg.input(track_path).video.output(
-                os.fspath(cover.name)
-            ).overwrite_output().run(bin.ffmpeg, capture_stdout=True)
-        except ffmpeg.Error as extraction_fail:
+            media_info = probe_track(track)
+        except ffmpeg.Error as could_not_probe:
             LOGGER.warning(
-                f"Could not extract album art from {track_path}:"
-                f"\n\t{extraction_fail}"
+                f"Could not probe track {os.fspath(track)}:" f"\n\t{could_not_probe}"
             )
             return None
+    if not media_info.has_cover:
+        return None
+    track_path = media_info.path
 
-        # move it to in-memory buffer so tempfile can be deleted
-        album_art = Image.open(cover.name)
-        buffer = io.BytesIO()
-        album_art.save(buffer, format="png")
+    if (album_art := decode_embedded_album_art(track_path)) is not None:
+        return album_art
 
-    return Image.open(buffer).resize((5, 3), resample=0)
+    try:
+        pixels, _ = album_art_extractor(track_path).run(
+            cmd=bin.ffmpeg, capture_stdout=True, capture_stderr=True
+        )
+    except ffmpeg.Error as extraction_fail:
+        LOGGER.warning(
+            f"Could not extract album art from {track_path}:" f"\n\t{extraction_fail}"
+        )
+        return None
+    return inlay_from_pixels(track_path, pixels)
+
+
+def decode_embedded_album_art(track_path: str) -> Image.Image | None:
+    """Decode the album art embedded in a track without going through ffmpeg
+
+    Parameters
+    ----------
+    track_path : str
+        The path to the track
+
+    Returns
+    -------
+    Image or None
+        The album art, downscaled to the size of a record inlay, or None if it
+        couldn't be decoded this way
+    """
+    if (cover_art := read_cover_art(track_path)) is None:
+        return None
+    try:
+        album_art = Image.open(io.BytesIO(cover_art))
+        # let the decoder do most of the downscaling (JPEG only)
+        album_art.draft("RGB", _INLAY_SIZE)
+        return album_art.convert("RGB").resize(_INLAY_SIZE, resample=0)
+    except (OSError, ValueError) as decode_fail:
+        LOGGER.debug(
+            f"Could not decode embedded album art from {track_path}:"
+            f"\n\t{decode_fail}\nFalling back to ffmpeg"
+        )
+        return None
+
+
+def album_art_extractor(track_path: str) -> Any:
+    """Build the ffmpeg command for extracting a track's album art. Rather than
+    writing out the full-size image, ffmpeg does the downscaling itself and writes
+    the raw pixels to stdout, so the full-size image never needs to be decoded in
+    Python (or written to disk).
+
+    Parameters
+    ----------
+    track_path : str
+        The path to the track
+
+    Returns
+    -------
+    ffmpeg.nodes.OutputStream
+        The (not yet run) ffmpeg command. Its output should be passed to
+        `inlay_from_pixels`.
+    """
+    return (
+        ffmpeg.input(track_path)
+        .video.filter("scale", *_INLAY_SIZE, flags="neighbor")
+        .output("pipe:", format="rawvideo", pix_fmt="rgb24", vframes=1)
+    )
+
+
+def inlay_from_pixels(track_path: str, pixels: bytes) -> Image.Image | None:
+    """Turn the output of the album art extractor into an image
+
+    Parameters
+    ----------
+    track_path : str
+        The path to the track (for logging)
+    pixels : bytes
+        What the command built by `album_art_extractor` wrote to stdout
+
+    Returns
+    -------
+    Image or None
+        The record inlay, or None if the wrong number of pixels came back
+    """
+    if len(pixels) != _INLAY_SIZE[0] * _INLAY_SIZE[1] * 3:
+        LOGGER.warning(
+            f"Could not extract album art from {track_path}:"
+            f"\n\tExpected {_INLAY_SIZE[0]}x{_INLAY_SIZE[1]} RGB pixels"
+            f" but got {len(pixels)} bytes"
+        )
+        return None
+    return Image.frombytes("RGB", _INLAY_SIZE, pixels)
 
 
 def generate_random_inlay() -> Image.Image:
@@ -526,19 +1018,21 @@ def generate_lang_file(*tracks: Track) -> dict[str, str]:
     lang: dict[str, str] = {}
     for track in tracks:
         lang[f"item.foxnap.track_{track.num}"] = "Music Disc"
-        description = track.description or extract_track_description(track.path)
+        description = track.description or extract_track_description(
+            track.media_info or track.path
+        )
         lang[f"item.foxnap.track_{track.num}.desc"] = description
     return lang
 
 
-def extract_track_description(track_path: os.PathLike | str) -> str:
+def extract_track_description(track_path: os.PathLike | str | MediaInfo) -> str:
     """Extract a description from an audio track, if the track
     has metadata encoded
 
     Parameters
     ----------
-    track_path: pathlike
-        path to the track
+    track_path: pathlike or MediaInfo
+        path to the track, or the results of an earlier probe of the track
 
     Returns
     -------
@@ -546,14 +1040,15 @@ def extract_track_description(track_path: os.PathLike | str) -> str:
         A description of the track (comprising title, artist, composer, etc.)
         if such information was encoded, or just the filename otherwise.
     """
-    metadata = ffmpeg.probe(os.fspath(track_path), cmd=bin.ffprobe)
-    track_info = metadata.get("format", {}).get("tags", {})
+    if not isinstance(track_path, MediaInfo):
+        track_path = probe_track(track_path)
+    track_info = track_path.tags
     title = track_info.get("title")
     artist = track_info.get("artist")
     composer = track_info.get("composer")
 
     if title is None:
-        return Path(track_path).name
+        return Path(track_path.path).name
 
     if artist is None and composer is None:
         return title
@@ -2,26 +2,38 @@
 
 import math
 import os
-from collections import Counter
+import re
+from collections import Counter, deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
-from typing import Iterable, TypeVar, cast
+from typing import Any, Callable, Generic, Iterable, Iterator, TypeVar, cast
 
 import ffmpeg
 
-from . import bin
+from .headers import might_be_audio
+from .media import MediaInfo, probe_track
 
 T = TypeVar("T")
+R = TypeVar("R")
 
 BUILT_IN_DISC_COUNT = 7  # number of discs included with the mod
 
+REGEX_SPEC_PREFIX = "re:"  # marks a multi-track path spec as a regular expression
 
-def is_valid_music_track(file_path: str | os.PathLike) -> bool:
+
+def is_valid_music_track(
+    file_path: str | os.PathLike | MediaInfo, probe_all: bool = True
+) -> bool:
     """Probe a file to determine if it's convertible using ffmpeg
 
     Parameters
     ----------
-    file_path : pathlike
-        The path to the file to probe
+    file_path : pathlike or MediaInfo
+        The path to the file to probe, or the results of an earlier probe
+    probe_all : bool, optional
+        By default, every file is probed. Set this to False to reject files that
+        are obviously not audio files (based on their extensions or their first
+        few bytes) without probing them.
 
     Returns
     -------
@@ -29,25 +41,23 @@ def is_valid_music_track(file_path: str | os.PathLike) -> bool:
         True if the file is a music track that can be converted using ffmpeg, False
         if not
     """
+    if isinstance(file_path, MediaInfo):
+        return file_path.has_audio
+    if not (probe_all or might_be_audio(file_path)):
+        return False
     try:
-        metadata = ffmpeg.probe(file_path, cmd=bin.ffprobe)
+        return probe_track(file_path).has_audio
     except ffmpeg.Error:
         return False
 
-    for stream in metadata["streams"]:
-        if stream["codec_type"] == "audio":
-            return True
-
-    return False
-
 
-def extract_track_duration(track_path: os.PathLike | str) -> int:
+def extract_track_duration(track_path: os.PathLike | str | MediaInfo) -> int:
     """Extract the duration of the track from metadata
 
     Parameters
     ----------
-    track_path: pathlike
-        path to the track
+    track_path: pathlike or MediaInfo
+        path to the track, or the results of an earlier probe of the track
 
     Returns
     -------
@@ -60,13 +70,65 @@ def extract_track_duration(track_path: os.PathLike | str) -> int:
         If for some reason the track's duration cannot be parsed from the
         metadata/
     """
-    metadata = ffmpeg.probe(os.fspath(track_path), cmd=bin.ffprobe)
-    try:
-        return math.ceil(float(metadata["format"]["duration"]))
-    except (KeyError, TypeError, ValueError) as parse_fail:
+    if not isinstance(track_path, MediaInfo):
+        track_path = probe_track(track_path)
+    if track_path.duration is None:
         raise ValueError(
-            "Could not extract duration from track metadata:" f"\n  {parse_fail}"
+            "Could not extract duration from track metadata:"
+            f"\n  no duration reported for {track_path.path}"
         )
+    return math.ceil(track_path.duration)
+
+
+def parallel_map(
+    function: Callable[[T], R], iterable: Iterable[T], jobs: int = 1
+) -> Iterator[R]:
+    """Apply a function to every item of an iterable using a pool of worker threads,
+    yielding the results in the same order as the inputs
+
+    Unlike `ThreadPoolExecutor.map`, the iterable is consumed lazily, with only a
+    bounded number of items in flight at any one time, so results start coming
+    back right away even when the iterable is long (or slow to generate).
+
+    Parameters
+    ----------
+    function : callable
+        The function to apply
+    iterable : list-like
+        The inputs to apply the function to
+    jobs : int, optional
+        The maximum number of items to process at once. Default is 1, in which case
+        everything will be done on the calling thread.
+
+    Returns
+    -------
+    generator
+        The results of applying the function to each input, in order
+
+    Raises
+    ------
+    Exception
+        Any exception raised while processing an item will be raised when that
+        item's result would have been yielded
+    """
+    if jobs < 1 or int(jobs) != jobs:
+        raise ValueError("jobs must be an integer no less than 1")
+    if jobs == 1:
+        yield from map(function, iterable)
+        return
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        in_flight: deque[Future[R]] = deque()
+        try:
+            for item in iterable:
+                in_flight.append(executor.submit(function, item))
+                if len(in_flight) >= 2 * jobs:
+                    yield in_flight.popleft().result()
+            while in_flight:
+                yield in_flight.popleft().result()
+        finally:
+            for future in in_flight:
+                future.cancel()
 
 
 def spec_matches_path(
@@ -141,7 +203,438 @@ def _reassemble_path(ext: str, *parts: str) -> str:
     return os.path.join(*reversed(parts)) + ext
 
 
-def validate_track_numbers(*nums: int | None, check_contiguous: bool = False) -> None:
+class PathSpecIndex(Generic[T]):
+    """An index of path specs for quickly looking up which specs match a given file
+
+    Specs are stored in a trie keyed on their parted-out paths (so, starting from
+    the file name and working up through the parent folders), meaning that the
+    cost of a lookup depends on the depth of the file path rather than on the
+    number of specs in the index.
+
+    Examples
+    --------
+    >>> index = PathSpecIndex()
+    >>> index.add("hello.mp3", "first")
+    >>> index.add("Music/hello", "second")
+    >>> index.matches("/home/me/Music/hello.mp3")
+    ['first', 'second']
+    """
+
+    def __init__(self):
+        self._root = _SpecTrieNode()
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, path_spec: os.PathLike | str | tuple[str, ...], value: T) -> None:
+        """Add a spec to the index
+
+        Parameters
+        ----------
+        path_spec : pathlike
+            The path specification to index
+        value : any
+            The value to return when a file matching the spec is looked up
+        """
+        if isinstance(path_spec, (str, os.PathLike)):
+            path_spec = _part_out_path(path_spec)
+        spec_ext, *spec_parts = path_spec
+        node = self._root
+        for part in spec_parts:
+            node = node.children.setdefault(part, _SpecTrieNode())
+        node.values.setdefault(spec_ext, []).append((self._size, value))
+        self._size += 1
+
+    def matches(
+        self,
+        file_path: os.PathLike | str | tuple[str, ...],
+        any_extension: bool = False,
+    ) -> list[T]:
+        """Find all the specs that match a given file path
+
+        Parameters
+        ----------
+        file_path : pathlike
+            The path to evaluate
+        any_extension : bool, optional
+            If True, specs will be matched on their paths alone, regardless of
+            their extensions. Default is False.
+
+        Returns
+        -------
+        list
+            The values of every spec that matches the file path (in the sense of
+            `spec_matches_path`), in the order they were added to the index
+        """
+        if isinstance(file_path, (str, os.PathLike)):
+            file_path = _part_out_path(os.path.abspath(file_path))
+        file_ext, *file_parts = file_path
+        extensions = (file_ext,) if file_ext == "" else (file_ext, "")
+
+        found: list[tuple[int, T]] = []
+        node = self._root
+        for part in file_parts:
+            if (child := node.children.get(part)) is None:
+                break
+            node = child
+            if any_extension:
+                for entries in node.values.values():
+                    found.extend(entries)
+                continue
+            for ext in extensions:
+                found.extend(node.values.get(ext, ()))
+        return [value for _, value in sorted(found, key=lambda entry: entry[0])]
+
+    def matched_by(
+        self,
+        path_spec: os.PathLike | str | tuple[str, ...],
+        any_extension: bool = False,
+    ) -> list[T]:
+        """Find all the indexed specs that a given spec would match (that is, the
+        reverse of `matches`)
+
+        Parameters
+        ----------
+        path_spec : pathlike
+            The path specification to match against
+        any_extension : bool, optional
+            If True, specs will be matched on their paths alone, regardless of
+            their extensions. Default is False.
+
+        Returns
+        -------
+        list
+            The values of every indexed spec that would itself be matched by the
+            provided spec, in the order they were added to the index
+        """
+        if isinstance(path_spec, (str, os.PathLike)):
+            path_spec = _part_out_path(path_spec)
+        spec_ext, *spec_parts = path_spec
+        node = self._root
+        for part in spec_parts:
+            if (child := node.children.get(part)) is None:
+                return []
+            node = child
+
+        found: list[tuple[int, T]] = []
+        to_visit = [node]
+        while to_visit:
+            node = to_visit.pop()
+            to_visit.extend(node.children.values())
+            for ext, entries in node.values.items():
+                if any_extension or spec_ext in ("", ext):
+                    found.extend(entries)
+        return [value for _, value in sorted(found, key=lambda entry: entry[0])]
+
+
+class _SpecTrieNode:
+    """A single level of a PathSpecIndex"""
+
+    __slots__ = ("children", "values")
+
+    def __init__(self):
+        self.children: dict[str, _SpecTrieNode] = {}
+        # keyed by extension, with each value tagged by the order it was added
+        self.values: dict[str, list[tuple[int, Any]]] = {}
+
+
+class PathPatternMatcher(Generic[T]):
+    """A matcher for quickly finding which of a set of path patterns (wildcards or
+    regular expressions) matches a given file
+
+    Like regular path specs, patterns are matched against the trailing parts of a
+    file's path. Patterns can either be:
+      - glob-style wildcards, where "*" matches any run of characters within
+        a file or folder name, "?" matches any single character, "[...]" matches
+        any of the enclosed characters and a "**" folder matches any number of
+        folders (including none)
+      - regular expressions, marked by starting the pattern with "re:", which
+        must match the end of the file's path (using "/" as the separator).
+        Named groups will be captured, but numbered backreferences are not
+        supported. Inline flags at the start of an expression (_e.g._ "(?i)")
+        only apply to that expression.
+
+    Wildcard patterns are stored in a trie keyed (like a PathSpecIndex) on their
+    parts in reverse order, with identical parts shared between patterns, so the
+    cost of matching a file depends on the depth of its path and on how many
+    *distinct* wildcards are in play rather than on the number of patterns.
+    Regular expressions can't be broken down like that, so they all get compiled
+    into a single combined expression instead.
+
+    Examples
+    --------
+    >>> matcher = PathPatternMatcher()
+    >>> matcher.add("Best Album Ever/*.mp3", "album")
+    >>> matcher.add(r"re:(?P<num>[0-9]+) (?P<title>[^/]*)[.]flac", "numbered")
+    >>> matcher.match("/home/me/Music/07 Seven.flac")
+    ('numbered', {'num': '07', 'title': 'Seven'})
+    """
+
+    def __init__(self):
+        self._values: list[T] = []
+        self._globs = _GlobTrieNode()
+        self._regexes: list[str] = []
+        self._combined_regex: re.Pattern | None = None
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def add(self, pattern: os.PathLike | str, value: T) -> None:
+        """Add a pattern to the matcher
+
+        Parameters
+        ----------
+        pattern : pathlike
+            The wildcard pattern or (prefixed) regular expression to match
+        value : any
+            The value to return when a file matching the pattern is looked up
+
+        Raises
+        ------
+        ValueError
+            If the pattern is not valid
+        """
+        pattern = os.fspath(pattern)
+        order = len(self._values)
+        try:
+            if pattern.startswith(REGEX_SPEC_PREFIX):
+                self._add_regex(pattern[len(REGEX_SPEC_PREFIX) :], order)
+            else:
+                self._add_glob(pattern, order)
+        except re.error as compile_fail:
+            raise ValueError(
+                f"'{pattern}' is not a valid pattern:\n  {compile_fail}"
+            ) from compile_fail
+        self._values.append(value)
+
+    def _add_regex(self, regex: str, order: int) -> None:
+        if _NUMBERED_BACKREFERENCE.search(regex):
+            raise ValueError(
+                f"'{regex}' uses numbered backreferences, which are not supported"
+            )
+        # user-specified group names get namespaced so they can't collide with
+        # the groups from other patterns
+        regex = _GROUP_NAME.sub(
+            lambda match: f"{match[1]}(?P{match[2]}_{order}_{match[3]}{match[4]}", regex
+        )
+        # global inline flags are only allowed at the very start of the combined
+        # expression, so any leading ones need to apply to just this pattern
+        wrapped = f"(?P<_{order}>(?:.*/)?(?:{scope_inline_flags(regex)}))"
+        re.compile(wrapped)
+        self._regexes.append(wrapped)
+        self._combined_regex = None
+
+    def _add_glob(self, pattern: str, order: int) -> None:
+        parts = Path(pattern).as_posix().split("/")
+        compiled_parts = [(part, _compile_glob_part(part)) for part in parts]
+        node = self._globs
+        for i, (part, compiled) in enumerate(reversed(compiled_parts)):
+            if part == "**" and i > 0:
+                if node.any_folders is None:
+                    node.any_folders = _GlobTrieNode(matches_any_folders=True)
+                node = node.any_folders
+            elif compiled is None:
+                node = node.literals.setdefault(part, _GlobTrieNode())
+            else:
+                if part not in node.wildcards:
+                    node.wildcards[part] = (compiled, _GlobTrieNode())
+                node = node.wildcards[part][1]
+        node.orders.append(order)
+
+    def match(self, file_path: os.PathLike | str) -> tuple[T, dict[str, str]] | None:
+        """Find the pattern matching a given file path
+
+        Parameters
+        ----------
+        file_path : pathlike
+            The path to evaluate
+
+        Returns
+        -------
+        any
+            The value of the first pattern (in the order they were added) that
+            matches the file path
+        dict of str to str
+            Any named groups captured by that pattern
+        None
+            If no pattern matched the file path
+        """
+        path = Path(os.path.abspath(file_path))
+
+        found: tuple[int, dict[str, str]] | None = None
+        if (order := self._match_globs(reversed(path.parts))) is not None:
+            found = (order, {})
+
+        if self._regexes and self._combined_regex is None:
+            self._combined_regex = re.compile("|".join(self._regexes))
+        if self._combined_regex is not None and (
+            match := self._combined_regex.fullmatch(path.as_posix())
+        ):
+            order = int(cast(str, match.lastgroup)[1:])
+            if found is None or order < found[0]:
+                prefix = f"_{order}_"
+                found = (
+                    order,
+                    {
+                        name[len(prefix) :]: captured
+                        for name, captured in match.groupdict().items()
+                        if name.startswith(prefix) and captured is not None
+                    },
+                )
+
+        if found is None:
+            return None
+        return self._values[found[0]], found[1]
+
+    def _match_globs(self, parts: Iterable[str]) -> int | None:
+        """Walk the glob trie, tracking every node that the parts seen so far could
+        have led to, and return the order of the earliest-added pattern matched"""
+        first: int | None = None
+        states = _GlobTrieNode.expand((self._globs,))
+        for part in parts:
+            next_states: list[_GlobTrieNode] = []
+            for node in states:
+                if (literal := node.literals.get(part)) is not None:
+                    next_states.append(literal)
+                for compiled, child in node.wildcards.values():
+                    if compiled.fullmatch(part):
+                        next_states.append(child)
+                if node.matches_any_folders:
+                    next_states.append(node)
+            states = _GlobTrieNode.expand(next_states)
+            for node in states:
+                if node.orders and (first is None or node.orders[0] < first):
+                    first = node.orders[0]
+            if not states:
+                break
+        return first
+
+
+class _GlobTrieNode:
+    """A single level of the wildcard patterns of a PathPatternMatcher"""
+
+    __slots__ = (
+        "literals",
+        "wildcards",
+        "any_folders",
+        "matches_any_folders",
+        "orders",
+    )
+
+    def __init__(self, matches_any_folders: bool = False):
+        self.literals: dict[str, _GlobTrieNode] = {}
+        # keyed by the wildcard pattern for the part
+        self.wildcards: dict[str, tuple[re.Pattern, _GlobTrieNode]] = {}
+        self.any_folders: _GlobTrieNode | None = None
+        self.matches_any_folders = matches_any_folders  # if this is a "**" folder
+        # the order in which each pattern ending at this node was added
+        self.orders: list[int] = []
+
+    @staticmethod
+    def expand(nodes: Iterable["_GlobTrieNode"]) -> list["_GlobTrieNode"]:
+        """Add in any "**" folders (since those can also match zero folders),
+        dropping any duplicates"""
+        expanded: dict[int, _GlobTrieNode] = {}
+        for node in nodes:
+            current: _GlobTrieNode | None = node
+            while current is not None and id(current) not in expanded:
+                expanded[id(current)] = current
+                current = current.any_folders
+        return list(expanded.values())
+
+
+# a backslash followed by a digit, where the backslash isn't itself escaped
+_NUMBERED_BACKREFERENCE = re.compile(r"(?<!\\)(?:\\\\)*\\[1-9]")
+
+# the start of a named group or of a named backreference, captured as: any
+# escaped backslashes before it, "<" or "=", and the group name (plus its
+# closing ">" or ")")
+_GROUP_NAME = re.compile(r"(?<!\\)((?:\\\\)*)\(\?P([<=])(\w+)([>)])")
+
+# global inline flags (such as "(?i)") at the start of a regular expression,
+# captured as the flag letters
+_LEADING_INLINE_FLAGS = re.compile(r"\(\?([aiLmsux]+)\)")
+
+
+def scope_inline_flags(regex: str) -> str:
+    """Turn any global inline flags at the start of a regular expression into a
+    scoped group, so that the expression can be embedded inside another one
+
+    Parameters
+    ----------
+    regex : str
+        The regular expression
+
+    Returns
+    -------
+    str
+        The equivalent regular expression, _e.g._ "(?i:abc)" for "(?i)abc"
+
+    Examples
+    --------
+    >>> scope_inline_flags("(?i)hello")
+    '(?i:hello)'
+    >>> scope_inline_flags("hello")
+    'hello'
+    """
+    flags = ""
+    while leading_flags := _LEADING_INLINE_FLAGS.match(regex):
+        flags += leading_flags[1]
+        regex = regex[leading_flags.end() :]
+    if not flags:
+        return regex
+    # in verbose mode, a trailing comment would swallow the closing paren
+    end = "\n" if "x" in flags else ""
+    return f"(?{flags}:{regex}{end})"
+
+
+def _compile_glob_part(part: str) -> re.Pattern | None:
+    """Translate a single file or folder name from a glob-style pattern into a
+    regular expression
+
+    Parameters
+    ----------
+    part : str
+        The file or folder name (which may contain wildcards)
+
+    Returns
+    -------
+    Pattern or None
+        The compiled regular expression, or None if the part doesn't contain any
+        wildcards (and so can be matched literally)
+    """
+    tokens: list[str] = []
+    has_wildcards = False
+    i = 0
+    while i < len(part):
+        char = part[i]
+        if char == "*":
+            tokens.append(".*")
+        elif char == "?":
+            tokens.append(".")
+        elif char == "[" and (close := part.find("]", i + 2)) != -1:
+            contents = part[i + 1 : close]
+            negate = contents[0] in "!^"
+            if negate:
+                contents = contents[1:]
+            contents = contents.replace("\\", "\\\\").replace("[", "\\[")
+            tokens.append(f"[^{contents}]" if negate else f"[{contents}]")
+            i = close
+        else:
+            tokens.append(re.escape(char))
+            i += 1
+            continue
+        has_wildcards = True
+        i += 1
+    if not has_wildcards:
+        return None
+    return re.compile("".join(tokens), re.DOTALL)
+
+
+def validate_track_numbers(
+    *nums: int | None, check_contiguous: bool = False, open_from: int | None = None
+) -> None:
     """Validate a given list of track numbers
 
     Parameters
@@ -152,6 +645,11 @@ def validate_track_numbers(*nums: int | None, check_contiguous: bool = False) ->
         By default, this method only checks for conflicts. If this method is called with
         check_contiguous=True, then it will also check if the specified set of track
         numbers will result in gaps.
+    open_from : int, optional
+        When checking for gaps, any missing numbers at or above this one are
+        taken to be fillable (_e.g._ by a multi-track spec starting there, which
+        can match any number of tracks). By default, every missing number needs
+        a wild card to fill it.
 
     Raises
     ------
@@ -181,12 +679,22 @@ def validate_track_numbers(*nums: int | None, check_contiguous: bool = False) ->
     if not check_contiguous:
         return
 
-    missing: tuple[int, ...] = tuple(
-        num
-        for num in range(BUILT_IN_DISC_COUNT + 1, max(counter.keys() or (0,)))
-        if num not in counter.keys()
-    )
-    if len(missing) > wildcard_count:
+    # work with the gaps between the specified numbers rather than with each
+    # missing number, so that one very high track number doesn't mean checking
+    # (and reporting) every number below it
+    missing: list[tuple[int, int]] = []
+    previous = BUILT_IN_DISC_COUNT
+    for num in sorted(counter.keys()):
+        if num > previous + 1:
+            missing.append((previous + 1, num - 1))
+        previous = max(previous, num)
+    if open_from is not None:
+        missing = [
+            (first, min(last, open_from - 1))
+            for first, last in missing
+            if first < open_from
+        ]
+    if sum(last - first + 1 for first, last in missing) > wildcard_count:
         if wildcard_count == 0:
             wildcard_line = ""
         elif wildcard_count == 1:
@@ -202,12 +710,37 @@ def validate_track_numbers(*nums: int | None, check_contiguous: bool = False) ->
         message = (
             "There are more missing track numbers"
             " than tracks that can fill those track numbers."
-            f"\nNo tracks are specified with numbers {missing}"
+            f"\nNo tracks are specified with numbers {_summarize_ranges(missing)}"
         )
         message += wildcard_line + "."
         raise RuntimeError(message)
 
 
+def _summarize_ranges(ranges: list[tuple[int, int]]) -> str:
+    """Format a list of (inclusive) ranges of numbers like a tuple, but with runs
+    of three or more consecutive numbers abbreviated, _e.g._ "(5, 9-12, 14, 15)"
+
+    Parameters
+    ----------
+    ranges : list of (int, int)
+        The first and last number of each range, in order
+
+    Returns
+    -------
+    str
+        The summary of the numbers in the ranges
+    """
+    entries: list[str] = []
+    for first, last in ranges:
+        if last - first >= 2:
+            entries.append(f"{first}-{last}")
+        else:
+            entries.extend(str(num) for num in range(first, last + 1))
+    if len(entries) == 1 and "-" not in entries[0]:
+        return f"({entries[0]},)"
+    return f"({', '.join(entries)})"
+
+
 def validate_track_file_specs(*path_specs: os.PathLike | str, strict=False) -> None:
     """Validate a given list of file name specs
 
@@ -237,32 +770,35 @@ def validate_track_file_specs(*path_specs: os.PathLike | str, strict=False) -> N
         _part_out_path(spec) for spec in counter.keys()
     )
 
+    # rather than checking every pair of specs, index them by path so that each
+    # spec only gets compared against the specs that share its trailing parts
+    index: PathSpecIndex[tuple[str, ...]] = PathSpecIndex()
+    for spec in parted_specs:
+        index.add(spec, spec)
+
     for spec in parted_specs:
-        for reference_spec in parted_specs:
+        # if spec has no extension, then it may match files matching specs that do
+        check_possible = strict and spec[0] == ""
+        for reference_spec in index.matches(spec, any_extension=check_possible):
             if spec == reference_spec:
                 continue
+            spec_path = _reassemble_path(*spec)
+            reference_path = _reassemble_path(*reference_spec)
             if spec_matches_path(reference_spec, spec):
-                spec_path = _reassemble_path(*spec)
-                reference_path = _reassemble_path(*reference_spec)
                 conflicts_report += (
                     f"\n - Files matching '{spec_path}'"
                     " would also match any files matching"
                     f" '{reference_path}'"
                 )
-            elif strict:
-                if spec[0] == "":  # if spec has no extension
-                    reference_ext, *reference_parts = reference_spec
-                    if spec_matches_path(("", *reference_parts), spec):
-                        spec_path = _reassemble_path(*spec)
-                        reference_path = _reassemble_path(*reference_spec)
-                        conflicts_report += (
-                            f"\n - Files matching '{spec_path}'"
-                            " may also match files matching"
-                            f" '{reference_path}'"
-                        )
-
-                # regex will go here, and BOY WILL IT BE FUN
-                # TO PROVE THOSE ARE MUTUALLY EXCLUSIVE
+            else:
+                conflicts_report += (
+                    f"\n - Files matching '{spec_path}'"
+                    " may also match files matching"
+                    f" '{reference_path}'"
+                )
+
+            # regex will go here, and BOY WILL IT BE FUN
+            # TO PROVE THOSE ARE MUTUALLY EXCLUSIVE
 
     if conflicts_report:
         raise RuntimeError(
@@ -271,6 +807,38 @@ def validate_track_file_specs(*path_specs: os.PathLike | str, strict=False) -> N
         )
 
 
+def validate_track_file_patterns(*patterns: os.PathLike | str) -> None:
+    """Validate a given list of multi-track file patterns
+
+    Parameters
+    ----------
+    *patterns: pathlike
+        The wildcard patterns or regular expressions (prefixed with "re:") to
+        validate. See `PathPatternMatcher` for the supported syntax.
+
+    Raises
+    ------
+    ValueError
+        If any of the patterns are invalid
+
+    Notes
+    -----
+    - Unlike with regular file specs, there's no check for whether any of the
+      patterns conflict with each other (or with regular file specs). When more
+      than one pattern matches a file, the first pattern wins.
+    """
+    invalid_report: str = ""
+    for pattern in patterns:
+        try:
+            PathPatternMatcher[None]().add(pattern, None)
+        except ValueError as invalid:
+            invalid_report += f"\n - {invalid}"
+    if invalid_report:
+        raise ValueError(
+            "The provided file patterns contain invalid values:" + invalid_report
+        )
+
+
 def _generate_dupes_report(counts: dict[T, int]) -> str:
     dupes_report: str = ""
     try:
@@ -0,0 +1,252 @@
+"""Functionality for monitoring a music library for changes"""
+
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import sys
+import time
+from pathlib import Path
+from typing import Iterable, Iterator, Protocol
+
+from .library import iter_files
+
+LOGGER = logging.getLogger(__name__)
+
+# inotify event masks (from <sys/inotify.h>)
+_IN_MODIFY = 0x00000002
+_IN_ATTRIB = 0x00000004
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_DELETE_SELF = 0x00000400
+_IN_MOVE_SELF = 0x00000800
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ONLYDIR = 0x01000000
+_IN_ISDIR = 0x40000000
+
+_WATCH_MASK = (
+    _IN_MODIFY
+    | _IN_ATTRIB
+    | _IN_CLOSE_WRITE
+    | _IN_MOVED_FROM
+    | _IN_MOVED_TO
+    | _IN_CREATE
+    | _IN_DELETE
+    | _IN_DELETE_SELF
+    | _IN_MOVE_SELF
+    | _IN_ONLYDIR
+)
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+class _Watcher(Protocol):
+    def wait(self, timeout: float | None) -> set[Path]:
+        """Wait for changes, returning the paths that changed (or an empty set if
+        the timeout elapsed without anything changing)"""
+
+    def close(self) -> None:
+        """Stop watching"""
+
+
+def watch_for_changes(
+    paths: Iterable[os.PathLike | str],
+    ignore: Iterable[os.PathLike | str] = (),
+    debounce: float = 2.0,
+    poll_interval: float = 2.0,
+    use_inotify: bool = True,
+) -> Iterator[set[Path]]:
+    """Monitor files and folders for changes, forever
+
+    Parameters
+    ----------
+    paths : list-like of pathlikes
+        The files and folders to watch. Folders will be watched recursively.
+    ignore : list-like of pathlikes, optional
+        Any files whose changes should be ignored (such as the outputs of the build
+        that's being triggered by the changes)
+    debounce : float, optional
+        Once a change has been detected, how long to wait (in seconds) for things
+        to settle down before reporting the changes. Default is 2 seconds.
+    poll_interval : float, optional
+        When changes can't be watched for using inotify, how often to rescan the
+        watched paths, in seconds. Default is 2 seconds.
+    use_inotify : bool, optional
+        Whether to use the Linux inotify API (when available) to watch for changes.
+        If this is set to False (or inotify is not available), changes will be
+        detected by polling. Default is True.
+
+    Returns
+    -------
+    iterator of sets of Paths
+        Every time something changes (and then settles down), the set of paths
+        that changed (which, for removed folders, may be the path of the folder
+        rather than the paths of its contents)
+    """
+    watched = [Path(os.path.abspath(path)) for path in paths]
+    ignored = {Path(os.path.abspath(path)) for path in ignore}
+
+    watcher: _Watcher | None = None
+    if use_inotify and sys.platform.startswith("linux"):
+        try:
+            watcher = _InotifyWatcher(watched)
+        except OSError as inotify_fail:
+            LOGGER.warning(
+                f"Could not watch for changes using inotify:\n  {inotify_fail}"
+                "\nFalling back to polling."
+            )
+    if watcher is None:
+        watcher = _PollingWatcher(watched, poll_interval)
+
+    try:
+        while True:
+            changes = watcher.wait(None) - ignored
+            if not changes:
+                continue
+            while settling := watcher.wait(debounce):
+                changes |= settling - ignored
+            yield changes
+    finally:
+        watcher.close()
+
+
+def _is_relevant(path: Path, watched: Iterable[Path]) -> bool:
+    """Check whether a change to a path affects any of the watched paths"""
+    return any(path == target or target in path.parents for target in watched)
+
+
+class _InotifyWatcher:
+    """Watch for changes using the Linux inotify API (accessed via ctypes)
+
+    Raises
+    ------
+    OSError
+        If inotify is not available or the watched paths can't be watched (_e.g._
+        because there are too many folders)
+    """
+
+    def __init__(self, watched: list[Path]):
+        self._watched = watched
+        library = ctypes.util.find_library("c")
+        self._libc = ctypes.CDLL(library or "libc.so.6", use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        self._folders: dict[int, Path] = {}
+        try:
+            for path in watched:
+                # watch the parent of any individual files
+                self._add_tree(path if path.is_dir() else path.parent)
+        except OSError:
+            self.close()
+            raise
+
+    def _add_tree(self, folder: Path) -> None:
+        self._add_watch(folder)
+        if _is_relevant(folder, self._watched):
+            for root, subfolders, _ in os.walk(folder):
+                for subfolder in subfolders:
+                    self._add_watch(Path(root) / subfolder)
+
+    def _add_watch(self, folder: Path) -> None:
+        descriptor = self._libc.inotify_add_watch(
+            self._fd, os.fsencode(folder), _WATCH_MASK
+        )
+        if descriptor < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno), os.fspath(folder))
+        self._folders[descriptor] = folder
+
+    def wait(self, timeout: float | None) -> set[Path]:
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return set()
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return set()
+
+        changes: set[Path] = set()
+        offset = 0
+        while offset < len(data):
+            descriptor, mask, _, name_length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = os.fsdecode(data[offset : offset + name_length].rstrip(b"\0"))
+            offset += name_length
+
+            if mask & _IN_Q_OVERFLOW:
+                LOGGER.debug("Too many changes to keep track of individually")
+                changes.update(self._watched)
+                continue
+            folder = self._folders.get(descriptor)
+            if folder is None:
+                continue
+            if mask & _IN_IGNORED:
+                del self._folders[descriptor]
+                continue
+            path = folder / name if name else folder
+            if not _is_relevant(path, self._watched):
+                continue
+            if mask & _IN_ISDIR and mask & (_IN_CREATE | _IN_MOVED_TO):
+                try:
+                    self._add_tree(path)
+                except OSError as watch_fail:
+                    LOGGER.warning(f"Could not watch {path}:\n  {watch_fail}")
+            changes.add(path)
+        return changes
+
+    def close(self) -> None:
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+class _PollingWatcher:
+    """Watch for changes by periodically rescanning the watched paths"""
+
+    def __init__(self, watched: list[Path], poll_interval: float):
+        self._watched = watched
+        self._poll_interval = poll_interval
+        self._state = self._scan()
+
+    def _scan(self) -> dict[Path, tuple[int, int]]:
+        state: dict[Path, tuple[int, int]] = {}
+        for path in self._watched:
+            files = iter_files(path) if path.is_dir() else (path,)
+            for file in files:
+                try:
+                    stat = file.stat()
+                except OSError:
+                    continue
+                state[file] = (stat.st_size, stat.st_mtime_ns)
+        return state
+
+    def wait(self, timeout: float | None) -> set[Path]:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return set()
+            time.sleep(
+                self._poll_interval
+                if remaining is None
+                else min(self._poll_interval, remaining)
+            )
+            state = self._scan()
+            changes = {
+                path
+                for path in state.keys() | self._state.keys()
+                if state.get(path) != self._state.get(path)
+            }
+            self._state = state
+            if changes:
+                return changes
+
+    def close(self) -> None:
+        pass
@@ -0,0 +1,173 @@
+"""Tests of the asyncio-native API"""
+
+import asyncio
+import json
+import os
+import stat
+import sys
+import zipfile
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import ffmpeg
+import pytest
+
+from foxnap_rpg import aio
+from foxnap_rpg.cache import ProbeCache
+from foxnap_rpg.pack_generator import License, Track
+
+pytestmark = pytest.mark.skipif(
+    sys.platform == "win32", reason="fake ffmpeg binaries are shell scripts"
+)
+
+
+def _install_fake_binary(tmp_path, monkeypatch, name, script):
+    executable = tmp_path / name
+    executable.write_text("#!/bin/sh\n" + script)
+    executable.chmod(executable.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setattr(aio.bin, name, os.fspath(executable))
+    return executable
+
+
+@pytest.fixture
+def fake_ffprobe(tmp_path, monkeypatch):
+    output = json.dumps(
+        {
+            "streams": [{"index": 0, "codec_type": "audio", "codec_name": "wmav2"}],
+            "format": {"format_name": "asf", "duration": "4.2", "tags": {}},
+        }
+    )
+    yield _install_fake_binary(
+        tmp_path,
+        monkeypatch,
+        "ffprobe",
+        f'echo "$@" >> "{tmp_path / "ffprobe_calls.txt"}"\n' f"echo '{output}'\n",
+    )
+
+
+@pytest.fixture
+def fake_ffmpeg(tmp_path, monkeypatch):
+    """An "ffmpeg" that "converts" a track by writing its input path to the output
+    file, and fails if asked to convert bad.wma"""
+    yield _install_fake_binary(
+        tmp_path,
+        monkeypatch,
+        "ffmpeg",
+        'for arg in "$@"; do\n'
+        '  case "$arg" in\n'
+        '    *bad.wma) echo "Invalid data" >&2; exit 1;;\n'
+        '    *.wma) input="$arg";;\n'
+        '    *.ogg) echo "$input" > "$arg";;\n'
+        "  esac\n"
+        "done\n",
+    )
+
+
+@pytest.fixture
+def tracks(tmp_path):
+    tracks = []
+    for i, name in enumerate(("mercury", "venus", "earth"), start=1):
+        (tmp_path / f"{name}.wma").write_bytes(b"\x30\x26\xb2\x75 not really a wma")
+        tracks.append(
+            Track(
+                i,
+                5,
+                tmp_path / f"{name}.wma",
+                description=name.title(),
+                use_album_art=False,
+                license=License.UNRESTRICTED,
+            )
+        )
+    yield tracks
+
+
+class TestProbeTrack:
+    def test_probing_with_ffprobe(self, fake_ffprobe, tmp_path):
+        (tmp_path / "song.wma").write_bytes(b"\x30\x26\xb2\x75 not really a wma")
+        media_info = asyncio.run(aio.probe_track(tmp_path / "song.wma"))
+        assert (media_info.has_audio, media_info.duration) == (True, 4.2)
+
+    def test_probe_results_are_cached(self, fake_ffprobe, tmp_path):
+        (tmp_path / "song.wma").write_bytes(b"\x30\x26\xb2\x75 not really a wma")
+
+        async def probe_twice():
+            with ProbeCache(tmp_path / "cache.sqlite3", version="fake") as cache:
+                return [
+                    await aio.probe_track(tmp_path / "song.wma", cache=cache)
+                    for _ in range(2)
+                ]
+
+        first, second = asyncio.run(probe_twice())
+        assert first == second
+        assert len((tmp_path / "ffprobe_calls.txt").read_text().splitlines()) == 1
+
+    def test_failed_probe_raises(self, tmp_path, monkeypatch):
+        _install_fake_binary(tmp_path, monkeypatch, "ffprobe", "exit 1\n")
+        (tmp_path / "song.wma").write_bytes(b"nope")
+        with pytest.raises(ffmpeg.Error):
+            asyncio.run(aio.probe_track(tmp_path / "song.wma"))
+
+
+class TestGenerateResourcePack:
+    def test_tracks_are_converted(self, fake_ffmpeg, tracks, tmp_path):
+        durations = asyncio.run(
+            aio.generate_resource_pack(tmp_path / "pack.zip", *tracks, jobs=2)
+        )
+
+        assert durations == {1: 5, 2: 5, 3: 5}
+        with zipfile.ZipFile(tmp_path / "pack.zip") as pack:
+            converted = {
+                track.num: pack.read(f"assets/foxnap/sounds/track_{track.num}.ogg")
+                for track in tracks
+            }
+            lang = json.loads(pack.read("assets/foxnap/lang/en_us.json"))
+        assert converted == {
+            track.num: f"{os.fspath(track.path)}\n".encode() for track in tracks
+        }
+        assert lang["item.foxnap.track_2.desc"] == "Venus"
+
+    def test_deferred_durations_are_awaited(self, fake_ffmpeg, tracks, tmp_path):
+        with ThreadPoolExecutor(1) as executor:
+            tracks[0] = tracks[0]._replace(duration=executor.submit(lambda: 12))
+            durations = asyncio.run(
+                aio.generate_resource_pack(tmp_path / "pack.zip", *tracks)
+            )
+        assert durations == {1: 12, 2: 5, 3: 5}
+
+    def test_tracks_with_failed_durations_are_left_out(
+        self, fake_ffmpeg, tracks, tmp_path
+    ):
+        failed: Future[int] = Future()
+        failed.set_exception(ValueError("Could not extract duration"))
+        tracks[1] = tracks[1]._replace(duration=failed)
+
+        durations = asyncio.run(
+            aio.generate_resource_pack(tmp_path / "pack.zip", *tracks)
+        )
+
+        assert durations == {1: 5, 3: 5}
+        with zipfile.ZipFile(tmp_path / "pack.zip") as pack:
+            assert not any("track_2" in name for name in pack.namelist())
+
+    def test_failed_conversion_raises(self, fake_ffmpeg, tracks, tmp_path):
+        (tmp_path / "bad.wma").write_bytes(b"nope")
+        tracks.append(tracks[0]._replace(num=4, path=tmp_path / "bad.wma"))
+        with pytest.raises(ffmpeg.Error):
+            asyncio.run(aio.generate_resource_pack(tmp_path / "pack.zip", *tracks))
+        assert not (tmp_path / "pack.zip").exists()
+
+    def test_builds_can_share_an_event_loop(self, fake_ffmpeg, tracks, tmp_path):
+        async def build_both():
+            return await asyncio.gather(
+                aio.generate_resource_pack(tmp_path / "one.zip", *tracks[:2]),
+                aio.generate_resource_pack(tmp_path / "two.zip", *tracks[2:]),
+            )
+
+        assert asyncio.run(build_both()) == [{1: 5, 2: 5}, {3: 5}]
+        assert (tmp_path / "one.zip").exists() and (tmp_path / "two.zip").exists()
+
+    @pytest.mark.parametrize("jobs", (0, -1, 1.5))
+    def test_invalid_jobs_raises(self, tracks, tmp_path, jobs):
+        with pytest.raises(ValueError):
+            asyncio.run(
+                aio.generate_resource_pack(tmp_path / "pack.zip", *tracks, jobs=jobs)
+            )
@@ -1,12 +1,17 @@
 """Tests of the track builder"""
 
 import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import pytest
 
 from foxnap_rpg import utils
 from foxnap_rpg.builder import Spec, TrackBuilder
+from foxnap_rpg.media import MediaInfo, Stream
 from foxnap_rpg.pack_generator import Track
 
 
@@ -112,9 +117,31 @@ class TestValidateSpecs:
                 Spec(Path("hello.mp3")), Spec(Path("i say") / "hello")
             )
 
-    def test_non_distinct_specs_are_not_currently_implemented(self):
-        with pytest.raises(NotImplementedError):
-            TrackBuilder().validate_specs(Spec(Path("hello"), distinct=False))
+    def test_non_distinct_specs_are_validated_as_patterns(self):
+        TrackBuilder().validate_specs(Spec(Path("*.mp3"), distinct=False))
+        with pytest.raises(ValueError, match="not a valid pattern"):
+            TrackBuilder().validate_specs(Spec("re:(unclosed", distinct=False))
+
+    def test_non_distinct_specs_do_not_conflict_with_distinct_specs(self):
+        TrackBuilder().validate_specs(
+            Spec(Path("hello.mp3")), Spec(Path("hello.*"), distinct=False)
+        )
+
+    @pytest.mark.parametrize("num", (-3, 0, 2.5))
+    def test_invalid_non_distinct_spec_nums_raise_value_error(self, num):
+        with pytest.raises(ValueError, match="invalid"):
+            TrackBuilder().validate_specs(Spec(Path("*.mp3"), distinct=False, num=num))
+
+    def test_non_distinct_specs_can_share_a_num(self):
+        TrackBuilder().validate_specs(
+            Spec(Path("*.mp3"), distinct=False, num=12),
+            Spec(Path("*.ogg"), distinct=False, num=12),
+        )
+
+    def test_non_distinct_spec_nums_are_not_reserved(self):
+        TrackBuilder().validate_specs(
+            Spec(Path("hello.mp3"), num=12), Spec(Path("*.mp3"), distinct=False, num=12)
+        )
 
 
 class TestInstantiationSpecValidation:
@@ -141,6 +168,86 @@ class TestAddSpec:
         with pytest.raises(RuntimeError, match="Files matching"):
             track_builder.add_spec(Spec(Path("hello")))
 
+    def test_new_specs_are_checked_for_conflicts_with_more_specific_specs(
+        self, track_builder
+    ):
+        track_builder.add_spec(Spec(Path("Music/Album/world.mp3")))
+        with pytest.raises(RuntimeError, match="would also match"):
+            track_builder.add_spec(Spec(Path("Album/world")))
+
+    def test_new_specs_are_checked_for_literal_dupes(self, track_builder):
+        with pytest.raises(RuntimeError, match="'hello.mp3' is included 2 times"):
+            track_builder.add_spec(Spec(Path("hello.mp3")))
+
+    @pytest.mark.parametrize("new_spec", ("Music/hello", "hello.m4a"))
+    def test_new_specs_are_checked_for_possible_conflicts_when_strict(self, new_spec):
+        track_builder = TrackBuilder(strict_file_checking=True)
+        track_builder.add_spec(
+            Spec(Path("hello.m4a" if new_spec == "Music/hello" else "Music/hello"))
+        )
+        with pytest.raises(RuntimeError, match="may also match"):
+            track_builder.add_spec(Spec(Path(new_spec)))
+
+    @pytest.mark.parametrize("num", (-3, 2.5))
+    def test_new_non_distinct_specs_are_checked_for_invalid_nums(
+        self, track_builder, num
+    ):
+        with pytest.raises(ValueError, match="invalid"):
+            track_builder.add_spec(Spec(Path("*.mp3"), distinct=False, num=num))
+
+    def test_specs_added_mid_build_apply_to_later_tracks(self, track_builder):
+        with track_builder:
+            first = track_builder["Music/world.mp3"]
+            track_builder.add_spec(Spec(Path("Music/hello again.mp3"), num=2))
+            track_builder.add_spec(Spec(Path("Music/*.flac"), False, num=3))
+            second = track_builder["Music/hello again.mp3"]
+            third = track_builder["Music/song.flac"]
+            track_builder["Music/hello.mp3"]
+
+        assert (first.num, second.num, third.num) == (1, 2, 3)
+
+    def test_specs_added_mid_build_must_be_used(self, track_builder):
+        with pytest.raises(RuntimeError, match="could not be matched"):
+            with track_builder:
+                track_builder["hello.mp3"]
+                track_builder.add_spec(Spec(Path("world.mp3"), required=True))
+
+    def test_specs_added_mid_build_cannot_take_assigned_numbers(self, track_builder):
+        with track_builder:
+            track_builder["hello.mp3"]
+            track_builder["world.mp3"]
+            with pytest.raises(RuntimeError, match="already been assigned"):
+                track_builder.add_spec(Spec(Path("again.mp3"), num=1))
+
+    def test_new_specs_are_only_validated_against_related_specs(
+        self, track_builder, monkeypatch
+    ):
+        for i in range(100):
+            track_builder.add_spec(Spec(Path(f"track {i}.mp3")))
+
+        validated: list[tuple] = []
+        validate = utils.validate_track_file_specs
+
+        def spy(*path_specs, **kwargs):
+            validated.append(path_specs)
+            return validate(*path_specs, **kwargs)
+
+        monkeypatch.setattr(utils, "validate_track_file_specs", spy)
+        with pytest.raises(RuntimeError):
+            track_builder.add_spec(Spec(Path("Album/track 42.mp3")))
+        track_builder.add_spec(Spec(Path("Album/track 42.ogg")))
+
+        assert validated == [
+            (Path("Album/track 42.mp3"), Path("track 42.mp3")),
+            (Path("Album/track 42.ogg"),),
+        ]
+
+    def test_added_specs_are_used_when_building(self, track_builder):
+        track_builder.add_spec(Spec(Path("i love you.mp3"), num=2))
+        with track_builder:
+            track = track_builder[Path.home() / "Music" / "i love you.mp3"]
+        assert track.num == 2
+
     def test_new_specs_are_checked_for_duplicate_nums(self, track_builder):
         with pytest.raises(RuntimeError, match="duplicates"):
             track_builder.add_spec(Spec(Path("i love you.mp3"), num=4))
@@ -160,6 +267,392 @@ class TestAddSpec:
         ]
 
 
+class TestMultiTrackSpecs:
+    def test_every_matching_file_gets_the_spec_settings(self):
+        with TrackBuilder(
+            Spec(Path("Album/*.mp3"), distinct=False, hue=42, required=True)
+        ) as track_builder:
+            tracks = [
+                track_builder[Path.home() / "Album" / f"{i:02d}.mp3"]
+                for i in range(1, 4)
+            ]
+            other = track_builder[Path.home() / "Album" / "bonus.flac"]
+
+        assert ([track.num for track in tracks], [track.hue for track in tracks]) == (
+            [1, 2, 3],
+            [42, 42, 42],
+        )
+        assert other.hue is True
+
+    def test_distinct_specs_take_priority(self):
+        with TrackBuilder(
+            Spec(Path("*.mp3"), distinct=False, hue=42),
+            Spec(Path("hello.mp3"), hue=7),
+        ) as track_builder:
+            track = track_builder[Path.home() / "hello.mp3"]
+
+        assert track.hue == 7
+
+    def test_first_matching_pattern_wins(self):
+        with TrackBuilder(
+            Spec("re:.*/Album/[^/]*", distinct=False, hue=1),
+            Spec(Path("Artist/Album/*.mp3"), distinct=False, hue=2),
+            Spec(Path("**/*.mp3"), distinct=False, hue=3),
+        ) as track_builder:
+            tracks = [
+                track_builder[Path.home() / "Artist" / "Album" / "song.flac"],
+                track_builder[Path.home() / "Artist" / "Album" / "song.mp3"],
+                track_builder[Path.home() / "Artist" / "Single" / "song.mp3"],
+            ]
+
+        assert [track.hue for track in tracks] == [1, 1, 3]
+
+    def test_descriptions_are_templated(self):
+        with TrackBuilder(
+            Spec(
+                r"re:(?P<artist>[^/]+)/(?P<num>[0-9]+) [^/]+\.mp3",
+                distinct=False,
+                description="{artist} #{num}: {stem} (from {parent})",
+            )
+        ) as track_builder:
+            track = track_builder[Path.home() / "Artist" / "07 Seven.mp3"]
+
+        assert track.description == "Artist #07: 07 Seven (from Artist)"
+
+    def test_invalid_description_templates_raise(self):
+        with TrackBuilder(
+            Spec(Path("*.mp3"), distinct=False, description="{title}")
+        ) as track_builder:
+            with pytest.raises(ValueError, match="description"):
+                _ = track_builder[Path.home() / "song.mp3"]
+
+    def test_numbering_starts_at_num_and_skips_reserved_numbers(
+        self, lock_built_in_track_count
+    ):
+        with TrackBuilder(
+            Spec(Path("first/*"), num=3),
+            Spec(Path("*.mp3"), distinct=False, num=2),
+            Spec(Path("*.ogg"), distinct=False),
+            enforce_contiguous_track_numbers="ignore",
+        ) as track_builder:
+            nums = [
+                track_builder[Path.home() / name].num
+                for name in ("a.mp3", "b.mp3", "c.ogg", "d.mp3", "e.ogg")
+            ]
+
+        assert nums == [2, 4, 1, 5, 6]
+
+    def test_multi_track_specs_can_fill_any_gap_above_their_num(
+        self, lock_built_in_track_count
+    ):
+        with TrackBuilder(
+            Spec(Path("Album/*.mp3"), distinct=False, num=5),
+            Spec(Path("finale.mp3"), num=20, required=False),
+        ):
+            pass
+
+        with pytest.raises(RuntimeError, match=r"numbers \(5-7\)"):
+            with TrackBuilder(
+                Spec(Path("Album/*.mp3"), distinct=False, num=8),
+                Spec(Path("finale.mp3"), num=20, required=False),
+            ):
+                pass
+
+    def test_gaps_left_by_multi_track_specs_are_checked_on_exit(self):
+        with pytest.raises(RuntimeError, match="missing"):
+            with TrackBuilder(
+                Spec(Path("Album/*.mp3"), distinct=False, num=8),
+                Spec(Path("finale.mp3"), num=20),
+            ) as track_builder:
+                track_builder[Path.home() / "Album" / "01.mp3"]
+                track_builder[Path.home() / "finale.mp3"]
+
+    def test_required_multi_track_specs_must_match_something(self):
+        with pytest.raises(RuntimeError, match="could not be matched"):
+            with TrackBuilder(Spec(Path("*.mp3"), distinct=False, required=True)):
+                pass
+
+    def test_multi_track_specs_can_be_added(self):
+        track_builder = TrackBuilder()
+        track_builder.add_spec(Spec(Path("*.mp3"), distinct=False, hue=42))
+        with track_builder:
+            track = track_builder[Path.home() / "song.mp3"]
+        assert track.hue == 42
+
+
+class TestConcurrentBuilds:
+    @pytest.fixture
+    def slow_duration_extraction(self, monkeypatch):
+        """Make tracks whose names sort earlier take longer to "probe" """
+
+        def extract_duration(track) -> int:
+            time.sleep(0.01 * (10 - int(Path(track).stem[-1])))
+            return 42
+
+        monkeypatch.setattr(utils, "extract_track_duration", extract_duration)
+
+    @pytest.mark.usefixtures("slow_duration_extraction")
+    def test_reserved_numbers_do_not_depend_on_completion_order(self):
+        files = [Path.home() / "Music" / f"track_{i}.mp3" for i in range(10)]
+        with TrackBuilder(Spec(Path("track_4.mp3"), num=1)) as track_builder:
+            for file in files:
+                track_builder.reserve(file)
+            with ThreadPoolExecutor(10) as executor:
+                tracks = list(executor.map(track_builder.__getitem__, files))
+
+        assert [track.num for track in tracks] == [2, 3, 4, 5, 1, 6, 7, 8, 9, 10]
+        assert track_builder.n_discs == 10
+
+    def test_concurrent_builds_hand_out_distinct_numbers(self):
+        files = [Path.home() / "Music" / f"track_{i:03d}.mp3" for i in range(200)]
+        with TrackBuilder(
+            Spec(Path("*.mp3"), distinct=False, num=50),
+            enforce_contiguous_track_numbers="ignore",
+        ) as track_builder:
+            with ThreadPoolExecutor(8) as executor:
+                tracks = list(executor.map(track_builder.__getitem__, files))
+
+        assert sorted(track.num for track in tracks) == list(range(50, 250))
+
+    def test_reserving_twice_returns_the_same_number(self):
+        with TrackBuilder() as track_builder:
+            first = track_builder.reserve(Path.home() / "hello.mp3")
+            second = track_builder.reserve(Path.home() / "hello.mp3")
+            track = track_builder[Path.home() / "hello.mp3"]
+
+        assert first == second == track.num == 1
+
+    def test_reserving_outside_of_a_context_raises(self):
+        with pytest.raises(ValueError, match="context manager"):
+            TrackBuilder().reserve(Path.home() / "hello.mp3")
+
+    def test_failed_builds_free_up_their_numbers(self, monkeypatch):
+        def extract_duration(track) -> int:
+            if Path(track).stem == "broken":
+                raise ValueError("Could not extract duration")
+            return 42
+
+        monkeypatch.setattr(utils, "extract_track_duration", extract_duration)
+
+        with TrackBuilder(Spec(Path("broken.mp3"), required=False)) as track_builder:
+            track_builder.reserve(Path.home() / "first.mp3")
+            with pytest.raises(ValueError):
+                _ = track_builder[Path.home() / "broken.mp3"]
+            with pytest.raises(ValueError):
+                _ = track_builder[Path.home() / "broken.mp3"]  # spec is freed up too
+            track = track_builder[Path.home() / "second.mp3"]
+            _ = track_builder[Path.home() / "first.mp3"]
+
+        assert (track.num, track_builder.n_discs) == (2, 2)
+
+    def test_reservations_that_are_never_built_are_released(self):
+        with TrackBuilder() as track_builder:
+            _ = track_builder[Path.home() / "first.mp3"]
+            track_builder.reserve(Path.home() / "second.mp3")
+
+        assert track_builder.n_discs == 1
+
+
+class TestDeferredDurations:
+    @pytest.fixture
+    def track_builder_with_jobs(self):
+        yield TrackBuilder(jobs=4)
+
+    def test_durations_are_extracted_in_the_background(self, monkeypatch):
+        probing = threading.Event()
+
+        def extract_duration(track) -> int:
+            probing.wait(5)
+            return 42
+
+        monkeypatch.setattr(utils, "extract_track_duration", extract_duration)
+
+        with TrackBuilder(jobs=2) as track_builder:
+            tracks = [track_builder[Path.home() / f"track_{i}.mp3"] for i in range(3)]
+            assert not any(track.duration.done() for track in tracks)
+            probing.set()
+
+        assert [(track.num, track.resolve_duration()) for track in tracks] == [
+            (1, 42),
+            (2, 42),
+            (3, 42),
+        ]
+
+    def test_failed_extractions_are_released(self, monkeypatch):
+        def extract_duration(track) -> int:
+            if Path(track).stem == "track_2":
+                raise ValueError("Could not extract duration")
+            return 42
+
+        monkeypatch.setattr(utils, "extract_track_duration", extract_duration)
+
+        with TrackBuilder(
+            jobs=2, enforce_contiguous_track_numbers="ignore"
+        ) as track_builder:
+            tracks = [track_builder[Path.home() / f"track_{i}.mp3"] for i in range(4)]
+
+        assert [track.num for track in tracks] == [1, 2, 3, 4]
+        with pytest.raises(ValueError):
+            tracks[2].resolve_duration()
+        assert track_builder.n_discs == 4
+
+    def test_failed_extractions_are_reported_on_exit(self, monkeypatch, caplog):
+        def extract_duration(track) -> int:
+            if Path(track).stem == "track_1":
+                raise ValueError("Could not extract duration")
+            return 42
+
+        monkeypatch.setattr(utils, "extract_track_duration", extract_duration)
+
+        with TrackBuilder(
+            jobs=2, enforce_contiguous_track_numbers="ignore"
+        ) as track_builder:
+            for i in range(3):
+                track_builder[Path.home() / f"track_{i}.mp3"]
+
+        assert [(path, type(error)) for path, error in track_builder.failed] == [
+            (Path.home() / "track_1.mp3", ValueError)
+        ]
+        assert "track_1.mp3: Could not extract duration" in caplog.text
+
+    def test_failed_extractions_leave_a_gap(self, monkeypatch):
+        def extract_duration(track) -> int:
+            if Path(track).stem == "track_1":
+                raise ValueError("Could not extract duration")
+            return 42
+
+        monkeypatch.setattr(utils, "extract_track_duration", extract_duration)
+
+        with pytest.raises(RuntimeError, match="missing track numbers"):
+            with TrackBuilder(jobs=2, start_at=20) as track_builder:
+                for i in range(3):
+                    track_builder[Path.home() / f"track_{i}.mp3"]
+
+    def test_probed_tracks_are_not_deferred(self, track_builder_with_jobs):
+        media_info = MediaInfo(
+            os.fspath(Path.home() / "song.mp3"),
+            "mp3",
+            (Stream(0, "audio", "mp3"),),
+            12.5,
+            {},
+        )
+        with track_builder_with_jobs:
+            track = track_builder_with_jobs[media_info]
+        assert track.duration == 42
+
+    @pytest.mark.parametrize("jobs", (0, -1, 1.5))
+    def test_invalid_jobs_raise(self, jobs):
+        with pytest.raises(ValueError):
+            TrackBuilder(jobs=jobs)
+
+
+class TestBuildMany:
+    @pytest.fixture
+    def track_builder(self, monkeypatch):
+        def extract_duration(track) -> int:
+            if Path(track).stem == "broken":
+                raise ValueError("Could not extract duration")
+            return 42
+
+        monkeypatch.setattr(utils, "extract_track_duration", extract_duration)
+
+        yield TrackBuilder(
+            Spec(Path("hello.mp3"), num=2),
+            Spec(Path("Album/*.mp3"), distinct=False, hue=7),
+            Spec(Path("world.mp3"), required=False),
+            Spec(Path("broken.mp3")),
+            enforce_contiguous_track_numbers="ignore",
+        )
+
+    @pytest.fixture
+    def files(self):
+        yield [
+            Path.home() / "Music" / "Album" / "01.mp3",
+            Path.home() / "Music" / "hello.mp3",
+            Path.home() / "Music" / "broken.mp3",
+            Path.home() / "Music" / "unexpected.mp3",
+            Path.home() / "Music" / "Album" / "02.mp3",
+        ]
+
+    @pytest.mark.parametrize("jobs", (1, 4))
+    def test_tracks_are_built_in_order(self, track_builder, files, jobs):
+        with track_builder:
+            report = track_builder.build_many(files, jobs=jobs)
+
+        assert [(track.path, track.num) for track in report.tracks] == [
+            (files[0], 1),
+            (files[1], 2),
+            (files[3], 3),
+            (files[4], 4),
+        ]
+        assert report.tracks[0].hue == 7
+
+    def test_report_lists_unmatched_files_and_unused_specs(self, track_builder, files):
+        with track_builder:
+            report = track_builder.build_many(files)
+
+        assert (report.defaulted, report.unmatched, report.unused_specs) == (
+            [files[3]],
+            [],
+            [Spec(Path("world.mp3"), required=False), Spec(Path("broken.mp3"))],
+        )
+
+    def test_failed_tracks_are_reported_and_their_numbers_freed_up(
+        self, track_builder, files
+    ):
+        with track_builder:
+            report = track_builder.build_many(files)
+
+        assert [(path, type(error)) for path, error in report.failed] == [
+            (files[2], ValueError)
+        ]
+        assert track_builder.n_discs == 4
+
+    def test_failed_tracks_do_not_leave_gaps(self, files, monkeypatch):
+        def extract_duration(track) -> int:
+            if Path(track).stem == "broken":
+                raise ValueError("Could not extract duration")
+            return 42
+
+        monkeypatch.setattr(utils, "extract_track_duration", extract_duration)
+        track_builder = TrackBuilder(start_at=8)
+        with track_builder:
+            report = track_builder.build_many([files[1], files[2], files[3]])
+
+        assert [track.num for track in report.tracks] == [8, 9]
+
+    def test_unmatched_files_are_skipped_if_set_to_error(self, track_builder, files):
+        track_builder.defaults["unspecified_file_handling"] = "error"
+        with track_builder:
+            report = track_builder.build_many(files)
+
+        assert (report.unmatched, report.defaulted) == ([files[3]], [])
+        assert files[3] not in [track.path for track in report.tracks]
+
+    def test_builder_jobs_are_used_by_default(self, files, monkeypatch):
+        used_jobs: list[int] = []
+        parallel_map = utils.parallel_map
+
+        def spy(function, iterable, jobs=1):
+            used_jobs.append(jobs)
+            return parallel_map(function, iterable, jobs=jobs)
+
+        monkeypatch.setattr(utils, "parallel_map", spy)
+        with TrackBuilder(jobs=3, enforce_contiguous_track_numbers="ignore") as builder:
+            builder.build_many(files[:2])
+            builder.build_many(files[2:], jobs=1)
+
+        assert used_jobs == [3, 1]
+
+    def test_conflicts_abort_the_whole_batch(self, track_builder, files):
+        with track_builder:
+            with pytest.raises(RuntimeError, match="already used"):
+                track_builder.build_many([*files, files[1]])
+            report = track_builder.build_many(files[:2])
+
+        assert [track.num for track in report.tracks] == [1, 2]
+
+
 class TestBuildingTracks:
     @pytest.fixture
     def track_builder(self, lock_built_in_track_count):
@@ -227,6 +720,22 @@ class TestBuildingTracks:
 
         assert (track.num, track_builder.n_discs) == (5, 5)
 
+    def test_auto_numbering_fills_in_around_reserved_numbers(
+        self, lock_built_in_track_count
+    ):
+        specs = [
+            Spec(Path(f"reserved_{num}.mp3"), num=num, required=False)
+            for num in (2, 3, 5)
+        ]
+        with TrackBuilder(
+            *specs, enforce_contiguous_track_numbers="ignore"
+        ) as track_builder:
+            nums = [track_builder[Path(f"auto_{i}.mp3")].num for i in range(2)]
+            nums.append(track_builder[Path("reserved_3.mp3")].num)
+            nums.extend(track_builder[Path(f"auto_{i}.mp3")].num for i in range(2, 5))
+
+        assert nums == [1, 4, 3, 6, 7, 8]
+
     def test_track_builder_re_validates_on_enter(self, track_builder):
         track_builder._specs.append(Spec(Path("Music/hello.mp3")))
 
@@ -387,3 +896,20 @@ class TestBuildingTracks:
 
         assert all((track.num == 1 for track in track_ones))
         assert track_builder.n_discs == 4
+
+    def test_track_builder_carries_probe_results_through(self, track_builder):
+        media_info = MediaInfo(
+            str(Path.home() / "Music" / "hello.mp3"),
+            "mp3",
+            (Stream(0, "audio", "mp3"),),
+            12.3,
+            {},
+        )
+        with track_builder:
+            track = track_builder[media_info]
+
+        assert (track.num, track.path, track.media_info) == (
+            4,
+            media_info.path,
+            media_info,
+        )
@@ -0,0 +1,362 @@
+"""Tests of the persistent caches"""
+
+import json
+import os
+from pathlib import Path
+
+import ffmpeg
+import pytest
+
+from foxnap_rpg import config, media
+from foxnap_rpg.builder import Spec
+from foxnap_rpg.cache import (
+    ConversionCache,
+    LibrarySnapshot,
+    ProbeCache,
+    SpecCache,
+    file_identity,
+)
+from foxnap_rpg.pack_generator import License
+
+
+@pytest.fixture
+def track(tmp_path):
+    track_path = tmp_path / "hello.mp3"
+    track_path.write_bytes(b"not really an mp3")
+    yield track_path
+
+
+@pytest.fixture
+def probe_cache(tmp_path):
+    with ProbeCache(tmp_path / "cache.sqlite3", version="ffprobe version 1") as cache:
+        yield cache
+
+
+class TestProbeCache:
+    def test_cache_roundtrip(self, probe_cache, track):
+        probe_cache.put(file_identity(track), {"hello": "world"})
+        assert probe_cache.get(file_identity(track)) == {"hello": "world"}
+
+    def test_modifying_a_file_invalidates_its_entry(self, probe_cache, track):
+        probe_cache.put(file_identity(track), {"hello": "world"})
+        stat = track.stat()
+        os.utime(track, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+        assert probe_cache.get(file_identity(track)) is None
+
+    def test_entries_persist_between_sessions(self, tmp_path, track):
+        with ProbeCache(tmp_path / "cache.sqlite3", version="v1") as cache:
+            cache.put(file_identity(track), [1, 2, 3])
+        with ProbeCache(tmp_path / "cache.sqlite3", version="v1") as cache:
+            assert cache.get(file_identity(track)) == [1, 2, 3]
+
+    def test_changing_ffprobe_version_invalidates_cache(self, tmp_path, track):
+        with ProbeCache(tmp_path / "cache.sqlite3", version="v1") as cache:
+            cache.put(file_identity(track), [1, 2, 3])
+        with ProbeCache(tmp_path / "cache.sqlite3", version="v2") as cache:
+            assert cache.get(file_identity(track)) is None
+
+    def test_clear(self, probe_cache, track):
+        probe_cache.put(file_identity(track), [1, 2, 3])
+        probe_cache.clear()
+        assert probe_cache.get(file_identity(track)) is None
+
+
+class TestCachedProbing:
+    @pytest.fixture
+    def probe_log(self, monkeypatch):
+        probed: list[str] = []
+
+        def mock_probe(filename, *args, **kwargs):
+            probed.append(filename)
+            if filename.endswith(".nfo"):
+                raise ffmpeg.Error("ffprobe", b"", b"Invalid data found")
+            return {
+                "streams": [{"index": 0, "codec_type": "audio"}],
+                "format": {"duration": "4.2", "tags": {"title": "Hello"}},
+            }
+
+        monkeypatch.setattr(ffmpeg, "probe", mock_probe)
+        yield probed
+
+    def test_unchanged_files_are_only_probed_once(self, probe_cache, track, probe_log):
+        first = media.probe_track(track, cache=probe_cache)
+        second = media.probe_track(track, cache=probe_cache)
+        assert (first, len(probe_log)) == (second, 1)
+
+    def test_probe_failures_are_cached(self, probe_cache, tmp_path, probe_log):
+        (tmp_path / "info.nfo").write_text("ripped by me")
+        for _ in range(2):
+            with pytest.raises(ffmpeg.Error):
+                media.probe_track(tmp_path / "info.nfo", cache=probe_cache)
+        assert len(probe_log) == 1
+
+    def test_files_are_always_probed_without_a_cache(self, track, probe_log):
+        media.probe_track(track)
+        media.probe_track(track)
+        assert len(probe_log) == 2
+
+
+def _age(path, seconds=60):
+    """Backdate the modification time of a file or folder"""
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns - seconds * 10**9))
+
+
+class TestLibrarySnapshot:
+    @pytest.fixture
+    def snapshot(self, tmp_path):
+        with LibrarySnapshot(tmp_path / "snapshot.sqlite3") as snapshot:
+            yield snapshot
+
+    @pytest.fixture
+    def folder(self, tmp_path):
+        (tmp_path / "music" / "album").mkdir(parents=True)
+        _age(tmp_path / "music" / "album")
+        _age(tmp_path / "music")
+        yield tmp_path / "music"
+
+    def test_snapshot_roundtrip(self, snapshot, folder):
+        listing = [("album", False, True), ("song.mp3", True, False)]
+        snapshot.put(file_identity(folder), listing)
+        assert snapshot.get(file_identity(folder)) == listing
+
+    def test_changing_a_folder_invalidates_its_entry(self, snapshot, folder):
+        snapshot.put(file_identity(folder), [("album", False, True)])
+        (folder / "song.mp3").write_text("hi")
+        assert snapshot.get(file_identity(folder)) is None
+
+    def test_recently_modified_folders_are_not_recorded(self, snapshot, folder):
+        (folder / "song.mp3").write_text("hi")
+        snapshot.put(file_identity(folder), [("song.mp3", True, False)])
+        assert snapshot.get(file_identity(folder)) is None
+
+    def test_removed_subfolders_are_pruned(self, snapshot, folder):
+        album = folder / "album"
+        snapshot.put(file_identity(album), [])
+        snapshot.put(file_identity(folder), [("album", False, True)])
+
+        snapshot.put(file_identity(folder), [])
+        assert snapshot.get_recorded(os.path.abspath(album)) == []
+
+    def test_entries_persist_between_sessions(self, tmp_path, folder):
+        with LibrarySnapshot(tmp_path / "snapshot.sqlite3") as snapshot:
+            snapshot.put(file_identity(folder), [("album", False, True)])
+        with LibrarySnapshot(tmp_path / "snapshot.sqlite3") as snapshot:
+            assert snapshot.get(file_identity(folder)) == [("album", False, True)]
+
+
+class TestSpecCache:
+    @pytest.fixture
+    def spec_cache(self, tmp_path):
+        with SpecCache(tmp_path / "specs.sqlite3", version="v1") as cache:
+            yield cache
+
+    @pytest.fixture
+    def config_file(self, tmp_path):
+        config_path = tmp_path / "config.json"
+        config_path.write_text('[{"path_spec": "hello.mp3", "num": 3}]')
+        yield config_path
+
+    @pytest.fixture
+    def parse_log(self, monkeypatch):
+        parsed: list[str] = []
+        iter_specs = config.iter_specs_from_config_file
+
+        def logged_iter_specs(config_path):
+            parsed.append(os.path.basename(config_path))
+            return iter_specs(config_path)
+
+        monkeypatch.setattr(config, "iter_specs_from_config_file", logged_iter_specs)
+        yield parsed
+
+    def test_unchanged_configs_are_only_parsed_once(
+        self, spec_cache, config_file, parse_log
+    ):
+        first = config.read_specs_from_config_file(config_file, cache=spec_cache)
+        second = config.read_specs_from_config_file(config_file, cache=spec_cache)
+
+        assert parse_log == ["config.json"]
+        assert first == second == [Spec(Path("hello.mp3"), num=3)]
+
+    def test_changing_a_config_invalidates_its_entry(
+        self, spec_cache, config_file, parse_log
+    ):
+        config.read_specs_from_config_file(config_file, cache=spec_cache)
+        config_file.write_text('[{"path_spec": "hello.mp3", "num": 4}]')
+
+        specs = config.read_specs_from_config_file(config_file, cache=spec_cache)
+
+        assert parse_log == ["config.json", "config.json"]
+        assert specs[0].num == 4
+
+    def test_changing_version_invalidates_cache(self, tmp_path, config_file):
+        with SpecCache(tmp_path / "specs.sqlite3", version="v1") as cache:
+            config.read_specs_from_config_file(config_file, cache=cache)
+        with SpecCache(tmp_path / "specs.sqlite3", version="v2") as cache:
+            assert cache.get(str(config_file), "anything") is None
+            assert (
+                cache.get(str(config_file), config._hash_file(str(config_file))) is None
+            )
+
+    def test_entries_persist_between_sessions(self, tmp_path, config_file, parse_log):
+        for _ in range(2):
+            with SpecCache(tmp_path / "specs.sqlite3", version="v1") as cache:
+                config.read_specs_from_config_file(config_file, cache=cache)
+        assert parse_log == ["config.json"]
+
+    def test_unparseable_configs_are_not_cached(self, spec_cache, tmp_path):
+        config_path = tmp_path / "config.json"
+        config_path.write_text('[{"num": 3}]')
+
+        for _ in range(2):
+            with pytest.raises(ValueError, match="Could not parse entry 1"):
+                config.read_specs_from_config_file(config_path, cache=spec_cache)
+
+    def test_every_spec_field_survives_the_cache(self, spec_cache, tmp_path):
+        config_path = tmp_path / "config.json"
+        config_path.write_text(
+            json.dumps(
+                [
+                    {
+                        "path_spec": "hello.mp3",
+                        "license_type": "attribution",
+                        "required": False,
+                        "description": "Hi",
+                        "num": 3,
+                        "hue": 120.5,
+                        "use_album_art": True,
+                    },
+                    {"path_spec": "re:(?P<n>[0-9]+)[.]ogg", "distinct": False},
+                    {"path_spec": "plain.flac", "hue": False},
+                ]
+            )
+        )
+
+        parsed = config.read_specs_from_config_file(config_path, cache=spec_cache)
+        cached = config.read_specs_from_config_file(config_path, cache=spec_cache)
+
+        assert cached == parsed
+        assert [type(spec.hue) for spec in cached] == [float, type(None), bool]
+        assert cached[0].license_type is License.ATTRIBUTION
+        assert cached[1].path_spec == "re:(?P<n>[0-9]+)[.]ogg"
+
+    def test_corrupted_entries_are_treated_as_missing(self, spec_cache):
+        spec_cache._write(
+            ("INSERT INTO specs VALUES (?, ?, ?)", ("config.json", "abc", "nope"))
+        )
+        assert spec_cache.get("config.json", "abc") is None
+
+    def test_unreadable_specs_are_reparsed(self, spec_cache, config_file, parse_log):
+        path = str(config_file)
+        spec_cache.put(path, config._hash_file(path), [{"path_spec": "hello.mp3"}])
+
+        specs = config.read_specs_from_config_file(config_file, cache=spec_cache)
+
+        assert parse_log == ["config.json"]
+        assert specs == [Spec(Path("hello.mp3"), num=3)]
+
+
+class TestConversionCache:
+    @pytest.fixture
+    def conversion_cache(self, tmp_path):
+        with ConversionCache(tmp_path / "conversions.sqlite3", version="v1") as cache:
+            yield cache
+
+    def test_store_roundtrip(self, conversion_cache, track, tmp_path):
+        key = conversion_cache.key(track, ["-acodec", "libvorbis"])
+        (tmp_path / "converted.ogg").write_text("converted")
+        conversion_cache.put(key, tmp_path / "converted.ogg")
+
+        assert conversion_cache.get(key, tmp_path / "retrieved.ogg")
+        assert (tmp_path / "retrieved.ogg").read_text() == "converted"
+
+    def test_missing_entries(self, conversion_cache, track, tmp_path):
+        key = conversion_cache.key(track, ["-acodec", "libvorbis"])
+        assert not conversion_cache.get(key, tmp_path / "retrieved.ogg")
+        assert not (tmp_path / "retrieved.ogg").exists()
+
+    def test_key_depends_on_content_not_location(self, conversion_cache, track):
+        key = conversion_cache.key(track, ["-ac", "1"])
+        moved = track.rename(track.parent / "moved.mp3")
+
+        assert conversion_cache.key(moved, ["-ac", "1"]) == key
+        moved.write_bytes(b"a different song")
+        assert conversion_cache.key(moved, ["-ac", "1"]) != key
+
+    def test_key_depends_on_arguments_and_version(self, tmp_path, track):
+        with ConversionCache(tmp_path / "conversions.sqlite3", version="v1") as cache:
+            keys = {cache.key(track, ["-ac", "1"]), cache.key(track, ["-ac", "2"])}
+        with ConversionCache(tmp_path / "conversions.sqlite3", version="v2") as cache:
+            keys.add(cache.key(track, ["-ac", "1"]))
+        assert len(keys) == 3
+
+    def test_unchanged_files_are_only_hashed_once(self, conversion_cache, track):
+        key = conversion_cache.key(track, [])
+
+        # sneakily change the contents without changing the size or timestamps
+        stat = track.stat()
+        track.write_bytes(b"not really an mp4")
+        os.utime(track, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+
+        assert conversion_cache.key(track, []) == key
+
+    def test_clear_removes_stored_files(self, conversion_cache, track, tmp_path):
+        key = conversion_cache.key(track, [])
+        (tmp_path / "converted.ogg").write_text("converted")
+        conversion_cache.put(key, tmp_path / "converted.ogg")
+
+        conversion_cache.clear()
+
+        assert not conversion_cache.get(key, tmp_path / "retrieved.ogg")
+
+    def test_files_unused_for_too_long_are_pruned(self, track, tmp_path):
+        cache_path = tmp_path / "conversions.sqlite3"
+        (tmp_path / "converted.ogg").write_text("converted")
+        with ConversionCache(cache_path, version="v1") as cache:
+            stale_key = cache.key(track, ["-ac", "1"])
+            fresh_key = cache.key(track, ["-ac", "2"])
+            cache.put(stale_key, tmp_path / "converted.ogg")
+            cache.put(fresh_key, tmp_path / "converted.ogg")
+            cache._write(
+                ("UPDATE stored SET last_used_ns = 0 WHERE key = ?", (stale_key,))
+            )
+
+        # the converted file is hard-linked into the store, so it's the one that
+        # needs to look old
+        os.utime(tmp_path / "converted.ogg", ns=(0, 0))
+
+        with ConversionCache(cache_path, version="v1", max_age_days=1) as cache:
+            assert not cache.get(stale_key, tmp_path / "stale.ogg")
+            assert cache.get(fresh_key, tmp_path / "fresh.ogg")
+
+    def test_pruning_can_be_turned_off(self, track, tmp_path):
+        cache_path = tmp_path / "conversions.sqlite3"
+        (tmp_path / "converted.ogg").write_text("converted")
+        with ConversionCache(cache_path, version="v1") as cache:
+            key = cache.key(track, [])
+            cache.put(key, tmp_path / "converted.ogg")
+            cache._write(("UPDATE stored SET last_used_ns = 0", ()))
+        os.utime(tmp_path / "converted.ogg", ns=(0, 0))
+
+        with ConversionCache(cache_path, version="v1", max_age_days=None) as cache:
+            assert cache.get(key, tmp_path / "retrieved.ogg")
+
+    def test_old_files_with_no_record_of_use_are_pruned(self, track, tmp_path):
+        cache_path = tmp_path / "conversions.sqlite3"
+        (tmp_path / "converted.ogg").write_text("converted")
+        with ConversionCache(cache_path, version="v1") as cache:
+            cache.put(cache.key(track, []), tmp_path / "converted.ogg")
+            cache._write(("DELETE FROM stored", ()))
+        os.utime(tmp_path / "converted.ogg", ns=(0, 0))
+
+        with ConversionCache(cache_path, version="v1", max_age_days=1) as cache:
+            assert list(cache.store.iterdir()) == []
+
+    def test_digests_of_missing_files_are_pruned(self, track, tmp_path):
+        cache_path = tmp_path / "conversions.sqlite3"
+        with ConversionCache(cache_path, version="v1") as cache:
+            cache.key(track, [])
+        track.unlink()
+
+        with ConversionCache(cache_path, version="v1") as cache:
+            assert cache._read("SELECT * FROM digests", ()) is None
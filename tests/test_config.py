@@ -8,7 +8,8 @@ from typing import Any, NamedTuple
 
 import pytest
 
-from foxnap_rpg.builder import Spec
+from foxnap_rpg import cli, config, utils
+from foxnap_rpg.builder import Spec, TrackBuilder
 from foxnap_rpg.config import read_specs_from_config_file
 from foxnap_rpg.pack_generator import License
 
@@ -102,3 +103,252 @@ class TestConfigParsing:
             writer.writerows((spec._asdict() for spec in spec_list))
 
         assert read_specs_from_config_file(tmp_path / "config.csv") == spec_list
+
+
+class TestStreamingConfigParsing:
+    @pytest.fixture(autouse=True)
+    def tiny_chunks(self, monkeypatch):
+        # force entries (and values within entries) to straddle chunk boundaries
+        monkeypatch.setattr(config._JSONStreamReader, "_CHUNK_SIZE", 7)
+        monkeypatch.setattr(config, "_SNIFF_SAMPLE_SIZE", 50)
+
+    @pytest.fixture
+    def spec_dicts(self):
+        yield [
+            {"path_spec": f"track_{i}.mp3", "hue": i * 3, "num": i}
+            for i in range(1, 101)
+        ]
+
+    def test_parse_json_list(self, tmp_path, spec_dicts):
+        (tmp_path / "config.json").write_text(json.dumps(spec_dicts, indent=2))
+
+        specs = config.iter_specs_from_config_file(tmp_path / "config.json")
+
+        assert [(spec.path_spec, spec.hue, spec.num) for spec in specs] == [
+            (Path(f"track_{i}.mp3"), i * 3, i) for i in range(1, 101)
+        ]
+
+    def test_parse_json_dict(self, tmp_path, spec_dicts):
+        (tmp_path / "config.json").write_text(
+            json.dumps({d.pop("path_spec"): d for d in spec_dicts})
+        )
+
+        specs = config.iter_specs_from_config_file(tmp_path / "config.json")
+
+        assert [spec.path_spec for spec in specs] == [
+            Path(f"track_{i}.mp3") for i in range(1, 101)
+        ]
+
+    def test_regex_path_specs_are_kept_verbatim(self, tmp_path):
+        regex = r"re:(?P<a>[^/]+)//(?P<b>.+)\.mp3/"
+        (tmp_path / "config.json").write_text(
+            json.dumps(
+                [
+                    {"path_spec": regex, "distinct": False},
+                    {"path_spec": "re:literally//this.mp3"},
+                ]
+            )
+        )
+
+        specs = read_specs_from_config_file(tmp_path / "config.json")
+
+        assert [spec.path_spec for spec in specs] == [
+            regex,
+            Path("re:literally//this.mp3"),
+        ]
+
+    def test_parse_empty_json(self, tmp_path):
+        (tmp_path / "config.json").write_text(" [ ] ")
+
+        assert read_specs_from_config_file(tmp_path / "config.json") == []
+
+    def test_parse_csv(self, tmp_path, spec_dicts):
+        with (tmp_path / "config.csv").open("w", newline="") as config_file:
+            writer = csv.DictWriter(config_file, fieldnames=["path_spec", "hue", "num"])
+            writer.writeheader()
+            writer.writerows(spec_dicts)
+
+        specs = config.iter_specs_from_config_file(tmp_path / "config.csv")
+
+        assert [spec.num for spec in specs] == list(range(1, 101))
+
+    def test_entries_are_read_lazily(self, tmp_path, spec_dicts):
+        config_text = json.dumps(spec_dicts)
+        (tmp_path / "config.json").write_text(config_text[:-1] + ", nonsense]")
+
+        specs = config.iter_specs_from_config_file(tmp_path / "config.json")
+
+        assert next(specs).num == 1
+        with pytest.raises(ValueError, match="Could not parse '"):
+            list(specs)
+
+    @pytest.mark.parametrize(
+        "contents",
+        (
+            '[{"path_spec": "a"}, {"path_spec": "b"}',
+            '{"a": {"path_spec": "a"}, "b"}',
+            '"hello"',
+            '[{"path_spec": "a"} {"path_spec": "b"}]',
+        ),
+    )
+    def test_malformed_json_raises(self, tmp_path, contents):
+        (tmp_path / "config.json").write_text(contents)
+
+        with pytest.raises(ValueError, match="Could not parse '"):
+            read_specs_from_config_file(tmp_path / "config.json")
+
+    def test_bad_entry_is_reported(self, tmp_path):
+        (tmp_path / "config.json").write_text('[{"path_spec": "a"}, {"hue": 5}]')
+
+        with pytest.raises(ValueError, match="Could not parse entry 2"):
+            read_specs_from_config_file(tmp_path / "config.json")
+
+
+class TestColumnMapping:
+    def test_aliases_are_resolved(self):
+        columns = config._map_columns(("Track No", "Usage", "FileName", "Notes"))
+
+        assert columns["num"] == ("Track No",)
+        assert columns["license_type"] == ("Usage",)
+        assert columns["path_spec"] == ("FileName",)
+        assert columns["hue"] == ()
+
+    def test_columns_are_in_order_of_precedence(self):
+        columns = config._map_columns(("header", "filename", "Path Spec"))
+
+        assert columns["path_spec"] == ("Path Spec", "filename", "header")
+
+    def test_blank_values_fall_back_to_the_next_column(self, tmp_path):
+        (tmp_path / "config.csv").write_text(
+            "path_spec,filename,track_no\n,hello.mp3,3\nworld.mp3,,4\n"
+        )
+
+        assert read_specs_from_config_file(tmp_path / "config.csv") == [
+            Spec(Path("hello.mp3"), num=3),
+            Spec(Path("world.mp3"), num=4),
+        ]
+
+    def test_header_is_only_mapped_once(self, tmp_path):
+        config._map_columns.cache_clear()
+        with (tmp_path / "config.csv").open("w", newline="") as config_file:
+            writer = csv.writer(config_file)
+            writer.writerow(("filename", "usage", "track_no"))
+            writer.writerows((f"{i}.mp3", "personal", i) for i in range(1, 501))
+
+        specs = read_specs_from_config_file(tmp_path / "config.csv")
+
+        assert [spec.num for spec in specs] == list(range(1, 501))
+        assert config._map_columns.cache_info().misses == 1
+
+    def test_errors_name_the_entry(self, tmp_path):
+        (tmp_path / "config.csv").write_text(
+            "filename,track_no\nhello.mp3,3\nworld.mp3,four\n"
+        )
+
+        with pytest.raises(ValueError, match="Could not parse entry 2"):
+            read_specs_from_config_file(tmp_path / "config.csv")
+
+
+class TestFolderSpecs:
+    @pytest.fixture
+    def library(self, tmp_path):
+        for album in ("Abbey Road", "Help! [Deluxe]"):
+            (tmp_path / album / "Disc 1").mkdir(parents=True)
+            for name in ("Disc 1/01 Intro.mp3", "02 Outro.mp3"):
+                (tmp_path / album / name).write_text(name)
+        (tmp_path / "Help! [Deluxe]" / "foxnap_specs.json").write_text(
+            json.dumps(
+                [
+                    {"path_spec": "02 Outro.mp3", "num": 5, "title": "Goodbye"},
+                    {"path_spec": "**/*.mp3", "distinct": False, "hue": 90},
+                ]
+            )
+        )
+        yield tmp_path
+
+    @pytest.fixture(autouse=True)
+    def skip_probing(self, monkeypatch):
+        def fake_probe(file_path, **kwargs):
+            return file_path, (file_path if file_path.suffix == ".mp3" else None)
+
+        monkeypatch.setattr(cli, "_probe_music_file", fake_probe)
+        monkeypatch.setattr(utils, "extract_track_duration", lambda *args: 42)
+
+    def test_folders_without_spec_files_have_no_specs(self, library):
+        assert config.read_folder_specs(library / "Abbey Road") == []
+
+    def test_folder_specs_only_match_within_the_folder(self, library):
+        album = library / "Help! [Deluxe]"
+        with TrackBuilder(*config.read_folder_specs(album)) as builder:
+            inside = [
+                builder[album / "02 Outro.mp3"],
+                builder[album / "Disc 1" / "01 Intro.mp3"],
+            ]
+            outside = builder[library / "Abbey Road" / "02 Outro.mp3"]
+
+        assert [(track.num, track.hue) for track in inside] == [(5, True), (1, 90.0)]
+        assert outside.hue is True
+
+    def test_folder_regexes_can_start_with_inline_flags(self, library):
+        album = library / "Abbey Road"
+        (album / "foxnap_specs.json").write_text(
+            json.dumps(
+                [
+                    {
+                        "path_spec": r"re:(?i)(?P<title>[^/]*)[.]MP3",
+                        "distinct": False,
+                        "description": "{title}",
+                    }
+                ]
+            )
+        )
+
+        with TrackBuilder(*config.read_folder_specs(album)) as builder:
+            track = builder[album / "02 Outro.mp3"]
+            outside = builder[library / "Help! [Deluxe]" / "02 Outro.mp3"]
+
+        assert track.description == "02 Outro"
+        assert outside.description is None
+
+    def test_folder_specs_are_loaded_by_resolve_tracks(self, library):
+        with TrackBuilder(enforce_contiguous_track_numbers="ignore") as builder:
+            tracks = {
+                track.path.relative_to(library).as_posix(): track
+                for track in cli.resolve_tracks(builder, library)
+            }
+
+        assert tracks["Help! [Deluxe]/02 Outro.mp3"].num == 5
+        assert tracks["Help! [Deluxe]/02 Outro.mp3"].description == "Goodbye"
+        assert tracks["Help! [Deluxe]/Disc 1/01 Intro.mp3"].hue == 90.0
+        assert tracks["Abbey Road/02 Outro.mp3"].hue is True
+
+    def test_folder_specs_can_be_ignored(self, library):
+        with TrackBuilder(enforce_contiguous_track_numbers="ignore") as builder:
+            tracks = list(cli.resolve_tracks(builder, library, folder_specs=False))
+
+        assert "Goodbye" not in [track.description for track in tracks]
+
+    def test_spec_files_are_only_read_when_their_folder_is_walked(
+        self, library, monkeypatch
+    ):
+        read: list[str] = []
+        read_specs = config.read_specs_from_config_file
+
+        def spy(config_path, **kwargs):
+            read.append(Path(config_path).parent.name)
+            return read_specs(config_path, **kwargs)
+
+        monkeypatch.setattr(config, "read_specs_from_config_file", spy)
+        with TrackBuilder() as builder:
+            list(cli.resolve_tracks(builder, library / "Abbey Road"))
+
+        assert read == []
+
+    def test_bad_spec_files_are_skipped(self, library, caplog):
+        (library / "Abbey Road" / "foxnap_specs.csv").write_text("num\nthree\n")
+
+        with TrackBuilder(enforce_contiguous_track_numbers="ignore") as builder:
+            tracks = list(cli.resolve_tracks(builder, library / "Abbey Road"))
+
+        assert len(tracks) == 2
+        assert "Could not read the spec file" in caplog.text
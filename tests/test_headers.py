@@ -0,0 +1,323 @@
+"""Tests of the pure-Python header readers"""
+
+import io
+import math
+import struct
+from pathlib import Path
+
+import pytest
+from PIL import Image
+
+from foxnap_rpg import headers, media
+from foxnap_rpg.pack_generator import extract_album_art, extract_track_description
+
+bundled_records = (
+    Path("src") / "main" / "resources" / "assets" / "foxnap" / "sounds" / "records"
+)
+
+
+@pytest.fixture(scope="module")
+def cover_png() -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (30, 30), (255, 0, 0)).save(buffer, format="png")
+    return buffer.getvalue()
+
+
+def _syncsafe(value: int) -> bytes:
+    return bytes((value >> shift) & 0x7F for shift in (21, 14, 7, 0))
+
+
+def _id3v23_frame(frame_id: bytes, body: bytes) -> bytes:
+    return frame_id + struct.pack(">I", len(body)) + b"\x00\x00" + body
+
+
+def _box(box_type: bytes, *contents: bytes) -> bytes:
+    payload = b"".join(contents)
+    return struct.pack(">I4s", 8 + len(payload), box_type) + payload
+
+
+def make_mp3(
+    n_frames: int = 100,
+    tags: bytes = b"",
+    xing_frames: int | None = None,
+) -> bytes:
+    # MPEG-1 Layer III, 128 kbps, 44.1 kHz, stereo => 417-byte frames
+    frame = b"\xff\xfb\x90\x00" + b"\x00" * 413
+    frames = [frame] * n_frames
+    if xing_frames is not None:
+        frames[0] = (
+            frame[:36] + b"Xing" + struct.pack(">II", 1, xing_frames) + frame[48:]
+        )
+    tag = b""
+    if tags:
+        tag = b"ID3\x03\x00\x00" + _syncsafe(len(tags)) + tags
+    return tag + b"".join(frames)
+
+
+def make_flac(comments: dict[str, str], picture: bytes | None = None) -> bytes:
+    sample_rate, total_samples = 44100, 44100 * 42 + 100
+    packed = (sample_rate << 44) | (1 << 41) | (15 << 36) | total_samples
+    streaminfo = b"\x10\x00\x10\x00" + b"\x00" * 6 + packed.to_bytes(8, "big")
+    streaminfo += b"\x00" * 16
+
+    comment_block = struct.pack("<I", 6) + b"foxnap" + struct.pack("<I", len(comments))
+    for key, value in comments.items():
+        entry = f"{key}={value}".encode()
+        comment_block += struct.pack("<I", len(entry)) + entry
+
+    blocks = [(0, streaminfo), (4, comment_block)]
+    if picture is not None:
+        blocks.append(
+            (
+                6,
+                struct.pack(">II", 3, 9)
+                + b"image/png"
+                + struct.pack(">I", 0)
+                + struct.pack(">IIIII", 30, 30, 24, 0, len(picture))
+                + picture,
+            )
+        )
+    data = b"fLaC"
+    for i, (block_type, block) in enumerate(blocks):
+        last = 0x80 if i == len(blocks) - 1 else 0
+        data += bytes((block_type | last,)) + len(block).to_bytes(3, "big") + block
+    return data + b"\xff\xf8" + b"\x00" * 100  # the start of a frame
+
+
+def make_m4a(tags: dict[bytes, str], cover: bytes | None = None) -> bytes:
+    mvhd = _box(b"mvhd", b"\x00" * 12, struct.pack(">II", 1000, 5500), b"\x00" * 80)
+    hdlr = _box(b"hdlr", b"\x00" * 8, b"soun", b"\x00" * 12)
+    stsd = _box(b"stsd", b"\x00" * 4, struct.pack(">I", 1), _box(b"mp4a", b"\x00" * 28))
+    trak = _box(b"trak", _box(b"mdia", hdlr, _box(b"minf", _box(b"stbl", stsd))))
+    items = [
+        _box(key, _box(b"data", struct.pack(">II", 1, 0), value.encode()))
+        for key, value in tags.items()
+    ]
+    if cover is not None:
+        items.append(_box(b"covr", _box(b"data", struct.pack(">II", 14, 0), cover)))
+    meta = _box(
+        b"meta",
+        b"\x00" * 4,
+        _box(b"hdlr", b"\x00" * 8, b"mdir", b"\x00" * 12),
+        _box(b"ilst", *items),
+    )
+    return (
+        _box(b"ftyp", b"M4A \x00\x00\x00\x00")
+        + _box(b"mdat", b"\x00" * 1000)
+        + _box(b"moov", mvhd, trak, _box(b"udta", meta))
+    )
+
+
+class TestMP3:
+    def test_cbr_duration_is_estimated_from_bitrate(self, tmp_path):
+        (tmp_path / "song.mp3").write_bytes(make_mp3(n_frames=100))
+        info = headers.read_header_info(tmp_path / "song.mp3")
+        assert info.duration == pytest.approx(100 * 417 * 8 / 128000)
+
+    def test_vbr_duration_comes_from_xing_header(self, tmp_path):
+        (tmp_path / "song.mp3").write_bytes(make_mp3(n_frames=10, xing_frames=1000))
+        info = headers.read_header_info(tmp_path / "song.mp3")
+        assert info.duration == pytest.approx(1000 * 1152 / 44100)
+
+    def test_reading_id3v2_tags(self, tmp_path):
+        tags = _id3v23_frame(b"TIT2", b"\x03Mars") + _id3v23_frame(
+            b"TPE1", b"\x01" + "Holst".encode("utf-16")
+        )
+        (tmp_path / "song.mp3").write_bytes(make_mp3(tags=tags))
+        info = headers.read_header_info(tmp_path / "song.mp3")
+        assert (info.format_name, info.tags) == (
+            "mp3",
+            {"title": "Mars", "artist": "Holst"},
+        )
+
+    def test_reading_embedded_cover_art(self, tmp_path, cover_png):
+        tags = _id3v23_frame(b"APIC", b"\x00image/png\x00\x03cover\x00" + cover_png)
+        (tmp_path / "song.mp3").write_bytes(make_mp3(tags=tags))
+        info = headers.read_header_info(tmp_path / "song.mp3")
+
+        assert (info.has_cover, info.cover_codec) == (True, "png")
+        assert headers.read_cover_art(tmp_path / "song.mp3") == cover_png
+
+    def test_reading_id3v1_tags(self, tmp_path):
+        id3v1 = b"TAG" + b"Venus".ljust(30, b"\x00") + b"Holst".ljust(30, b"\x00")
+        id3v1 = id3v1.ljust(128, b"\x00")
+        (tmp_path / "song.mp3").write_bytes(make_mp3(n_frames=100) + id3v1)
+        info = headers.read_header_info(tmp_path / "song.mp3")
+
+        assert info.tags == {"title": "Venus", "artist": "Holst"}
+        assert info.duration == pytest.approx(100 * 417 * 8 / 128000)
+
+
+class TestFLAC:
+    def test_reading_flac_metadata(self, tmp_path, cover_png):
+        (tmp_path / "song.flac").write_bytes(
+            make_flac({"TITLE": "Jupiter", "ARTIST": "Holst"}, picture=cover_png)
+        )
+        info = headers.read_header_info(tmp_path / "song.flac")
+
+        assert info == headers.HeaderInfo(
+            "flac",
+            "flac",
+            42 + 100 / 44100,
+            {"title": "Jupiter", "artist": "Holst"},
+            True,
+            "png",
+        )
+
+    def test_reading_flac_cover_art(self, tmp_path, cover_png):
+        (tmp_path / "song.flac").write_bytes(make_flac({}, picture=cover_png))
+        assert headers.read_cover_art(tmp_path / "song.flac") == cover_png
+
+
+class TestOgg:
+    def test_reading_bundled_track(self):
+        info = headers.read_header_info(bundled_records / "tobu-colors.ogg")
+        assert (info.codec_name, math.ceil(info.duration), info.tags["title"]) == (
+            "vorbis",
+            280,
+            "Colors",
+        )
+
+    @pytest.mark.parametrize(
+        "record, expected",
+        (
+            ("macleod-danse_macabre_saint_saens.ogg", 407),
+            ("pmm_strauss_r_also_sprach_zarathustra.ogg", 108),
+            ("army_band_rimsky_korsakov_flight_of_the_bumblebee.ogg", 80),
+        ),
+    )
+    def test_durations_match_bundled_jukebox_songs(self, record, expected):
+        info = headers.read_header_info(bundled_records / record)
+        assert math.ceil(info.duration) == expected
+
+
+class TestMP4:
+    def test_reading_m4a_metadata(self, tmp_path, cover_png):
+        (tmp_path / "song.m4a").write_bytes(
+            make_m4a({b"\xa9nam": "Saturn", b"\xa9wrt": "Holst"}, cover=cover_png)
+        )
+        info = headers.read_header_info(tmp_path / "song.m4a")
+
+        assert info == headers.HeaderInfo(
+            "mov,mp4,m4a,3gp,3g2,mj2",
+            "aac",
+            5.5,
+            {"title": "Saturn", "composer": "Holst"},
+            True,
+            "png",
+        )
+        assert headers.read_cover_art(tmp_path / "song.m4a") == cover_png
+
+
+class TestFallback:
+    def test_unrecognized_files_are_left_to_ffprobe(self, tmp_path):
+        (tmp_path / "song.wav").write_bytes(b"RIFF\x00\x00\x00\x00WAVEfmt ")
+        assert headers.read_header_info(tmp_path / "song.wav") is None
+
+    def test_damaged_files_are_left_to_ffprobe(self, tmp_path):
+        (tmp_path / "song.flac").write_bytes(make_flac({"TITLE": "Uranus"})[:30])
+        assert headers.read_header_info(tmp_path / "song.flac") is None
+
+    def test_damaged_mp3_is_left_to_ffprobe(self, tmp_path):
+        (tmp_path / "song.mp3").write_bytes(b"ID3\x03\x00\x00\x00\x00\x00\x00" * 3)
+        assert headers.read_header_info(tmp_path / "song.mp3") is None
+
+    @pytest.mark.parametrize("frame_id", (b"TIT2", b"APIC"))
+    def test_mp3_with_invalid_text_encoding_is_left_to_ffprobe(
+        self, tmp_path, frame_id
+    ):
+        body = b"\x07Neptune" if frame_id == b"TIT2" else b"\x07image/png\x00\x03\x00"
+        (tmp_path / "song.mp3").write_bytes(
+            make_mp3(tags=_id3v23_frame(frame_id, body))
+        )
+        assert headers.read_header_info(tmp_path / "song.mp3") is None
+        assert headers.read_cover_art(tmp_path / "song.mp3") is None
+
+    @pytest.mark.parametrize("box_type", (b"mvhd", b"mdia", b"hdlr"))
+    def test_m4a_missing_required_box_is_left_to_ffprobe(self, tmp_path, box_type):
+        (tmp_path / "song.m4a").write_bytes(
+            make_m4a({b"\xa9nam": "Pluto"}).replace(box_type, b"free")
+        )
+        assert headers.read_header_info(tmp_path / "song.m4a") is None
+        assert headers.read_cover_art(tmp_path / "song.m4a") is None
+
+    def test_m4a_with_empty_moov_is_left_to_ffprobe(self, tmp_path):
+        (tmp_path / "song.m4a").write_bytes(
+            _box(b"ftyp", b"M4A \x00\x00\x00\x00") + _box(b"moov")
+        )
+        assert headers.read_header_info(tmp_path / "song.m4a") is None
+
+
+class TestProbingWithoutFFprobe:
+    @pytest.fixture(autouse=True)
+    def forbid_ffmpeg(self, monkeypatch):
+        def explode(*args, **kwargs):
+            raise AssertionError("ffmpeg should not have been called")
+
+        monkeypatch.setattr(media.ffmpeg, "probe", explode)
+
+    def test_probe_track_uses_headers(self, tmp_path):
+        (tmp_path / "song.flac").write_bytes(make_flac({"TITLE": "Neptune"}))
+        info = media.probe_track(tmp_path / "song.flac")
+        assert (info.has_audio, info.has_cover, info.tags) == (
+            True,
+            False,
+            {"title": "Neptune"},
+        )
+
+    def test_description_extraction(self, tmp_path):
+        (tmp_path / "song.flac").write_bytes(
+            make_flac({"TITLE": "Neptune", "ARTIST": "Holst"})
+        )
+        assert extract_track_description(tmp_path / "song.flac") == "Holst - Neptune"
+
+    def test_album_art_extraction(self, tmp_path, cover_png):
+        (tmp_path / "song.flac").write_bytes(make_flac({}, picture=cover_png))
+        inlay = extract_album_art(tmp_path / "song.flac")
+        assert (inlay.size, inlay.getpixel((2, 1))) == ((5, 3), (255, 0, 0))
+
+
+class TestMightBeAudio:
+    @pytest.mark.parametrize("name", ("cover.jpg", "album.cue", "rip.LOG", "info.nfo"))
+    def test_known_non_audio_extensions_are_rejected(self, tmp_path, name):
+        # even if the contents look like audio
+        (tmp_path / name).write_bytes(make_mp3(n_frames=2))
+        assert not headers.might_be_audio(tmp_path / name)
+
+    def test_known_audio_extensions_are_accepted(self, tmp_path):
+        (tmp_path / "song.mp3").write_text("definitely not audio")
+        assert headers.might_be_audio(tmp_path / "song.mp3")
+
+    @pytest.mark.parametrize(
+        "contents",
+        (
+            b"\xff\xd8\xff\xe0\x00\x10JFIF",
+            b"\x89PNG\r\n\x1a\n\x00\x00",
+            b"PK\x03\x04\x14\x00",
+            b"RIFF\x00\x00\x00\x00WEBPVP8 ",
+            'REM GENRE Classical\nTITLE "Planets"\n'.encode(),
+            "Exact Audio Copy V1.0 — Extraction logfile".encode("utf-16"),
+            b"",
+        ),
+        ids=("jpeg", "png", "zip", "webp", "text", "utf-16 text", "empty"),
+    )
+    def test_unfamiliar_non_audio_files_are_sniffed(self, tmp_path, contents):
+        (tmp_path / "mystery.bin").write_bytes(contents)
+        assert not headers.might_be_audio(tmp_path / "mystery.bin")
+
+    @pytest.mark.parametrize(
+        "contents",
+        (
+            make_mp3(n_frames=2),
+            make_flac({}),
+            b"RIFF\x00\x00\x00\x00WAVEfmt ",
+            b"RIFF\x00\x00\x00\x00AVI LIST",
+        ),
+        ids=("mp3", "flac", "wav", "avi"),
+    )
+    def test_unfamiliar_audio_files_are_sniffed(self, tmp_path, contents):
+        (tmp_path / "mystery.bin").write_bytes(contents)
+        assert headers.might_be_audio(tmp_path / "mystery.bin")
+
+    def test_unreadable_files_are_given_the_benefit_of_the_doubt(self, tmp_path):
+        assert headers.might_be_audio(tmp_path / "does_not_exist.bin")
@@ -0,0 +1,179 @@
+"""Tests of the music library walker"""
+
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+from foxnap_rpg import library
+from foxnap_rpg.cache import LibrarySnapshot
+
+
+@pytest.fixture(scope="module")
+def music_library(tmp_path_factory):
+    root = tmp_path_factory.mktemp("library")
+    for relative_path in (
+        "Holst/The Planets/01 Mars.flac",
+        "Holst/The Planets/02 Venus.flac",
+        "Holst/The Planets/cover.jpg",
+        "Holst/The Planets.cue",
+        "Holst/St Paul's Suite/1. Jig.mp3",
+        "Holst-Planets.m3u",
+        "Saint-Saens/Danse Macabre.ogg",
+        "Saint-Saens/.hidden/notes.txt",
+        "a/b/c.mp3",
+        "a/b.mp3",
+        "a.mp3",
+        "Zarathustra.wav",
+    ):
+        (root / relative_path).parent.mkdir(parents=True, exist_ok=True)
+        (root / relative_path).write_text(relative_path)
+    (root / "Empty Folder").mkdir()
+    yield root
+
+
+def _expected(root: Path) -> list[Path]:
+    return [path for path in sorted(root.rglob("*")) if not path.is_dir()]
+
+
+class TestIterFiles:
+    @pytest.mark.parametrize("jobs", (1, 2, 8))
+    def test_order_matches_sorted_rglob(self, music_library, jobs):
+        assert list(library.iter_files(music_library, jobs=jobs)) == _expected(
+            music_library
+        )
+
+    def test_walking_a_single_subfolder(self, music_library):
+        assert list(library.iter_files(music_library / "Holst" / "The Planets")) == [
+            music_library / "Holst" / "The Planets" / name
+            for name in ("01 Mars.flac", "02 Venus.flac", "cover.jpg")
+        ]
+
+    def test_files_are_yielded_before_the_walk_is_complete(
+        self, music_library, monkeypatch
+    ):
+        listed: list[str] = []
+        list_directory = library._list_directory
+
+        def spy(path, **kwargs):
+            listed.append(path)
+            return list_directory(path, **kwargs)
+
+        monkeypatch.setattr(library, "_list_directory", spy)
+        walker = library.iter_files(music_library)
+        assert (
+            next(walker) == music_library / "Holst" / "St Paul's Suite" / "1. Jig.mp3"
+        )
+        assert listed == [
+            os.fspath(music_library / folder)
+            for folder in ("", "Empty Folder", "Holst", "Holst/St Paul's Suite")
+        ]
+
+    @pytest.mark.skipif(sys.platform == "win32", reason="symlinks need privileges")
+    def test_symlinked_folders_are_not_followed(self, tmp_path):
+        (tmp_path / "real").mkdir()
+        (tmp_path / "real" / "song.mp3").write_text("hi")
+        (tmp_path / "link").symlink_to(tmp_path / "real", target_is_directory=True)
+        (tmp_path / "song_link.mp3").symlink_to(tmp_path / "real" / "song.mp3")
+
+        walked = list(library.iter_files(tmp_path, jobs=2))
+        assert (
+            walked
+            == _expected(tmp_path)
+            == [
+                tmp_path / "real" / "song.mp3",
+                tmp_path / "song_link.mp3",
+            ]
+        )
+
+    @pytest.mark.skipif(
+        sys.platform == "win32" or os.geteuid() == 0,
+        reason="requires POSIX permissions to be enforced",
+    )
+    def test_unreadable_folders_are_skipped(self, tmp_path, caplog):
+        (tmp_path / "locked").mkdir()
+        (tmp_path / "locked" / "song.mp3").write_text("hi")
+        (tmp_path / "song.mp3").write_text("hi")
+        (tmp_path / "locked").chmod(0)
+        try:
+            assert list(library.iter_files(tmp_path)) == [tmp_path / "song.mp3"]
+        finally:
+            (tmp_path / "locked").chmod(0o755)
+        assert "Could not read" in caplog.text
+
+    @pytest.mark.parametrize("jobs", (0, 2.5))
+    def test_invalid_jobs_raises(self, music_library, jobs):
+        with pytest.raises(ValueError):
+            next(library.iter_files(music_library, jobs=jobs))
+
+
+class TestIncrementalRescan:
+    @pytest.fixture
+    def music_library(self, tmp_path):
+        root = tmp_path / "library"
+        for album in ("Holst/The Planets", "Holst/Suite", "Saint-Saens/Danse"):
+            (root / album).mkdir(parents=True)
+            (root / album / "01.flac").write_text(album)
+        self.age(root)
+        yield root
+
+    @staticmethod
+    def age(root):
+        """Backdate every folder in the library, as if nothing had changed in a
+        while"""
+        for folder in (root, *(path for path in root.rglob("*") if path.is_dir())):
+            stat = folder.stat()
+            os.utime(folder, ns=(stat.st_atime_ns, stat.st_mtime_ns - 60 * 10**9))
+
+    @pytest.fixture
+    def scans(self, monkeypatch):
+        scanned: list[str] = []
+        scandir = os.scandir
+
+        def spy(path):
+            scanned.append(os.fspath(path))
+            return scandir(path)
+
+        monkeypatch.setattr(library.os, "scandir", spy)
+        yield scanned
+
+    @pytest.fixture
+    def snapshot(self, tmp_path):
+        with LibrarySnapshot(tmp_path / "snapshot.sqlite3") as snapshot:
+            yield snapshot
+
+    @pytest.mark.parametrize("jobs", (1, 4))
+    def test_unchanged_folders_are_not_reread(
+        self, music_library, snapshot, scans, jobs
+    ):
+        first = list(library.iter_files(music_library, jobs=jobs, snapshot=snapshot))
+        scans.clear()
+        second = list(library.iter_files(music_library, jobs=jobs, snapshot=snapshot))
+        rescanned = list(scans)
+
+        assert first == second == _expected(music_library)
+        assert rescanned == []
+
+    def test_only_changed_folders_are_reread(self, music_library, snapshot, scans):
+        list(library.iter_files(music_library, snapshot=snapshot))
+        (music_library / "Holst" / "Savitri").mkdir()
+        (music_library / "Holst" / "Savitri" / "01.flac").write_text("new album")
+        scans.clear()
+
+        walked = list(library.iter_files(music_library, snapshot=snapshot))
+        rescanned = list(scans)
+
+        assert walked == _expected(music_library)
+        assert rescanned == [
+            os.fspath(music_library / "Holst"),
+            os.fspath(music_library / "Holst" / "Savitri"),
+        ]
+
+    def test_removed_files_are_noticed(self, music_library, snapshot):
+        list(library.iter_files(music_library, snapshot=snapshot))
+        (music_library / "Holst" / "Suite" / "01.flac").unlink()
+
+        walked = list(library.iter_files(music_library, snapshot=snapshot))
+        assert walked == _expected(music_library)
+        assert music_library / "Holst" / "Suite" / "01.flac" not in walked
@@ -0,0 +1,119 @@
+"""Tests of the media probing utilities"""
+
+import os
+import stat
+import sys
+
+import pytest
+
+from foxnap_rpg import pack_generator, utils
+from foxnap_rpg.media import MediaInfo, Stream
+from foxnap_rpg.pack_generator import extract_album_art, extract_track_description
+
+
+@pytest.fixture
+def ffprobe_output():
+    yield {
+        "streams": [
+            {"index": 0, "codec_type": "audio", "codec_name": "mp3"},
+            {
+                "index": 1,
+                "codec_type": "video",
+                "codec_name": "mjpeg",
+                "disposition": {"attached_pic": 1},
+            },
+        ],
+        "format": {
+            "format_name": "mp3",
+            "duration": "212.897959",
+            "tags": {"TITLE": "Mars", "artist": "Gustav Holst"},
+        },
+    }
+
+
+class TestMediaInfo:
+    def test_parsing_ffprobe_output(self, ffprobe_output):
+        assert MediaInfo.from_ffprobe("mars.mp3", ffprobe_output) == MediaInfo(
+            "mars.mp3",
+            "mp3",
+            (Stream(0, "audio", "mp3"), Stream(1, "video", "mjpeg", True)),
+            212.897959,
+            {"title": "Mars", "artist": "Gustav Holst"},
+        )
+
+    def test_missing_duration_is_none(self, ffprobe_output):
+        del ffprobe_output["format"]["duration"]
+        assert MediaInfo.from_ffprobe("mars.mp3", ffprobe_output).duration is None
+
+    def test_attached_pic_counts_as_cover(self, ffprobe_output):
+        media_info = MediaInfo.from_ffprobe("mars.mp3", ffprobe_output)
+        assert (media_info.has_audio, media_info.has_cover) == (True, True)
+
+    def test_file_without_audio_is_not_a_valid_music_track(self, ffprobe_output):
+        del ffprobe_output["streams"][0]
+        media_info = MediaInfo.from_ffprobe("cover.jpg", ffprobe_output)
+        assert not utils.is_valid_music_track(media_info)
+
+
+class TestExtractionFromMediaInfo:
+    @pytest.fixture
+    def media_info(self, ffprobe_output):
+        yield MediaInfo.from_ffprobe("mars.mp3", ffprobe_output)
+
+    def test_duration_is_rounded_up(self, media_info):
+        assert utils.extract_track_duration(media_info) == 213
+
+    def test_raise_if_duration_is_unknown(self, media_info):
+        with pytest.raises(ValueError, match="Could not extract duration"):
+            utils.extract_track_duration(media_info._replace(duration=None))
+
+    def test_description_uses_tags(self, media_info):
+        assert extract_track_description(media_info) == "Gustav Holst - Mars"
+
+    def test_description_falls_back_to_filename(self, media_info):
+        assert extract_track_description(media_info._replace(tags={})) == "mars.mp3"
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="fake ffmpeg is a shell script")
+class TestAlbumArtExtractionWithFFmpeg:
+    @pytest.fixture
+    def fake_ffmpeg(self, tmp_path, monkeypatch):
+        """An "ffmpeg" that records its arguments and writes a red 5x3 image to
+        stdout"""
+        script = tmp_path / "ffmpeg"
+        script.write_text(
+            "#!/bin/sh\n"
+            f'echo "$@" > "{tmp_path / "args.txt"}"\n'
+            "printf '" + "\\377\\000\\000" * 15 + "'\n"
+        )
+        script.chmod(script.stat().st_mode | stat.S_IEXEC)
+        monkeypatch.setattr(pack_generator.bin, "ffmpeg", os.fspath(script))
+        monkeypatch.setattr(pack_generator, "read_cover_art", lambda track: None)
+        yield tmp_path / "args.txt"
+
+    @pytest.fixture
+    def media_info(self, tmp_path):
+        yield MediaInfo(
+            os.fspath(tmp_path / "song.mp3"),
+            "mp3",
+            (Stream(0, "audio", "mp3"), Stream(1, "video", "mjpeg", True)),
+            212.9,
+            {},
+        )
+
+    def test_cover_is_read_from_a_pipe(self, fake_ffmpeg, media_info):
+        inlay = extract_album_art(media_info)
+        assert (inlay.size, inlay.getpixel((4, 2))) == ((5, 3), (255, 0, 0))
+
+    def test_ffmpeg_does_the_downscaling(self, fake_ffmpeg, media_info):
+        extract_album_art(media_info)
+        args = fake_ffmpeg.read_text().split()
+        assert (
+            "scale=5:3:flags=neighbor" in args[args.index("-filter_complex") + 1]
+            and args[args.index("-pix_fmt") + 1] == "rgb24"
+            and args[-1] == "pipe:"
+        )
+
+    def test_unexpected_output_is_rejected(self, fake_ffmpeg, media_info, tmp_path):
+        (tmp_path / "ffmpeg").write_text("#!/bin/sh\nprintf 'abc'\n")
+        assert extract_album_art(media_info) is None
@@ -0,0 +1,428 @@
+"""Tests of resource pack generation"""
+
+import logging
+import os
+import threading
+import time
+import zipfile
+from concurrent.futures import Future
+from pathlib import Path
+
+import pytest
+
+from foxnap_rpg import pack_generator
+from foxnap_rpg.cache import ConversionCache
+from foxnap_rpg.pack_generator import License, Track
+
+
+@pytest.fixture
+def conversions(monkeypatch):
+    converted: list[str] = []
+
+    def fake_convert(input_path, output_path):
+        converted.append(os.path.basename(input_path))
+        with open(output_path, "w") as ogg:
+            ogg.write(f"converted from {os.path.basename(input_path)}")
+
+    monkeypatch.setattr(pack_generator, "convert_music_to_ogg", fake_convert)
+    yield converted
+
+
+@pytest.fixture
+def tracks(tmp_path):
+    tracks = []
+    for i, name in enumerate(("mercury", "venus", "earth"), start=1):
+        (tmp_path / f"{name}.mp3").write_text(name)
+        tracks.append(
+            Track(
+                i,
+                5,
+                tmp_path / f"{name}.mp3",
+                hue=False,
+                description=name.title(),
+                use_album_art=False,
+                license=License.UNRESTRICTED,
+            )
+        )
+    yield tracks
+
+
+def _pack_contents(pack_path) -> dict[str, bytes]:
+    with zipfile.ZipFile(pack_path) as pack:
+        return {
+            name: pack.read(name) for name in pack.namelist() if not name.endswith("/")
+        }
+
+
+class TestIncrementalBuilds:
+    def test_unchanged_tracks_are_not_reconverted(self, tmp_path, tracks, conversions):
+        for _ in range(2):
+            pack_generator.generate_resource_pack(
+                tmp_path / "pack.zip", *tracks, working_dir=tmp_path / "work"
+            )
+        assert conversions == ["mercury.mp3", "venus.mp3", "earth.mp3"]
+
+    def test_changed_tracks_are_reconverted(self, tmp_path, tracks, conversions):
+        pack_generator.generate_resource_pack(
+            tmp_path / "pack.zip", *tracks, working_dir=tmp_path / "work"
+        )
+        (tmp_path / "venus.mp3").write_text("venus, the bringer of peace")
+        tracks[2] = tracks[2]._replace(hue=90.0)
+        conversions.clear()
+
+        pack_generator.generate_resource_pack(
+            tmp_path / "pack.zip", *tracks, working_dir=tmp_path / "work"
+        )
+        assert conversions == ["venus.mp3", "earth.mp3"]
+
+    def test_incremental_build_matches_full_build(self, tmp_path, tracks, conversions):
+        pack_generator.generate_resource_pack(
+            tmp_path / "pack.zip", *tracks, working_dir=tmp_path / "work"
+        )
+        (tmp_path / "mars.mp3").write_text("mars")
+        tracks = [
+            tracks[0],
+            tracks[2]._replace(num=2),
+            tracks[1]._replace(num=3, path=tmp_path / "mars.mp3", description="Mars"),
+        ]
+
+        pack_generator.generate_resource_pack(
+            tmp_path / "incremental.zip", *tracks, working_dir=tmp_path / "work"
+        )
+        pack_generator.generate_resource_pack(tmp_path / "full.zip", *tracks)
+
+        incremental = _pack_contents(tmp_path / "incremental.zip")
+        full = _pack_contents(tmp_path / "full.zip")
+
+        # (inlays are random, so the textures themselves will differ)
+        assert incremental.keys() == full.keys()
+        assert {
+            name: content
+            for name, content in incremental.items()
+            if not name.endswith(".png")
+        } == {
+            name: content for name, content in full.items() if not name.endswith(".png")
+        }
+
+    def test_renumbered_tracks_are_moved_rather_than_regenerated(
+        self, tmp_path, tracks, conversions
+    ):
+        pack_generator.generate_resource_pack(
+            tmp_path / "first.zip", *tracks, working_dir=tmp_path / "work"
+        )
+        first = _pack_contents(tmp_path / "first.zip")
+        (tmp_path / "sun.mp3").write_text("sun")
+        conversions.clear()
+
+        pack_generator.generate_resource_pack(
+            tmp_path / "second.zip",
+            tracks[0]._replace(num=1, path=tmp_path / "sun.mp3", description="Sun"),
+            *(track._replace(num=track.num + 1) for track in tracks),
+            working_dir=tmp_path / "work",
+        )
+        second = _pack_contents(tmp_path / "second.zip")
+
+        assert conversions == ["sun.mp3"]
+        for num in (1, 2, 3):
+            for path in (
+                f"assets/foxnap/sounds/track_{num}.ogg",
+                f"assets/foxnap/textures/item/track_{num}.png",
+            ):
+                assert second[path.replace(str(num), str(num + 1))] == first[path]
+
+    def test_swapped_tracks_are_moved(self, tmp_path, tracks, conversions):
+        pack_generator.generate_resource_pack(
+            tmp_path / "pack.zip", *tracks, working_dir=tmp_path / "work"
+        )
+        conversions.clear()
+
+        pack_generator.generate_resource_pack(
+            tmp_path / "pack.zip",
+            tracks[0]._replace(num=2),
+            tracks[1]._replace(num=1),
+            tracks[2],
+            working_dir=tmp_path / "work",
+        )
+
+        assert conversions == []
+        contents = _pack_contents(tmp_path / "pack.zip")
+        assert [
+            contents[f"assets/foxnap/sounds/track_{num}.ogg"] for num in (1, 2)
+        ] == [
+            b"converted from venus.mp3",
+            b"converted from mercury.mp3",
+        ]
+
+    def test_removed_tracks_are_removed_from_the_pack(
+        self, tmp_path, tracks, conversions
+    ):
+        pack_generator.generate_resource_pack(
+            tmp_path / "pack.zip", *tracks, working_dir=tmp_path / "work"
+        )
+        pack_generator.generate_resource_pack(
+            tmp_path / "pack.zip", *tracks[:2], working_dir=tmp_path / "work"
+        )
+        assert not any(
+            "track_3" in name for name in _pack_contents(tmp_path / "pack.zip")
+        )
+
+
+class TestInterruptedBuilds:
+    @pytest.fixture
+    def failing_conversion(self, monkeypatch, conversions):
+        convert = pack_generator.convert_music_to_ogg
+
+        def convert_unless_saturn(input_path, output_path):
+            if os.path.basename(input_path) == "saturn.mp3":
+                raise RuntimeError("ffmpeg fell over")
+            convert(input_path, output_path)
+
+        monkeypatch.setattr(
+            pack_generator, "convert_music_to_ogg", convert_unless_saturn
+        )
+        yield conversions
+
+    def test_rebuild_after_failed_build_restores_removed_tracks(
+        self, tmp_path, tracks, failing_conversion
+    ):
+        pack_generator.generate_resource_pack(
+            tmp_path / "pack.zip", *tracks, working_dir=tmp_path / "work"
+        )
+        (tmp_path / "saturn.mp3").write_text("saturn")
+        with pytest.raises(RuntimeError, match="fell over"):
+            pack_generator.generate_resource_pack(
+                tmp_path / "pack.zip",
+                *tracks[:2],
+                tracks[2]._replace(num=4, path=tmp_path / "saturn.mp3"),
+                working_dir=tmp_path / "work",
+            )
+        failing_conversion.clear()
+
+        pack_generator.generate_resource_pack(
+            tmp_path / "pack.zip", *tracks, working_dir=tmp_path / "work"
+        )
+
+        assert failing_conversion == ["earth.mp3"]
+        contents = _pack_contents(tmp_path / "pack.zip")
+        assert contents["assets/foxnap/sounds/track_3.ogg"] == (
+            b"converted from earth.mp3"
+        )
+        assert "assets/foxnap/textures/item/track_3.png" in contents
+
+    def test_tracks_with_missing_files_are_regenerated(
+        self, tmp_path, tracks, conversions
+    ):
+        pack_generator.generate_resource_pack(
+            tmp_path / "pack.zip", *tracks, working_dir=tmp_path / "work"
+        )
+        (
+            tmp_path / "work" / "pack" / "assets" / "foxnap" / "sounds" / "track_2.ogg"
+        ).unlink()
+        conversions.clear()
+
+        pack_generator.generate_resource_pack(
+            tmp_path / "pack.zip", *tracks, working_dir=tmp_path / "work"
+        )
+
+        assert conversions == ["venus.mp3"]
+        assert "assets/foxnap/sounds/track_2.ogg" in _pack_contents(
+            tmp_path / "pack.zip"
+        )
+
+
+class TestParallelConversion:
+    @pytest.fixture
+    def more_tracks(self, tmp_path, tracks):
+        for i, name in enumerate(("mars", "jupiter", "saturn"), start=4):
+            (tmp_path / f"{name}.mp3").write_text(name)
+            tracks.append(tracks[0]._replace(num=i, path=tmp_path / f"{name}.mp3"))
+        yield tracks
+
+    def test_parallel_build_matches_serial_build(
+        self, tmp_path, more_tracks, conversions
+    ):
+        pack_generator.generate_resource_pack(tmp_path / "serial.zip", *more_tracks)
+        pack_generator.generate_resource_pack(
+            tmp_path / "parallel.zip", *more_tracks, jobs=4
+        )
+
+        serial = _pack_contents(tmp_path / "serial.zip")
+        parallel = _pack_contents(tmp_path / "parallel.zip")
+        assert serial.keys() == parallel.keys()
+        assert {
+            name: content for name, content in serial.items() if name.endswith(".ogg")
+        } == {
+            name: content for name, content in parallel.items() if name.endswith(".ogg")
+        }
+
+    def test_conversions_run_concurrently_up_to_the_limit(
+        self, tmp_path, more_tracks, monkeypatch
+    ):
+        lock = threading.Lock()
+        running = 0
+        most_running = 0
+
+        def slow_convert(input_path, output_path):
+            nonlocal running, most_running
+            with lock:
+                running += 1
+                most_running = max(most_running, running)
+            time.sleep(0.05)
+            Path(output_path).write_text("converted")
+            with lock:
+                running -= 1
+
+        monkeypatch.setattr(pack_generator, "convert_music_to_ogg", slow_convert)
+        pack_generator.generate_resource_pack(
+            tmp_path / "pack.zip", *more_tracks, jobs=3
+        )
+
+        assert most_running == 3
+
+    def test_conversions_are_logged_in_order(
+        self, tmp_path, more_tracks, conversions, caplog
+    ):
+        caplog.set_level(logging.INFO, logger=pack_generator.LOGGER.name)
+        pack_generator.generate_resource_pack(
+            tmp_path / "pack.zip", *more_tracks, jobs=4
+        )
+
+        assert [
+            record.getMessage()
+            for record in caplog.records
+            if record.getMessage().startswith("Converting")
+        ] == [f"Converting {track}" for track in more_tracks]
+
+    def test_conversions_are_single_threaded(self):
+        command = pack_generator.ogg_converter("in.mp3", "out.ogg").compile()
+        assert command.count("-threads") == 2
+        assert command[command.index("-threads") + 1] == "1"
+
+    @pytest.mark.parametrize("jobs", (0, 1.5))
+    def test_invalid_jobs_raise(self, tmp_path, tracks, conversions, jobs):
+        with pytest.raises(ValueError, match="jobs must be"):
+            pack_generator.generate_resource_pack(
+                tmp_path / "pack.zip", *tracks, jobs=jobs
+            )
+
+
+class TestConversionCache:
+    @pytest.fixture
+    def conversion_cache(self, tmp_path):
+        with ConversionCache(tmp_path / "conversions.sqlite3", version="v1") as cache:
+            yield cache
+
+    def test_stored_conversions_are_reused(
+        self, tmp_path, tracks, conversions, conversion_cache
+    ):
+        for pack in ("first.zip", "second.zip"):
+            pack_generator.generate_resource_pack(
+                tmp_path / pack, *tracks, conversion_cache=conversion_cache
+            )
+
+        assert conversions == ["mercury.mp3", "venus.mp3", "earth.mp3"]
+        assert _pack_contents(tmp_path / "second.zip")[
+            "assets/foxnap/sounds/track_2.ogg"
+        ] == (b"converted from venus.mp3")
+
+    def test_renumbered_tracks_are_not_reconverted(
+        self, tmp_path, tracks, conversions, conversion_cache
+    ):
+        pack_generator.generate_resource_pack(
+            tmp_path / "pack.zip",
+            *tracks,
+            working_dir=tmp_path / "work",
+            conversion_cache=conversion_cache,
+        )
+        renumbered = [track._replace(num=4 - track.num) for track in tracks]
+        pack_generator.generate_resource_pack(
+            tmp_path / "pack.zip",
+            *renumbered,
+            working_dir=tmp_path / "work",
+            conversion_cache=conversion_cache,
+        )
+
+        assert conversions == ["mercury.mp3", "venus.mp3", "earth.mp3"]
+        assert _pack_contents(tmp_path / "pack.zip")[
+            "assets/foxnap/sounds/track_1.ogg"
+        ] == (b"converted from earth.mp3")
+
+    def test_reconverting_does_not_modify_the_store(
+        self, tmp_path, tracks, conversions, conversion_cache
+    ):
+        pack_generator.generate_resource_pack(
+            tmp_path / "pack.zip",
+            *tracks,
+            working_dir=tmp_path / "work",
+            conversion_cache=conversion_cache,
+        )
+        # a build without the cache writes over the (possibly linked) files
+        pack_generator.generate_resource_pack(
+            tmp_path / "pack.zip",
+            tracks[0]._replace(num=2),
+            tracks[1]._replace(num=1),
+            working_dir=tmp_path / "work",
+        )
+
+        assert sorted(
+            stored.read_text() for stored in conversion_cache.store.iterdir()
+        ) == [
+            "converted from earth.mp3",
+            "converted from mercury.mp3",
+            "converted from venus.mp3",
+        ]
+
+
+class TestDeferredDurations:
+    def test_durations_are_settled_before_conversion(
+        self, tmp_path, tracks, conversions
+    ):
+        pending: Future[int] = Future()
+        tracks[1] = tracks[1]._replace(duration=pending)
+        finished_probing = threading.Timer(0.1, pending.set_result, (7,))
+        finished_probing.start()
+
+        durations = pack_generator.generate_resource_pack(
+            tmp_path / "pack.zip", *tracks
+        )
+
+        assert durations == {1: 5, 2: 7, 3: 5}
+        assert len(conversions) == 3
+
+    def test_tracks_with_failed_durations_are_left_out(
+        self, tmp_path, tracks, conversions, caplog
+    ):
+        failed: Future[int] = Future()
+        failed.set_exception(ValueError("Could not extract duration"))
+        tracks[1] = tracks[1]._replace(duration=failed)
+
+        durations = pack_generator.generate_resource_pack(
+            tmp_path / "pack.zip", *tracks, working_dir=tmp_path / "work"
+        )
+
+        assert durations == {1: 5, 3: 5}
+        assert "Leaving it out of the pack" in caplog.text
+        assert "venus" not in " ".join(conversions)
+        assert not any(
+            "track_2" in name for name in _pack_contents(tmp_path / "pack.zip")
+        )
+
+    def test_tracks_with_failed_durations_are_retried_next_build(
+        self, tmp_path, tracks, conversions
+    ):
+        failed: Future[int] = Future()
+        failed.set_exception(ValueError("Could not extract duration"))
+        pack_generator.generate_resource_pack(
+            tmp_path / "pack.zip",
+            tracks[0],
+            tracks[1]._replace(duration=failed),
+            tracks[2],
+            working_dir=tmp_path / "work",
+        )
+        conversions.clear()
+
+        durations = pack_generator.generate_resource_pack(
+            tmp_path / "pack.zip", *tracks, working_dir=tmp_path / "work"
+        )
+
+        assert (conversions, durations) == (["venus.mp3"], {1: 5, 2: 5, 3: 5})
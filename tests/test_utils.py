@@ -3,6 +3,7 @@
 import os
 import random
 import re
+import time
 from copy import deepcopy
 from itertools import product
 from pathlib import Path
@@ -108,6 +109,146 @@ class TestSpecMatchesPath:
         )
 
 
+class TestPathSpecIndex:
+    SPECS = (
+        "ello",
+        "hello",
+        "hello.mp3",
+        "world.ogg",
+        "Music/world",
+        "Album/01 track.mp3",
+        "Best Album Ever/01 Best Song Ever.aac",
+        Path.home() / "Music" / "Best Album Ever" / "01 Best Song Ever.aac",
+    )
+
+    @pytest.fixture
+    def index(self):
+        index = utils.PathSpecIndex()
+        for i, spec in enumerate(self.SPECS):
+            index.add(spec, i)
+        yield index
+
+    @pytest.mark.parametrize(
+        "file",
+        (
+            "hello.mp3",
+            "hello.ogg",
+            "jello.mp3",
+            "Music/world.ogg",
+            "Music/world.mp3",
+            "Album/01 track.mp3",
+            "Other Album/01 track.mp3",
+            Path.home() / "Music" / "Best Album Ever" / "01 Best Song Ever.aac",
+            Path.home() / "Best Album Ever" / "01 Best Song Ever.aac",
+            Path.home() / "Music" / "Best Album Ever" / "01 Best Song Ever.mp3",
+            (".m4a", "song", "album", "artist", "collection"),
+        ),
+    )
+    def test_index_agrees_with_spec_matches_path(self, index, file):
+        expected = [
+            i
+            for i, spec in enumerate(self.SPECS)
+            if utils.spec_matches_path(spec, file)
+        ]
+        assert index.matches(file) == expected
+
+    @pytest.mark.parametrize("spec", ("hello", "world", "Music/world", "01 track.mp3"))
+    def test_matched_by_is_the_reverse_of_matches(self, index, spec):
+        expected = [
+            i
+            for i, indexed in enumerate(self.SPECS)
+            if utils.spec_matches_path(spec, utils._part_out_path(indexed))
+        ]
+        assert index.matched_by(spec) == expected
+
+    def test_matches_come_back_in_the_order_they_were_added(self):
+        index = utils.PathSpecIndex()
+        index.add("Music/hello", "first")
+        index.add("hello.mp3", "second")
+        index.add("hello", "third")
+
+        assert index.matches("/home/me/Music/hello.mp3") == ["first", "second", "third"]
+
+    def test_len_counts_specs(self, index):
+        assert len(index) == len(self.SPECS)
+
+
+class TestPathPatternMatcher:
+    @pytest.mark.parametrize(
+        "pattern, file, matches",
+        (
+            ("*.mp3", "/Music/song.mp3", True),
+            ("*.mp3", "/Music/song.mp3.bak", False),
+            ("Album/*.mp3", "/Music/Album/song.mp3", True),
+            ("Album/*.mp3", "/Music/Album/Disc 1/song.mp3", False),
+            ("Album/**/*.mp3", "/Music/Album/Disc 1/song.mp3", True),
+            ("Album/**/*.mp3", "/Music/Album/song.mp3", True),
+            ("bum/*.mp3", "/Music/Album/song.mp3", False),
+            ("track ??.ogg", "/Music/track 01.ogg", True),
+            ("track ??.ogg", "/Music/track 1.ogg", False),
+            ("[!.]*", "/Music/.hidden", False),
+            ("[a-c]*", "/Music/best.wav", True),
+            (r"re:\d+ .*\.flac", "/Music/07 Seven.flac", True),
+            (r"re:\d+ .*\.flac", "/Music/Seven.flac", False),
+            (r"re:[^/]*/\d+ .*\.flac", "/Music/07 Seven.flac", True),
+            (r"re:sic/\d+ .*\.flac", "/Music/07 Seven.flac", False),
+        ),
+    )
+    def test_pattern_matching(self, pattern, file, matches):
+        matcher = utils.PathPatternMatcher()
+        matcher.add(pattern, "value")
+        assert (matcher.match(file) is not None) == matches
+
+    def test_first_pattern_added_wins(self):
+        matcher = utils.PathPatternMatcher()
+        matcher.add("*.ogg", 0)
+        matcher.add(r"re:Album/.*", 1)
+        matcher.add("Album/*", 2)
+        matcher.add("*.mp3", 3)
+
+        assert [
+            matcher.match(f"/Music/{file}")
+            for file in ("Album/song.mp3", "Album/song.ogg", "song.mp3", "song.flac")
+        ] == [(1, {}), (0, {}), (3, {}), None]
+
+    def test_named_groups_are_captured_per_pattern(self):
+        matcher = utils.PathPatternMatcher()
+        matcher.add(r"re:(?P<title>.*)\.ogg", "ogg")
+        matcher.add(r"re:(?P<num>\d+) (?P<title>.*)\.mp3", "mp3")
+
+        assert matcher.match("/Music/01 Song.mp3") == (
+            "mp3",
+            {"num": "01", "title": "Song"},
+        )
+
+    def test_leading_inline_flags_only_apply_to_their_pattern(self):
+        matcher = utils.PathPatternMatcher()
+        matcher.add(r"re:(?i)loud\.mp3", "loud")
+        matcher.add(r"re:(?x) quiet \. mp3  # spaces are ignored", "quiet")
+        matcher.add(r"re:shout\.mp3", "shout")
+
+        assert [
+            matcher.match(f"/Music/{file}")
+            for file in ("LOUD.mp3", "quiet.mp3", "SHOUT.mp3", "shout.mp3")
+        ] == [("loud", {}), ("quiet", {}), None, ("shout", {})]
+
+    @pytest.mark.parametrize(
+        "pattern", ("re:(unclosed", r"re:(.)\1", "re:a(?i)b", "[b-a]*")
+    )
+    def test_invalid_patterns_raise_value_error(self, pattern):
+        with pytest.raises(ValueError):
+            utils.PathPatternMatcher().add(pattern, None)
+
+
+class TestValidateTrackFilePatterns:
+    def test_valid_patterns_produce_no_error(self):
+        utils.validate_track_file_patterns("*.mp3", Path("Album") / "*", r"re:.*")
+
+    def test_invalid_patterns_are_all_reported(self):
+        with pytest.raises(ValueError, match=r"(?s)unclosed.*\[b-a\]"):
+            utils.validate_track_file_patterns("re:(unclosed", "*.mp3", "[b-a]*")
+
+
 class TestValidateTrackNumbers:
     @pytest.fixture(autouse=True)
     def lock_number_of_built_in_tracks(self, monkeypatch):
@@ -161,6 +302,27 @@ class TestValidateTrackNumbers:
         ):
             utils.validate_track_numbers(6, 8, 7, check_contiguous=True)
 
+    def test_runs_of_missing_track_numbers_are_abbreviated(self):
+        with pytest.raises(
+            RuntimeError,
+            match=r"No tracks are specified with numbers \(5, 6, 8-11, 13-99999999\)",
+        ):
+            utils.validate_track_numbers(7, 12, 100000000, check_contiguous=True)
+
+    def test_gaps_from_open_from_on_up_are_taken_to_be_fillable(self):
+        utils.validate_track_numbers(7, 12, check_contiguous=True, open_from=5)
+        with pytest.raises(RuntimeError, match=r"numbers \(5, 6\)"):
+            utils.validate_track_numbers(7, 12, check_contiguous=True, open_from=8)
+
+    def test_huge_track_numbers_can_be_filled_in_by_wildcards(self):
+        start = time.perf_counter()
+        utils.validate_track_numbers(6, 7, 10, *[None] * 5, check_contiguous=True)
+        with pytest.raises(RuntimeError, match=r"\(5, 8, 9, 11-99999999\)"):
+            utils.validate_track_numbers(
+                6, 7, 10, 100000000, *[None] * 5, check_contiguous=True
+            )
+        assert time.perf_counter() - start < 1
+
     @pytest.mark.parametrize("n_wildcards", (1, 2))
     def test_raise_if_number_of_missing_nums_exceeds_number_of_wildcards(
         self, n_wildcards
@@ -266,3 +428,113 @@ class TestValidateTrackFileSpecs:
             utils.validate_track_file_specs(
                 Path("Music") / "hello", "hello.m4a", strict=True
             )
+
+
+class TestParallelMap:
+    @staticmethod
+    def slow_square(x: int) -> int:
+        # later items finish first
+        time.sleep(0.001 * (20 - x))
+        return x * x
+
+    @pytest.mark.parametrize("jobs", (1, 4))
+    def test_results_come_back_in_input_order(self, jobs):
+        assert list(utils.parallel_map(self.slow_square, range(20), jobs=jobs)) == [
+            x * x for x in range(20)
+        ]
+
+    def test_inputs_are_consumed_lazily(self):
+        consumed: list[int] = []
+
+        def inputs():
+            for x in range(1000):
+                consumed.append(x)
+                yield x
+
+        results = utils.parallel_map(self.slow_square, inputs(), jobs=2)
+        assert next(results) == 0
+        assert len(consumed) < 1000
+        results.close()
+
+    def test_exceptions_are_raised_in_order(self):
+        def explode_on_three(x: int) -> int:
+            if x == 3:
+                raise KeyError(x)
+            return x
+
+        results = utils.parallel_map(explode_on_three, range(10), jobs=3)
+        assert [next(results) for _ in range(3)] == [0, 1, 2]
+        with pytest.raises(KeyError):
+            next(results)
+
+    @pytest.mark.parametrize("jobs", (0, -1, 1.5))
+    def test_jobs_must_be_a_natural_number(self, jobs):
+        with pytest.raises(ValueError):
+            list(utils.parallel_map(abs, range(3), jobs=jobs))
+
+
+class TestIsValidMusicTrack:
+    @pytest.fixture
+    def probe_log(self, monkeypatch):
+        probed: list[str] = []
+
+        def fake_probe(track_path, *args, **kwargs):
+            probed.append(os.fspath(track_path))
+            raise utils.ffmpeg.Error("ffprobe", b"", b"Invalid data")
+
+        monkeypatch.setattr(utils, "probe_track", fake_probe)
+        yield probed
+
+    def test_obvious_non_audio_files_are_not_probed(self, tmp_path, probe_log):
+        (tmp_path / "cover.jpg").write_bytes(b"\xff\xd8\xff\xe0")
+        assert not utils.is_valid_music_track(tmp_path / "cover.jpg", probe_all=False)
+        assert probe_log == []
+
+    def test_every_file_is_probed_by_default(self, tmp_path, probe_log):
+        (tmp_path / "cover.jpg").write_bytes(b"\xff\xd8\xff\xe0")
+        assert not utils.is_valid_music_track(tmp_path / "cover.jpg")
+        assert probe_log == [os.fspath(tmp_path / "cover.jpg")]
+
+    @pytest.mark.parametrize("strict", (False, True))
+    def test_conflicts_are_reported_in_sorted_order(self, strict):
+        specs = (
+            "hello",
+            "hello.m4a",
+            "hello.mp3",
+            os.path.join("Music", "hello"),
+            os.path.join("Music", "hello.mp3"),
+            os.path.join("Album", "Music", "hello"),
+            "world.mp3",
+        )
+
+        # brute-force every pair of specs (in sorted order)
+        expected = ""
+        parted_specs = sorted(utils._part_out_path(spec) for spec in specs)
+        for spec in parted_specs:
+            for reference in parted_specs:
+                if spec == reference:
+                    continue
+                spec_path = utils._reassemble_path(*spec)
+                reference_path = utils._reassemble_path(*reference)
+                if utils.spec_matches_path(reference, spec):
+                    expected += (
+                        f"\n - Files matching '{spec_path}'"
+                        f" would also match any files matching '{reference_path}'"
+                    )
+                elif (
+                    strict
+                    and spec[0] == ""
+                    and utils.spec_matches_path(("", *reference[1:]), spec)
+                ):
+                    expected += (
+                        f"\n - Files matching '{spec_path}'"
+                        f" may also match files matching '{reference_path}'"
+                    )
+
+        with pytest.raises(RuntimeError) as conflicts:
+            utils.validate_track_file_specs(*specs, strict=strict)
+
+        assert str(conflicts.value) == (
+            "The provided file specifications contain the following conflicts:"
+            + expected
+        )
@@ -0,0 +1,150 @@
+"""Tests of the library watcher"""
+
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from foxnap_rpg import cli, watch
+
+
+@pytest.fixture
+def music_library(tmp_path):
+    (tmp_path / "library" / "Holst").mkdir(parents=True)
+    (tmp_path / "library" / "Holst" / "mars.mp3").write_text("mars")
+    yield tmp_path / "library"
+
+
+def _later(action, delay=0.2):
+    timer = threading.Timer(delay, action)
+    timer.start()
+    return timer
+
+
+@pytest.fixture(
+    params=(
+        pytest.param(
+            True,
+            id="inotify",
+            marks=pytest.mark.skipif(
+                not sys.platform.startswith("linux"), reason="inotify is Linux-only"
+            ),
+        ),
+        pytest.param(False, id="polling"),
+    )
+)
+def use_inotify(request):
+    yield request.param
+
+
+class TestWatchForChanges:
+    def test_new_files_are_detected(self, music_library, use_inotify):
+        changes = watch.watch_for_changes(
+            [music_library], debounce=0.3, poll_interval=0.05, use_inotify=use_inotify
+        )
+        timer = _later(
+            lambda: (music_library / "Holst" / "venus.mp3").write_text("venus")
+        )
+        try:
+            assert music_library / "Holst" / "venus.mp3" in next(changes)
+        finally:
+            timer.join()
+            changes.close()
+
+    def test_files_in_new_folders_are_detected(self, music_library, use_inotify):
+        changes = watch.watch_for_changes(
+            [music_library], debounce=0.5, poll_interval=0.05, use_inotify=use_inotify
+        )
+
+        def add_album():
+            (music_library / "Saint-Saens").mkdir()
+            time.sleep(0.1)
+            (music_library / "Saint-Saens" / "danse.mp3").write_text("danse")
+
+        timer = _later(add_album)
+        try:
+            assert music_library / "Saint-Saens" / "danse.mp3" in next(changes)
+        finally:
+            timer.join()
+            changes.close()
+
+    def test_changes_are_debounced(self, music_library, use_inotify):
+        changes = watch.watch_for_changes(
+            [music_library], debounce=0.5, poll_interval=0.05, use_inotify=use_inotify
+        )
+
+        def add_tracks():
+            for name in ("venus", "mercury", "jupiter"):
+                (music_library / "Holst" / f"{name}.mp3").write_text(name)
+                time.sleep(0.1)
+
+        timer = _later(add_tracks)
+        try:
+            assert {
+                music_library / "Holst" / f"{name}.mp3"
+                for name in ("venus", "mercury", "jupiter")
+            } <= next(changes)
+        finally:
+            timer.join()
+            changes.close()
+
+    def test_ignored_files_do_not_trigger_changes(self, music_library, use_inotify):
+        output = music_library / "FoxNapRP.zip"
+        changes = watch.watch_for_changes(
+            [music_library],
+            ignore=[output],
+            debounce=0.3,
+            poll_interval=0.05,
+            use_inotify=use_inotify,
+        )
+
+        def write_output_then_add_track():
+            output.write_text("pack")
+            time.sleep(0.5)
+            (music_library / "Holst" / "venus.mp3").write_text("venus")
+
+        timer = _later(write_output_then_add_track)
+        try:
+            assert next(changes) == {music_library / "Holst" / "venus.mp3"}
+        finally:
+            timer.join()
+            changes.close()
+
+    def test_watching_a_single_file(self, music_library, use_inotify):
+        track = music_library / "Holst" / "mars.mp3"
+        changes = watch.watch_for_changes(
+            [track], debounce=0.3, poll_interval=0.05, use_inotify=use_inotify
+        )
+
+        def modify_files():
+            (music_library / "Holst" / "venus.mp3").write_text("not watched")
+            track.write_text("mars, bringer of war")
+
+        timer = _later(modify_files)
+        try:
+            assert next(changes) == {track}
+        finally:
+            timer.join()
+            changes.close()
+
+
+class TestWatchAndRebuild:
+    def test_failed_rebuilds_do_not_stop_the_watching(self, monkeypatch, caplog):
+        monkeypatch.setattr(
+            cli,
+            "watch_for_changes",
+            lambda *args, **kwargs: iter([{Path("a.mp3")}, {Path("b.mp3")}]),
+        )
+        builds: list[int] = []
+
+        def build():
+            builds.append(len(builds))
+            if len(builds) == 1:
+                raise KeyError("Could not find matching spec for 'a.mp3'")
+
+        cli._watch_and_rebuild(build, [Path(".")], [])
+
+        assert builds == [0, 1]
+        assert "Rebuild failed" in caplog.text